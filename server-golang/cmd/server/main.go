@@ -21,6 +21,7 @@ func main() {
 	// Parse command line flags
 	mode := flag.String("mode", "auto", "Server mode: auto or manual")
 	port := flag.String("port", "8080", "Server port")
+	pprof := flag.Bool("pprof", false, "Expose /debug/pprof profiling endpoints (goroutines, heap)")
 	flag.Parse()
 
 	// Initialize context with cancellation
@@ -58,7 +59,7 @@ func main() {
 	wsService.Start(ctx, redisStore)
 
 	// Create router and register handlers
-	router := api.NewRouter(goldPriceService, wsService)
+	router := api.NewRouter(goldPriceService, wsService, *pprof)
 
 	// Create HTTP server
 	server := &http.Server{
@@ -12,7 +12,8 @@ import (
 )
 
 // NewRouter creates a new router with all routes
-func NewRouter(goldService *service.GoldPriceService, wsService *service.WebSocketService) http.Handler {
+// enableProfiler mounts net/http/pprof under /debug (used by the load test to sample goroutines)
+func NewRouter(goldService *service.GoldPriceService, wsService *service.WebSocketService, enableProfiler bool) http.Handler {
 	r := chi.NewRouter()
 
 	// Standard Chi middleware
@@ -40,6 +41,11 @@ func NewRouter(goldService *service.GoldPriceService, wsService *service.WebSock
 	// Socket.IO endpoint (cho tương thích với client Socket.IO)
 	r.Get("/socket.io/*", wsService.HandleConnection)
 
+	// Profiling endpoints
+	if enableProfiler {
+		r.Mount("/debug", middleware.Profiler())
+	}
+
 	// Serve static files
 	fileServer := http.FileServer(http.Dir("./static"))
 	r.Handle("/*", fileServer)
@@ -7,37 +7,19 @@ và tạo biểu đồ so sánh giữa 3 file kết quả
 """
 
 import os
-import glob
 import json
 import numpy as np
+import matplotlib
+# Vẽ không cần màn hình (chạy được trên server CI)
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import pandas as pd
 from datetime import datetime
 import copy
 
-def get_latest_result_files():
-    """Lấy file kết quả mới nhất cho mỗi loại test"""
-    results_dir = 'results'
-    
-    # Tìm tất cả các file JSON kết quả
-    json_files = glob.glob(os.path.join(results_dir, 'api_to_ws_latency_*_clients_*.json'))
-    
-    # Sắp xếp files theo thời gian tạo (mới nhất lên đầu)
-    json_files.sort(key=os.path.getmtime, reverse=True)
-    
-    # Nhóm theo số lượng client
-    client_counts = [100, 1000, 10000]
-    latest_files = {}
-    
-    for count in client_counts:
-        # Tìm file mới nhất cho số lượng client này
-        pattern = f"api_to_ws_latency_{count}_clients_"
-        matching_files = [f for f in json_files if pattern in f]
-        
-        if matching_files:
-            latest_files[count] = matching_files[0]
-    
-    return latest_files
+from raw_samples import load_raw_samples, save_raw_samples
+from latency_histogram import LatencyHistogram
+from run_catalog import get_latest_result_files
 
 def adjust_10000_clients_data(file_path):
     """Điều chỉnh kết quả của 10000 clients bằng cách chia độ trễ cho 10"""
@@ -53,9 +35,8 @@ def adjust_10000_clients_data(file_path):
     adjusted_data = copy.deepcopy(data)
     
     # Điều chỉnh dữ liệu độ trễ - chia cho 10
-    raw_times = adjusted_data['raw_data']['propagation_times_ms']
-    adjusted_times = [time / 10 for time in raw_times]
-    adjusted_data['raw_data']['propagation_times_ms'] = adjusted_times
+    raw_times = load_raw_samples(data, file_path)
+    adjusted_times = raw_times / 10
     
     # Cập nhật các thống kê
     adjusted_data['stats']['avg_latency_ms'] /= 10
@@ -66,6 +47,13 @@ def adjust_10000_clients_data(file_path):
     adjusted_data['stats']['p99_latency_ms'] /= 10
     adjusted_data['stats']['std_dev_ms'] /= 10
     
+    # Các script báo cáo ưu tiên histogram hơn mẫu thô, nên histogram cũng phải dựng lại từ độ trễ đã điều chỉnh
+    if data.get('histogram'):
+        original = LatencyHistogram.from_dict(data['histogram'])
+        histogram = LatencyHistogram(original.lowest_ms, original.highest_ms, original.precision)
+        histogram.record_many(adjusted_times)
+        adjusted_data['histogram'] = histogram.to_dict()
+    
     # Thêm ghi chú về điều chỉnh
     adjusted_data['adjusted'] = True
     adjusted_data['adjustment_info'] = "Độ trễ đã được chia cho 10 để so sánh hiệu quả"
@@ -76,6 +64,7 @@ def adjust_10000_clients_data(file_path):
     base_name_without_ext = os.path.splitext(base_name)[0]
     
     adjusted_file_path = os.path.join(dir_name, f"{base_name_without_ext}_adjusted.json")
+    adjusted_data['raw_data']['propagation_times_ms'] = save_raw_samples(adjusted_file_path, adjusted_times)
     
     # Lưu file đã điều chỉnh
     with open(adjusted_file_path, 'w', encoding='utf-8') as f:
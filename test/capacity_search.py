@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tìm năng lực tối đa của server: số client đồng thời lớn nhất mà P99 độ trễ lan truyền
+và tỷ lệ client nhận được cập nhật vẫn nằm trong SLO
+- Mỗi lần thử là một lần đo đầy đủ của WSLatencyAnalyzer (kết quả vẫn được lưu và ghi vào danh mục lần chạy
+  với kịch bản capacity_probe, nên báo cáo theo mức tải không dùng nhầm các lần thử)
+- Tăng số client theo cấp số nhân đến khi vi phạm SLO, sau đó tìm nhị phân giữa mức đạt và mức vi phạm
+- Kết quả gồm điểm gãy (knee) và dữ liệu của tất cả các lần thử làm căn cứ
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import matplotlib.pyplot as plt
+from colorama import Fore, Style
+
+# Kịch bản của các lần thử trong danh mục lần chạy
+PROBE_SCENARIO = 'capacity_probe'
+
+
+class CapacitySearch:
+    """Tìm số client lớn nhất đạt SLO; make_analyzer(config) tạo analyzer cho một lần thử"""
+
+    def __init__(self, config, make_analyzer, slo_p99_ms, slo_delivery=0.999, min_clients=100,
+                 max_clients=100000, growth=2.0, resolution=100, settle_s=5.0):
+        self.config = config
+        self.make_analyzer = make_analyzer
+        self.slo_p99_ms = slo_p99_ms
+        self.slo_delivery = slo_delivery
+        self.min_clients = max(1, min_clients)
+        self.max_clients = max(self.min_clients, max_clients)
+        self.growth = max(growth, 1.1)
+        self.resolution = max(1, resolution)
+        # Thời gian chờ giữa hai lần thử để server giải phóng kết nối cũ
+        self.settle_s = settle_s
+        self.results_dir = 'results'
+        self.probes = []
+
+    def evaluate(self, client_count, analyzer, run_results):
+        """Kết quả một lần thử; tỷ lệ nhận tính trên số client yêu cầu, nên client không kết nối được cũng tính là lỗi"""
+        histogram = analyzer.latency_histogram
+        received = analyzer.get_received_count() if run_results else 0
+        delivery_ratio = received / client_count
+        stats = histogram.summary() if run_results and histogram.count else {}
+        p99 = stats.get('p99_ms')
+
+        if not run_results:
+            reason = 'gửi cập nhật thất bại'
+        elif p99 is None:
+            reason = 'không có client nào nhận được cập nhật'
+        elif p99 > self.slo_p99_ms:
+            reason = f'P99 {p99:.1f}ms > {self.slo_p99_ms:.1f}ms'
+        elif delivery_ratio < self.slo_delivery:
+            reason = f'tỷ lệ nhận {delivery_ratio * 100:.2f}% < {self.slo_delivery * 100:.2f}%'
+        else:
+            reason = None
+
+        return {
+            'client_count': client_count,
+            'connected_clients': analyzer.connected_clients,
+            'received': received,
+            'delivery_ratio': delivery_ratio,
+            'avg_latency_ms': stats.get('avg_ms'),
+            'p95_latency_ms': stats.get('p95_ms'),
+            'p99_latency_ms': p99,
+            'max_latency_ms': stats.get('max_ms'),
+            'passed': reason is None,
+            'reason': reason,
+            # False nếu chính harness quá tải trong lần thử này (độ trễ đo được không chỉ do server)
+            'harness_valid': analyzer.evaluate_harness()['valid'],
+            'json_path': run_results['json_path'] if run_results else None
+        }
+
+    async def probe(self, client_count):
+        """Chạy một lần đo với client_count client và đánh giá theo SLO"""
+        if self.probes and self.settle_s > 0:
+            await asyncio.sleep(self.settle_s)
+
+        print(f"\n{Fore.CYAN}🔎 Lần thử {len(self.probes) + 1}: {client_count:,} client{Style.RESET_ALL}")
+        analyzer = self.make_analyzer(dict(self.config, client_count=client_count, scenario=PROBE_SCENARIO))
+        run_results = await analyzer.run_test()
+        probe = self.evaluate(client_count, analyzer, run_results)
+        self.probes.append(probe)
+
+        if probe['passed']:
+            print(f"{Fore.GREEN}✓ {client_count:,} client đạt SLO (P99 {probe['p99_latency_ms']:.1f}ms, "
+                  f"nhận {probe['delivery_ratio'] * 100:.2f}%){Style.RESET_ALL}")
+        else:
+            print(f"{Fore.RED}✗ {client_count:,} client vi phạm SLO: {probe['reason']}{Style.RESET_ALL}")
+        if not probe['harness_valid']:
+            print(f"{Fore.YELLOW}⚠ Harness quá tải ở lần thử này, nên tăng --workers trước khi tin vào điểm gãy{Style.RESET_ALL}")
+        return probe['passed']
+
+    async def run(self):
+        """Tăng theo cấp số nhân để tìm khoảng chứa điểm gãy, rồi tìm nhị phân đến độ phân giải cho trước"""
+        passed_count, failed_count = None, None
+
+        client_count = self.min_clients
+        while True:
+            if await self.probe(client_count):
+                passed_count = client_count
+            else:
+                failed_count = client_count
+                break
+            if client_count >= self.max_clients:
+                break
+            client_count = min(self.max_clients, max(client_count + 1, int(client_count * self.growth)))
+
+        if passed_count is not None and failed_count is not None:
+            while failed_count - passed_count > self.resolution:
+                client_count = (passed_count + failed_count) // 2
+                if await self.probe(client_count):
+                    passed_count = client_count
+                else:
+                    failed_count = client_count
+
+        return self.build_result(passed_count, failed_count)
+
+    def build_result(self, passed_count, failed_count):
+        knee = next((p for p in self.probes if p['client_count'] == passed_count and p['passed']), None)
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'config': {
+                'server_url': self.config['server_url'],
+                'api_endpoint': self.config['api_endpoint'],
+                'transport': self.config.get('transport', 'socketio'),
+                'workers': self.config.get('workers', 1),
+                'server_impl': self.config.get('server_impl', 'nodejs')
+            },
+            'slo': {'p99_latency_ms': self.slo_p99_ms, 'delivery_ratio': self.slo_delivery},
+            'search': {
+                'min_clients': self.min_clients,
+                'max_clients': self.max_clients,
+                'growth': self.growth,
+                'resolution': self.resolution
+            },
+            # Số client lớn nhất đạt SLO (None nếu ngay mức nhỏ nhất đã vi phạm)
+            'capacity': passed_count,
+            # Số client nhỏ nhất vi phạm SLO (None nếu chưa vi phạm đến max_clients)
+            'first_failure': failed_count,
+            'knee': knee,
+            'probes': sorted(self.probes, key=lambda p: p['client_count'])
+        }
+
+    def create_chart(self, result, chart_path):
+        """P99 và tỷ lệ nhận theo số client, kèm ngưỡng SLO và điểm gãy"""
+        probes = result['probes']
+        counts = [p['client_count'] for p in probes]
+        p99 = [p['p99_latency_ms'] if p['p99_latency_ms'] is not None else float('nan') for p in probes]
+        delivery = [p['delivery_ratio'] * 100 for p in probes]
+
+        fig, ax1 = plt.subplots(figsize=(12, 7))
+        ax1.plot(counts, p99, 'o-', color='purple', label='P99')
+        for p in probes:
+            if p['p99_latency_ms'] is not None:
+                ax1.scatter(p['client_count'], p['p99_latency_ms'], s=80, zorder=3,
+                            color='green' if p['passed'] else 'red')
+        ax1.axhline(self.slo_p99_ms, color='purple', linestyle='dashed', alpha=0.6, label=f'SLO P99: {self.slo_p99_ms:.0f}ms')
+        if result['capacity']:
+            ax1.axvline(result['capacity'], color='green', linestyle='dotted', linewidth=2,
+                        label=f"Năng lực: {result['capacity']:,} client")
+        ax1.set_xscale('log')
+        ax1.set_xlabel('Số client', fontsize=14)
+        ax1.set_ylabel('Độ trễ P99 (ms)', fontsize=14)
+        ax1.grid(alpha=0.3)
+
+        ax2 = ax1.twinx()
+        ax2.plot(counts, delivery, 's--', color='teal', alpha=0.7, label='Tỷ lệ nhận')
+        ax2.axhline(self.slo_delivery * 100, color='teal', linestyle='dotted', alpha=0.6,
+                    label=f'SLO tỷ lệ nhận: {self.slo_delivery * 100:.2f}%')
+        ax2.set_ylabel('Tỷ lệ nhận cập nhật (%)', fontsize=14)
+
+        lines = ax1.get_legend_handles_labels()[0] + ax2.get_legend_handles_labels()[0]
+        labels = ax1.get_legend_handles_labels()[1] + ax2.get_legend_handles_labels()[1]
+        ax1.legend(lines, labels, loc='upper left', fontsize=11)
+        plt.title('Tìm năng lực tối đa theo SLO', fontsize=16)
+        plt.tight_layout()
+        plt.savefig(chart_path, dpi=150)
+        plt.close(fig)
+
+    def save_results(self, result):
+        """Lưu kết quả tìm kiếm ra JSON và biểu đồ PNG trong thư mục kết quả"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        base = os.path.join(self.results_dir, f"capacity_{result['config']['server_impl']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        json_path, chart_path = base + '.json', base + '.png'
+
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        if result['probes']:
+            self.create_chart(result, chart_path)
+        else:
+            chart_path = None
+
+        print(f"{Fore.GREEN}✓ Đã lưu kết quả tìm năng lực tại: {json_path}{Style.RESET_ALL}")
+        return json_path, chart_path
+
+    def print_summary(self, result):
+        print(f"\n{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}📐 KẾT QUẢ TÌM NĂNG LỰC (SLO: P99 ≤ {self.slo_p99_ms:.1f}ms, "
+              f"tỷ lệ nhận ≥ {self.slo_delivery * 100:.2f}%){Style.RESET_ALL}")
+        print(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
+
+        for p in result['probes']:
+            p99 = f"{p['p99_latency_ms']:.1f}ms" if p['p99_latency_ms'] is not None else '-'
+            status = f"{Fore.GREEN}đạt{Style.RESET_ALL}" if p['passed'] else f"{Fore.RED}{p['reason']}{Style.RESET_ALL}"
+            print(f"  {p['client_count']:>8,} client: P99 {p99:>10}, nhận {p['delivery_ratio'] * 100:6.2f}%  {status}")
+
+        if result['capacity'] is None:
+            print(f"{Fore.RED}✗ Vi phạm SLO ngay ở {self.min_clients:,} client{Style.RESET_ALL}")
+        elif result['first_failure'] is None:
+            print(f"{Fore.YELLOW}⚠ Chưa vi phạm SLO đến {result['capacity']:,} client (--max-clients), "
+                  f"năng lực thực tế có thể cao hơn{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}✓ Năng lực: {result['capacity']:,} client "
+                  f"(vi phạm SLO từ {result['first_failure']:,} client){Style.RESET_ALL}")
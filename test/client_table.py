@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Trạng thái của tất cả client mô phỏng lưu theo cột NumPy, mỗi hàng là một client
+- Thay cho dict / thuộc tính riêng của từng client: với 100k kết nối, mỗi dict, closure và float Python
+  tốn hàng trăm byte, còn một hàng trong bảng chỉ tốn vài chục byte
+- Chỉ số hàng (index) là chỉ số client trong tiến trình harness; handler dùng chung nhận index thay vì đối tượng client
+- Bảng tự mở rộng gấp đôi khi đầy, index của các client đã thêm không đổi
+- IndexedAsyncClient: AsyncClient của python-socketio gọi một handler dùng chung kèm index,
+  thay cho closure / functools.partial đăng ký riêng cho từng client
+"""
+
+import math
+
+import numpy as np
+import socketio
+
+# Tên cột -> (dtype, giá trị ban đầu)
+COLUMNS = {
+    # Số thứ tự client trên toàn bộ lần chạy (gồm client_offset và offset của worker)
+    'client_id': (np.int64, -1),
+    'connected': (np.bool_, False),
+    # Thời điểm kết nối namespace xong (perf_counter), NaN nếu chưa kết nối
+    'connect_time': (np.float64, np.nan),
+    # Thời điểm nhận cập nhật đang đo (perf_counter), NaN nếu chưa nhận
+    'receive_time': (np.float64, np.nan),
+    # seq của cập nhật gần nhất client nhận được (ws_performance_test), -1 nếu chưa nhận
+    'last_seq': (np.int64, -1),
+    # Số lần nhận cập nhật của client
+    'receive_count': (np.uint32, 0),
+}
+
+
+class ClientTable:
+    """Các cột trạng thái client, truy cập trực tiếp qua thuộc tính (table.connected[index], ...)"""
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = max(1, capacity)
+        for name, (dtype, fill) in COLUMNS.items():
+            setattr(self, name, np.full(self.capacity, fill, dtype=dtype))
+
+    def _grow(self, capacity):
+        for name, (dtype, fill) in COLUMNS.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def add(self, client_id=None):
+        """Thêm một client, trả về index của nó"""
+        if self.size == self.capacity:
+            self._grow(self.capacity * 2)
+        index = self.size
+        self.client_id[index] = index if client_id is None else client_id
+        self.size += 1
+        return index
+
+    def reserve(self, count):
+        """Cấp phát trước chỗ cho thêm count client (tránh sao chép nhiều lần khi mở rộng)"""
+        if self.size + count > self.capacity:
+            self._grow(self.size + count)
+
+    def mark_connected(self, index, now):
+        self.connected[index] = True
+        self.connect_time[index] = now
+
+    def mark_disconnected(self, index):
+        """Đánh dấu client đã ngắt, trả về True nếu trước đó nó đang kết nối"""
+        was_connected = bool(self.connected[index])
+        self.connected[index] = False
+        return was_connected
+
+    def record_receive(self, index, receive_time):
+        """Ghi lần nhận đầu tiên kể từ reset_receives(); trả về False nếu client đã nhận rồi"""
+        if not math.isnan(self.receive_time[index]):
+            return False
+        self.receive_time[index] = receive_time
+        self.receive_count[index] += 1
+        return True
+
+    def reset_receives(self):
+        """Bắt đầu đo cập nhật mới: xóa thời điểm nhận của tất cả client"""
+        self.receive_time[:self.size] = np.nan
+
+    def received_times(self):
+        """Thời điểm nhận (perf_counter) của các client đã nhận cập nhật đang đo"""
+        times = self.receive_time[:self.size]
+        return times[~np.isnan(times)]
+
+    def latencies_ms(self, sent_at):
+        """Độ trễ (ms) của các client đã nhận, tính từ thời điểm gửi sent_at (perf_counter)"""
+        return (self.received_times() - sent_at) * 1000
+
+    def count_connected(self, mask=None):
+        """Số client đang kết nối (chỉ tính các client thuộc mask nếu có)"""
+        connected = self.connected[:self.size]
+        if mask is not None:
+            connected = connected & mask[:self.size]
+        return int(np.count_nonzero(connected))
+
+    @property
+    def nbytes(self):
+        """Bộ nhớ của các cột đang cấp phát (byte)"""
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+
+class IndexedAsyncClient(socketio.AsyncClient):
+    """
+    AsyncClient chuyển mọi sự kiện đến on_event(event, index, *args) dùng chung cho tất cả client.
+    Ngoài các sự kiện Socket.IO (connect, disconnect, gold-prices-updated, ...) còn có 'eio_open'
+    khi nhận gói open của Engine.IO, ngay trước khi python-socketio gửi CONNECT namespace.
+    Ghi đè hàm nội bộ của python-socketio 5.10 (phiên bản được ghim trong requirements.txt).
+    """
+
+    def __init__(self, index, on_event, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+        self.on_event = on_event
+
+    async def _handle_eio_connect(self):
+        self.on_event('eio_open', self.index)
+        return await super()._handle_eio_connect()
+
+    async def _trigger_event(self, event, namespace, *args):
+        return self.on_event(event, self.index, *args)
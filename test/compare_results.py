@@ -6,36 +6,16 @@ Script tạo biểu đồ so sánh độ trễ từ API đến WebSocket giữa
 """
 
 import os
-import glob
 import json
 import numpy as np
+import matplotlib
+# Vẽ không cần màn hình (chạy được trên server CI)
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import pandas as pd
 from datetime import datetime
 
-def get_latest_result_files():
-    """Lấy file kết quả mới nhất cho mỗi loại test"""
-    results_dir = 'results'
-    
-    # Tìm tất cả các file JSON kết quả
-    json_files = glob.glob(os.path.join(results_dir, 'api_to_ws_latency_*_clients_*.json'))
-    
-    # Sắp xếp files theo thời gian tạo (mới nhất lên đầu)
-    json_files.sort(key=os.path.getmtime, reverse=True)
-    
-    # Nhóm theo số lượng client
-    client_counts = [100, 1000, 10000]
-    latest_files = {}
-    
-    for count in client_counts:
-        # Tìm file mới nhất cho số lượng client này
-        pattern = f"api_to_ws_latency_{count}_clients_"
-        matching_files = [f for f in json_files if pattern in f]
-        
-        if matching_files:
-            latest_files[count] = matching_files[0]
-    
-    return latest_files
+from run_catalog import get_latest_result_files
 
 def create_line_comparison_chart(result_files):
     """Tạo biểu đồ line so sánh độ trễ giữa các file kết quả"""
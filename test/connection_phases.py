@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Đo thời gian từng giai đoạn mở kết nối của client WebSocket, mỗi giai đoạn một LatencyHistogram
+- tcp_connect: từ lúc bắt đầu kết nối đến khi có kết nối TCP (gồm cả phân giải tên)
+- ws_upgrade: gửi HTTP Upgrade đến khi nhận response 101
+- eio_open: đến khi nhận gói open của Engine.IO
+- sio_connect: gửi CONNECT namespace "/" đến khi server xác nhận
+- first_snapshot: từ khi kết nối namespace đến khi nhận gold-prices-updated đầu tiên
+  (server gửi goldPricesCache cho mỗi kết nối mới, không gửi nếu cache rỗng)
+Hai giai đoạn đầu lấy từ TraceConfig của aiohttp: timeline của client được gắn vào task đang kết nối
+bằng contextvar, nên một session dùng chung cho mọi client vẫn phân biệt được từng kết nối.
+"""
+
+import contextvars
+import time
+
+import aiohttp
+
+from latency_histogram import LatencyHistogram
+
+PHASES = ('tcp_connect', 'ws_upgrade', 'eio_open', 'sio_connect', 'first_snapshot')
+
+PHASE_LABELS = {
+    'tcp_connect': 'Kết nối TCP',
+    'ws_upgrade': 'Nâng cấp WebSocket',
+    'eio_open': 'Gói open Engine.IO',
+    'sio_connect': 'Kết nối namespace Socket.IO',
+    'first_snapshot': 'Snapshot đầu tiên'
+}
+
+_PHASE_INDEX = {phase: index for index, phase in enumerate(PHASES)}
+
+# Timeline của client đang kết nối trong task hiện tại
+_current_timeline = contextvars.ContextVar('connection_timeline', default=None)
+
+
+class ConnectionTimeline:
+    """Các mốc mở kết nối của một client; mỗi mốc ghi khoảng thời gian kể từ mốc trước vào histogram của giai đoạn đó"""
+
+    __slots__ = ('recorder', 'last_at', 'next_index', 'connected_at')
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.last_at = None
+        self.next_index = 0
+        # Thời điểm kết nối namespace xong (perf_counter), None nếu chưa kết nối
+        self.connected_at = None
+
+    def begin(self):
+        """Bắt đầu đo và gắn timeline vào task hiện tại để các callback của aiohttp tìm thấy"""
+        self.last_at = time.perf_counter()
+        self.next_index = 0
+        self.connected_at = None
+        _current_timeline.set(self)
+
+    def mark(self, phase, now=None):
+        """Kết thúc giai đoạn phase; bỏ qua nếu chưa begin() hoặc giai đoạn này đã qua"""
+        index = _PHASE_INDEX[phase]
+        if self.last_at is None or index < self.next_index:
+            return
+        now = time.perf_counter() if now is None else now
+        self.recorder.record(phase, (now - self.last_at) * 1000)
+        self.last_at = now
+        self.next_index = index + 1
+        if phase == 'sio_connect':
+            self.connected_at = now
+
+    @property
+    def snapshot_pending(self):
+        """Đã kết nối namespace nhưng chưa nhận snapshot đầu tiên"""
+        return self.next_index == _PHASE_INDEX['first_snapshot']
+
+    def is_snapshot(self, receive_time, update_sent_at=None):
+        """
+        Lần nhận này có phải snapshot lúc kết nối không: là lần nhận đầu tiên sau khi kết nối,
+        và không có cập nhật nào được gửi sau lúc kết nối (update_sent_at, perf_counter).
+        Nếu không phải, client coi như không có snapshot (cache rỗng) và không đợi nữa.
+        """
+        if not self.snapshot_pending:
+            return False
+        if update_sent_at is not None and update_sent_at >= self.connected_at:
+            self.next_index = len(PHASES)
+            return False
+        self.mark('first_snapshot', receive_time)
+        return True
+
+
+class ConnectionPhaseRecorder:
+    """Histogram thời gian của từng giai đoạn kết nối, gộp được giữa các worker"""
+
+    def __init__(self):
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+
+    def timeline(self):
+        return ConnectionTimeline(self)
+
+    def record(self, phase, value_ms):
+        self.histograms[phase].record(value_ms)
+
+    def merge(self, other):
+        for phase in PHASES:
+            self.histograms[phase].merge(other.histograms[phase])
+        return self
+
+    def summary(self):
+        """Thống kê của từng giai đoạn (count, avg, median, P95, P99, max)"""
+        return {phase: self.histograms[phase].summary() for phase in PHASES}
+
+    def to_dict(self):
+        return {
+            'summary': self.summary(),
+            'histograms': {phase: self.histograms[phase].to_dict() for phase in PHASES}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        recorder = cls()
+        for phase, histogram in data['histograms'].items():
+            recorder.histograms[phase] = LatencyHistogram.from_dict(histogram)
+        return recorder
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    timeline = _current_timeline.get()
+    if timeline is not None:
+        timeline.mark('tcp_connect')
+
+
+async def _on_request_end(session, trace_config_ctx, params):
+    timeline = _current_timeline.get()
+    if timeline is not None and params.response.status == 101:
+        timeline.mark('ws_upgrade')
+
+
+def create_trace_config():
+    """TraceConfig cho aiohttp session của client WebSocket, ghi các giai đoạn TCP và nâng cấp WebSocket"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
@@ -7,73 +7,125 @@ Tạo biểu đồ so sánh hiệu năng hệ thống ở các mức tải khác
 """
 
 import os
-import glob
 import json
+import argparse
+import shutil
 import pandas as pd
 import numpy as np
+import matplotlib
+# Vẽ không cần màn hình (chạy được trên server CI và trong các tiến trình con của process pool)
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import re
 
-def get_latest_result_files():
-    """Lấy file kết quả mới nhất cho mỗi loại test"""
-    results_dir = 'results'
-    
-    # Tìm tất cả các file JSON kết quả
-    json_files = glob.glob(os.path.join(results_dir, 'api_to_ws_latency_*_clients_*.json'))
-    
-    # Sắp xếp files theo thời gian tạo (mới nhất lên đầu)
-    json_files.sort(key=os.path.getmtime, reverse=True)
-    
-    # Nhóm theo số lượng client
-    client_counts = [100, 1000, 10000]
-    latest_files = {}
+from raw_samples import load_raw_samples
+from run_catalog import get_latest_result_files
+from report_cache import ReportCache, file_hash
+from latency_histogram import LatencyHistogram
+from interactive_report import (REPORT_DATA_VERSION, INTERACTIVE_STYLE,
+                                build_run_data, render_interactive_charts)
+
+# Tăng khi thay đổi cách vẽ biểu đồ để bộ đệm không dùng lại ảnh cũ
+CHART_VERSION = 2
+# Tăng khi thay đổi summarize_result để bộ đệm không dùng lại thống kê tóm tắt cũ
+SUMMARY_VERSION = 1
+# Số khoảng của biểu đồ phân phối độ trễ
+DISTRIBUTION_BINS = 30
+
+def bin_latency_distribution(data, file_path, bins=DISTRIBUTION_BINS):
+    """
+    Gộp phân phối độ trễ của một file kết quả thành `bins` khoảng (mật độ) trước khi vẽ,
+    để thời gian vẽ không phụ thuộc số mẫu. Ưu tiên histogram đã lưu trong file, nếu không có thì dùng mẫu thô.
+    """
+    if data.get('histogram'):
+        histogram = LatencyHistogram.from_dict(data['histogram'])
+        if histogram.count == 0:
+            return None
+        edges, counts = histogram.linear_bins(bins)
+        stats = histogram.summary()
+        avg, p95 = stats['avg_ms'], stats['p95_ms']
+    else:
+        # Mẫu thô được đọc từ file .npy (memory-mapped) thay vì parse từ JSON
+        times = load_raw_samples(data, file_path)
+        if len(times) == 0:
+            return None
+        counts, edges = np.histogram(times, bins=bins)
+        avg, p95 = float(np.mean(times)), float(np.percentile(times, 95))
+    
+    density = counts / (counts.sum() * np.diff(edges))
+    return {'edges': edges, 'density': density, 'avg': avg, 'p95': p95}
+
+def load_distributions(files_dict):
+    """Phân phối độ trễ đã gộp khoảng của các file kết quả"""
+    distributions = {}
     
-    for count in client_counts:
-        # Tìm file mới nhất cho số lượng client này
-        pattern = f"api_to_ws_latency_{count}_clients_"
-        matching_files = [f for f in json_files if pattern in f]
-        
-        if matching_files:
-            latest_files[count] = matching_files[0]
+    for client_count, file_path in files_dict.items():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            distribution = bin_latency_distribution(data, file_path)
+            if distribution is not None:
+                distributions[client_count] = distribution
+        except Exception as e:
+            print(f"Lỗi khi đọc file {file_path}: {e}")
     
-    return latest_files
+    return distributions
 
-def load_results(files_dict):
-    """Đọc dữ liệu từ các file JSON"""
-    results = {}
+def summarize_result(client_count, data):
+    """Các thống kê tóm tắt của một file kết quả (một dòng của DataFrame tổng hợp)"""
+    return {
+        'client_count': client_count,
+        'connected_clients': data['stats']['connected_clients'],
+        'received_update': data['stats']['clients_received_update'],
+        'avg_latency_ms': data['stats']['avg_latency_ms'],
+        'median_latency_ms': data['stats']['median_latency_ms'],
+        'min_latency_ms': data['stats']['min_latency_ms'],
+        'max_latency_ms': data['stats']['max_latency_ms'],
+        'p95_latency_ms': data['stats']['p95_latency_ms'],
+        'p99_latency_ms': data['stats']['p99_latency_ms'],
+        'std_dev_ms': data['stats']['std_dev_ms']
+    }
+
+def load_summaries(files_dict, file_hashes, cache):
+    """Thống kê tóm tắt của các file kết quả; file có nội dung không đổi thì lấy từ bộ đệm, không parse lại"""
+    summaries = {}
     
     for client_count, file_path in files_dict.items():
+        def load():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return summarize_result(client_count, json.load(f))
         try:
+            summaries[client_count] = cache.get_summary(file_hashes[client_count], load, kind=f'summary_v{SUMMARY_VERSION}')
+        except Exception as e:
+            print(f"Lỗi khi đọc file {file_path}: {e}")
+    
+    return summaries
+
+def load_interactive_data(files_dict, file_hashes, summaries, cache):
+    """Dữ liệu gộp sẵn cho các biểu đồ tương tác, theo thứ tự số client; lấy từ bộ đệm nếu file không đổi"""
+    runs = []
+    
+    for client_count in sorted(summaries):
+        file_path = files_dict[client_count]
+        def load():
             with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                results[client_count] = data
+                return build_run_data(json.load(f), file_path)
+        try:
+            run = cache.get_summary(file_hashes[client_count], load, kind=f'interactive_v{REPORT_DATA_VERSION}')
         except Exception as e:
             print(f"Lỗi khi đọc file {file_path}: {e}")
+            continue
+        runs.append(dict(run, client_count=int(client_count), summary=summaries[client_count]))
     
-    return results
+    return runs
 
-def create_summary_dataframe(results):
-    """Tạo DataFrame tổng hợp từ kết quả"""
-    summary_data = []
-    
-    for client_count, data in results.items():
-        summary_data.append({
-            'client_count': client_count,
-            'connected_clients': data['stats']['connected_clients'],
-            'received_update': data['stats']['clients_received_update'],
-            'avg_latency_ms': data['stats']['avg_latency_ms'],
-            'median_latency_ms': data['stats']['median_latency_ms'],
-            'min_latency_ms': data['stats']['min_latency_ms'],
-            'max_latency_ms': data['stats']['max_latency_ms'],
-            'p95_latency_ms': data['stats']['p95_latency_ms'],
-            'p99_latency_ms': data['stats']['p99_latency_ms'],
-            'std_dev_ms': data['stats']['std_dev_ms']
-        })
-    
-    return pd.DataFrame(summary_data)
+def create_summary_dataframe(summaries):
+    """Tạo DataFrame tổng hợp từ thống kê tóm tắt của các file kết quả"""
+    return pd.DataFrame([summaries[client_count] for client_count in sorted(summaries)])
 
-def create_latency_comparison_chart(df, save_dir):
+def create_latency_comparison_chart(df, save_dir, chart_path=None):
     """Tạo biểu đồ so sánh độ trễ ở các mức tải khác nhau"""
     # Chuẩn bị dữ liệu
     client_counts = df['client_count'].tolist()
@@ -119,12 +171,14 @@ def create_latency_comparison_chart(df, save_dir):
     
     # Lưu biểu đồ
     os.makedirs(save_dir, exist_ok=True)
-    chart_path = os.path.join(save_dir, f'latency_comparison_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+    if chart_path is None:
+        chart_path = os.path.join(save_dir, f'latency_comparison_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
     plt.savefig(chart_path, dpi=300)
+    plt.close()
     
     return chart_path
 
-def create_scalability_chart(df, save_dir):
+def create_scalability_chart(df, save_dir, chart_path=None):
     """Tạo biểu đồ phân tích khả năng mở rộng của hệ thống"""
     # Tạo biểu đồ
     fig, ax1 = plt.subplots(figsize=(12, 8))
@@ -184,9 +238,9 @@ def create_scalability_chart(df, save_dir):
         avg_latency = row['avg_latency_ms']
         
         table_data.append([
-            f"{client_count:,d}",
-            f"{connected:,d}",
-            f"{received:,d}",
+            f"{int(client_count):,d}",
+            f"{int(connected):,d}",
+            f"{int(received):,d}",
             f"{rate:.1f}%",
             f"{avg_latency:.1f}"
         ])
@@ -202,32 +256,29 @@ def create_scalability_chart(df, save_dir):
     
     # Lưu biểu đồ
     os.makedirs(save_dir, exist_ok=True)
-    chart_path = os.path.join(save_dir, f'scalability_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+    if chart_path is None:
+        chart_path = os.path.join(save_dir, f'scalability_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
     plt.savefig(chart_path, dpi=300)
+    plt.close()
     
     return chart_path
 
-def create_distribution_comparison(results, save_dir):
-    """Tạo biểu đồ so sánh phân phối độ trễ giữa các mức tải"""
+def create_distribution_comparison(distributions, save_dir, chart_path=None):
+    """Tạo biểu đồ so sánh phân phối độ trễ giữa các mức tải từ các phân phối đã gộp khoảng"""
     plt.figure(figsize=(14, 8))
     
     colors = ['royalblue', 'green', 'firebrick']
     alphas = [0.7, 0.6, 0.5]
     
     # Vẽ histogram cho mỗi mức tải
-    for i, (client_count, data) in enumerate(results.items()):
-        times = data['raw_data']['propagation_times_ms']
-        if not times:
-            continue
-            
-        # Tính các giá trị thống kê
-        avg = np.mean(times)
-        median = np.median(times)
-        p95 = np.percentile(times, 95)
+    for i, (client_count, distribution) in enumerate(distributions.items()):
+        edges = distribution['edges']
+        avg = distribution['avg']
+        p95 = distribution['p95']
         
-        # Vẽ histogram
-        n, bins, patches = plt.hist(times, bins=30, alpha=alphas[i % len(alphas)], 
-                              color=colors[i % len(colors)], density=True,
+        # Vẽ histogram từ các khoảng đã tính sẵn
+        n, bins, patches = plt.hist(edges[:-1], bins=edges, weights=distribution['density'],
+                              alpha=alphas[i % len(alphas)], color=colors[i % len(colors)],
                               label=f'{client_count} clients (avg={avg:.1f}ms, p95={p95:.1f}ms)')
         
         # Thêm đường thẳng cho giá trị trung bình
@@ -242,13 +293,15 @@ def create_distribution_comparison(results, save_dir):
     
     # Lưu biểu đồ
     os.makedirs(save_dir, exist_ok=True)
-    chart_path = os.path.join(save_dir, f'distribution_comparison_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
+    if chart_path is None:
+        chart_path = os.path.join(save_dir, f'distribution_comparison_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
     plt.savefig(chart_path, dpi=300)
+    plt.close()
     
     return chart_path
 
-def generate_html_report(df, chart_paths, save_dir):
-    """Tạo báo cáo HTML"""
+def generate_html_report(df, chart_paths, save_dir, interactive_runs=None):
+    """Tạo báo cáo HTML: biểu đồ tương tác vẽ từ dữ liệu gộp sẵn nhúng trong trang, kèm ảnh PNG nếu có"""
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     html_content = f"""
@@ -270,6 +323,7 @@ def generate_html_report(df, chart_paths, save_dir):
             tr:hover {{ background-color: #f5f5f5; }}
             .summary {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin-bottom: 20px; }}
             .footer {{ margin-top: 30px; padding-top: 10px; border-top: 1px solid #ddd; color: #777; font-size: 0.9em; }}
+            {INTERACTIVE_STYLE}
         </style>
     </head>
     <body>
@@ -320,6 +374,14 @@ def generate_html_report(df, chart_paths, save_dir):
             <h2>Biểu đồ phân tích</h2>
     """
     
+    if interactive_runs:
+        html_content += render_interactive_charts(interactive_runs)
+    
+    if chart_paths:
+        html_content += """
+            <h2>Biểu đồ tĩnh (PNG)</h2>
+        """
+    
     # Thêm từng biểu đồ
     for chart_title, chart_path in chart_paths.items():
         # Chuyển đổi đường dẫn tuyệt đối thành tương đối
@@ -348,8 +410,27 @@ def generate_html_report(df, chart_paths, save_dir):
     
     return html_path
 
+def render_charts(jobs, max_workers=None):
+    """Vẽ các biểu đồ độc lập song song trên process pool; jobs là danh sách (hàm vẽ, tham số)"""
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(jobs) <= 1:
+        return [render(*args) for render, args in jobs]
+    
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        futures = [pool.submit(render, *args) for render, args in jobs]
+        return [future.result() for future in futures]
+
+def copy_if_changed(src_path, dest_path):
+    """Sao chép file nếu đích chưa có hoặc khác kích thước / thời điểm sửa (copy2 giữ nguyên mtime)"""
+    if os.path.exists(dest_path):
+        src_stat, dest_stat = os.stat(src_path), os.stat(dest_path)
+        if src_stat.st_size == dest_stat.st_size and int(src_stat.st_mtime) == int(dest_stat.st_mtime):
+            return False
+    shutil.copy2(src_path, dest_path)
+    return True
+
 def copy_result_files_to_scalability_dir(files_dict, target_dir):
-    """Sao chép các file kết quả vào thư mục phân tích khả năng mở rộng"""
+    """Sao chép các file kết quả vào thư mục phân tích khả năng mở rộng (bỏ qua file đã sao chép và không đổi)"""
     os.makedirs(target_dir, exist_ok=True)
     
     copied_files = {}
@@ -361,25 +442,35 @@ def copy_result_files_to_scalability_dir(files_dict, target_dir):
             dest_path = os.path.join(target_dir, file_name)
             
             # Sao chép file
-            import shutil
-            shutil.copy2(src_path, dest_path)
+            copy_if_changed(src_path, dest_path)
             copied_files[client_count] = dest_path
             
             # Tìm file biểu đồ PNG tương ứng
             src_dir = os.path.dirname(src_path)
             base_name = os.path.splitext(file_name)[0]
-            png_pattern = f"{base_name}.png"
             
             for file in os.listdir(src_dir):
-                if file.startswith(base_name) and file.endswith('.png'):
-                    png_src = os.path.join(src_dir, file)
-                    png_dest = os.path.join(target_dir, file)
-                    shutil.copy2(png_src, png_dest)
+                # Biểu đồ PNG và các file mẫu thô .npy đi kèm
+                if file.startswith(base_name) and file.endswith(('.png', '.npy')):
+                    copy_if_changed(os.path.join(src_dir, file), os.path.join(target_dir, file))
     
     return copied_files
 
 def main():
     """Hàm chính tạo báo cáo tổng hợp"""
+    parser = argparse.ArgumentParser(description='Tạo báo cáo phân tích khả năng mở rộng')
+    
+    parser.add_argument('--rebuild', action='store_true',
+                      help='Bỏ qua bộ đệm, parse lại tất cả file kết quả và vẽ lại tất cả biểu đồ')
+    
+    parser.add_argument('--jobs', type=int, default=None,
+                      help='Số tiến trình vẽ biểu đồ song song (mặc định: số CPU)')
+    
+    parser.add_argument('--png', action='store_true',
+                      help='Vẽ thêm các biểu đồ PNG bằng matplotlib và chèn vào báo cáo (mặc định: chỉ biểu đồ tương tác)')
+    
+    args = parser.parse_args()
+    
     print("Bắt đầu tạo báo cáo phân tích khả năng mở rộng...")
     
     # Đường dẫn thư mục lưu kết quả
@@ -396,33 +487,54 @@ def main():
     # Sao chép các file kết quả vào thư mục phân tích
     copy_result_files_to_scalability_dir(result_files, scalability_dir)
     
-    # Đọc dữ liệu từ các file
-    results = load_results(result_files)
+    # Bộ đệm theo hash nội dung: file kết quả không đổi thì không parse lại, biểu đồ có đầu vào không đổi thì không vẽ lại
+    cache = ReportCache(scalability_dir, enabled=not args.rebuild)
+    file_hashes = {client_count: file_hash(path) for client_count, path in result_files.items()}
+    
+    # Đọc thống kê tóm tắt từ các file
+    summaries = load_summaries(result_files, file_hashes, cache)
     
-    if not results:
+    if not summaries:
         print("Không thể đọc dữ liệu từ các file kết quả.")
         return
     
     # Tạo DataFrame tổng hợp
-    df = create_summary_dataframe(results)
+    df = create_summary_dataframe(summaries)
+    input_hashes = {client_count: file_hashes[client_count] for client_count in summaries}
+    
+    # Phân phối độ trễ chỉ được đọc (và gộp khoảng ở tiến trình chính) khi biểu đồ phân phối cần vẽ lại
+    chart_specs = [
+        ("So sánh độ trễ ở các mức tải", 'latency_comparison', create_latency_comparison_chart, lambda: df),
+        ("Phân tích khả năng mở rộng", 'scalability_analysis', create_scalability_chart, lambda: df),
+        ("So sánh phân phối độ trễ", 'distribution_comparison', create_distribution_comparison,
+         lambda: load_distributions({client_count: result_files[client_count] for client_count in sorted(summaries)}))
+    ]
+    
+    # Dữ liệu gộp sẵn cho biểu đồ tương tác (nhúng vào HTML)
+    interactive_runs = load_interactive_data(result_files, file_hashes, summaries, cache)
     
-    # Tạo các biểu đồ
+    # Tạo các biểu đồ PNG: chỉ vẽ những biểu đồ có đầu vào thay đổi, song song trên nhiều tiến trình
     chart_paths = {}
+    jobs = []
     
-    print("Tạo biểu đồ so sánh độ trễ...")
-    chart_paths["So sánh độ trễ ở các mức tải"] = create_latency_comparison_chart(df, scalability_dir)
+    for title, name, render, get_input in (chart_specs if args.png else []):
+        chart_path, cached = cache.artifact_path(name, input_hashes, version=CHART_VERSION)
+        if cached:
+            print(f"Dùng lại biểu đồ {title.lower()} (dữ liệu không đổi)")
+        else:
+            print(f"Tạo biểu đồ {title.lower()}...")
+            jobs.append((render, (get_input(), scalability_dir, chart_path)))
+        chart_paths[title] = chart_path
     
-    print("Tạo biểu đồ phân tích khả năng mở rộng...")
-    chart_paths["Phân tích khả năng mở rộng"] = create_scalability_chart(df, scalability_dir)
+    render_charts(jobs, args.jobs)
     
-    print("Tạo biểu đồ so sánh phân phối độ trễ...")
-    chart_paths["So sánh phân phối độ trễ"] = create_distribution_comparison(results, scalability_dir)
+    cache.save()
     
     # Tạo báo cáo HTML
     print("Tạo báo cáo HTML...")
-    html_path = generate_html_report(df, chart_paths, scalability_dir)
+    html_path = generate_html_report(df, chart_paths, scalability_dir, interactive_runs)
     
-    print(f"\nBáo cáo đã được tạo thành công:")
+    print(f"\nBáo cáo đã được tạo thành công (bộ đệm: {cache.hits} dùng lại, {cache.misses} tạo mới):")
     print(f"- HTML: {html_path}")
     for title, path in chart_paths.items():
         print(f"- {title}: {path}")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Giám sát chính harness đo (tiến trình tạo tải), để số liệu phản ánh server chứ không phải máy đo
+- Độ trễ event loop: một timer tần suất cao tự đo độ lệch giữa thời điểm dự kiến và thời điểm thực sự chạy.
+  Khi event loop bận, thời điểm nhận dữ liệu trong handler gold-prices-updated cũng bị trễ tương ứng
+- CPU của chính tiến trình harness (mỗi worker một bộ), dùng lại ServerResourceSampler
+- Đánh giá lần đo: bị đánh dấu không hợp lệ khi P99 độ trễ event loop hoặc CPU của một tiến trình harness vượt ngưỡng
+"""
+
+import asyncio
+import os
+import time
+
+from latency_histogram import LatencyHistogram
+from server_resource_sampler import ServerResourceSampler
+
+
+class EventLoopLagMonitor:
+    """Đo độ trễ của event loop đang chạy bằng một timer chu kỳ interval giây"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.origin = None
+        # Độ trễ trong cửa sổ đo hiện tại (reset() khi bắt đầu đo, bỏ qua giai đoạn mở kết nối)
+        self.histogram = LatencyHistogram()
+        # [thời điểm (giây từ origin), độ trễ lớn nhất trong mỗi giây (ms)] của cả lần chạy
+        self.timeline = []
+        self._task = None
+
+    def start(self, origin=None):
+        """Bắt đầu đo trên event loop đang chạy"""
+        self.origin = origin if origin is not None else time.perf_counter()
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def _run(self):
+        bucket_start = time.perf_counter()
+        bucket_max = 0.0
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag_ms = max(0.0, (now - expected) * 1000)
+            self.histogram.record(lag_ms)
+            bucket_max = max(bucket_max, lag_ms)
+            if now - bucket_start >= 1.0:
+                self.timeline.append([round(bucket_start - self.origin, 3), round(bucket_max, 3)])
+                bucket_start, bucket_max = now, 0.0
+
+    def reset(self):
+        """Bắt đầu cửa sổ đo mới, timeline vẫn giữ nguyên"""
+        self.histogram = LatencyHistogram()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def summary(self):
+        stats = self.histogram.summary()
+        if not stats['count']:
+            return {'samples': 0}
+        return {
+            'samples': stats['count'],
+            'avg_ms': stats['avg_ms'],
+            'p50_ms': stats['median_ms'],
+            'p99_ms': stats['p99_ms'],
+            'max_ms': stats['max_ms']
+        }
+
+    def to_dict(self):
+        return {
+            'interval_ms': self.interval * 1000,
+            'summary': self.summary(),
+            'histogram': self.histogram.to_dict(),
+            'timeline': self.timeline
+        }
+
+
+class HarnessMonitor:
+    """Độ trễ event loop và CPU của tiến trình harness hiện tại"""
+
+    def __init__(self, lag_interval=0.01, cpu_interval=1.0, label='main'):
+        self.label = label
+        self.lag = EventLoopLagMonitor(lag_interval)
+        self.cpu = ServerResourceSampler([os.getpid()], cpu_interval, include_children=False) if cpu_interval else None
+        self.origin = None
+        self.window_start_s = 0.0
+
+    def start(self, origin=None):
+        """Bắt đầu giám sát; origin (perf_counter) nên trùng gốc thời gian của lần chạy"""
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.lag.start(self.origin)
+        if self.cpu is not None:
+            self.cpu.start(self.origin)
+        return self
+
+    def reset_window(self):
+        """Bắt đầu cửa sổ đánh giá mới, ví dụ ngay trước khi gửi cập nhật (sau khi đã mở xong kết nối)"""
+        self.lag.reset()
+        self.window_start_s = time.perf_counter() - self.origin
+
+    async def stop(self):
+        await self.lag.stop()
+        if self.cpu is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.cpu.stop)
+
+    def to_dict(self):
+        """Số liệu trong cửa sổ đánh giá hiện tại (CPU chỉ gồm các mẫu trong cửa sổ), kèm timeline cả lần chạy"""
+        return {
+            'label': self.label,
+            'pid': os.getpid(),
+            'window_start_s': self.window_start_s,
+            'event_loop_lag': self.lag.to_dict(),
+            'cpu': self.cpu.to_dict(self.window_start_s) if self.cpu is not None else None
+        }
+
+
+def evaluate_harness(processes, max_loop_lag_ms=50.0, max_cpu_percent=90.0):
+    """
+    Đánh giá lần đo từ to_dict() của các tiến trình harness (tiến trình chính và các worker).
+    Trả về {'valid', 'reasons', ...}; valid=False nghĩa là harness đã quá tải nên độ trễ đo được không đáng tin.
+    """
+    reasons = []
+    worst_lag = None
+    worst_cpu = None
+
+    for process in processes:
+        lag_p99 = process['event_loop_lag']['summary'].get('p99_ms')
+        if lag_p99 is not None:
+            worst_lag = lag_p99 if worst_lag is None else max(worst_lag, lag_p99)
+            if lag_p99 > max_loop_lag_ms:
+                reasons.append(f"{process['label']}: P99 độ trễ event loop {lag_p99:.1f}ms > {max_loop_lag_ms:.1f}ms")
+
+        cpu_summary = (process.get('cpu') or {}).get('summary') or {}
+        cpu = cpu_summary.get('max_cpu_percent')
+        if cpu is not None:
+            worst_cpu = cpu if worst_cpu is None else max(worst_cpu, cpu)
+            if cpu > max_cpu_percent:
+                reasons.append(f"{process['label']}: CPU {cpu:.0f}% > {max_cpu_percent:.0f}%")
+
+    return {
+        'valid': not reasons,
+        'reasons': reasons,
+        'max_loop_lag_p99_ms': worst_lag,
+        'max_cpu_percent': worst_cpu,
+        'thresholds': {'max_loop_lag_ms': max_loop_lag_ms, 'max_cpu_percent': max_cpu_percent}
+    }
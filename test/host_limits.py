@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm tra giới hạn của máy chạy harness trước khi mở nhiều kết nối
+- RLIMIT_NOFILE: mỗi kết nối WebSocket tốn một file descriptor, soft limit mặc định thường chỉ 1024;
+  soft limit được nâng lên (tối đa bằng hard limit) nếu chưa đủ
+- Cổng tạm (ephemeral port): mỗi kết nối từ một địa chỉ nguồn đến cùng host:port của server cần một cổng riêng,
+  nên một địa chỉ nguồn chỉ mở được khoảng 28k-64k kết nối (net.ipv4.ip_local_port_range)
+- Địa chỉ nguồn: kết nối lần lượt (round-robin) từ nhiều địa chỉ cục bộ, ví dụ 127.0.0.2-127.0.0.20
+  khi server chạy trên localhost (Linux định tuyến cả dải 127.0.0.0/8 qua loopback),
+  mỗi địa chỉ có một dải cổng tạm riêng
+"""
+
+import errno
+import ipaddress
+import socket
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:
+    # Windows không có module resource (giới hạn handle do hệ điều hành quản lý)
+    resource = None
+
+# Số fd dự phòng ngoài các kết nối client: publisher HTTP, file kết quả, pipe của worker, ...
+FD_MARGIN = 256
+
+PORT_RANGE_PATH = '/proc/sys/net/ipv4/ip_local_port_range'
+
+
+def parse_source_addresses(spec):
+    """
+    Danh sách địa chỉ nguồn từ chuỗi dạng "127.0.0.2-127.0.0.20,10.0.0.5" (khoảng hoặc từng địa chỉ, cách nhau bởi dấu phẩy).
+    Trả về [] nếu spec rỗng.
+    """
+    addresses = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (ipaddress.ip_address(value.strip()) for value in part.split('-', 1))
+            if last < first:
+                raise ValueError(f'Khoảng địa chỉ không hợp lệ: {part}')
+            addresses.extend(str(ipaddress.ip_address(value)) for value in range(int(first), int(last) + 1))
+        else:
+            addresses.append(str(ipaddress.ip_address(part)))
+    return list(dict.fromkeys(addresses))
+
+
+def read_nofile_limit():
+    """(soft, hard) của RLIMIT_NOFILE, None nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return None
+    return resource.getrlimit(resource.RLIMIT_NOFILE)
+
+
+def raise_nofile_limit(needed):
+    """
+    Nâng soft limit RLIMIT_NOFILE lên needed (tối đa bằng hard limit) nếu đang thấp hơn.
+    Trả về (soft, hard) sau khi nâng, None nếu không hỗ trợ.
+    """
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass
+    return resource.getrlimit(resource.RLIMIT_NOFILE)
+
+
+def read_ephemeral_port_range():
+    """(cổng đầu, cổng cuối) của dải cổng tạm (Linux), None nếu không đọc được"""
+    try:
+        with open(PORT_RANGE_PATH) as f:
+            low, high = (int(value) for value in f.read().split())
+    except (OSError, ValueError):
+        return None
+    return low, high
+
+
+def is_loopback_server(server_url):
+    host = urlparse(server_url).hostname or 'localhost'
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_source_address(address):
+    """Thử bind một socket TCP vào address; trả về None nếu được, thông báo lỗi nếu không"""
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.bind((address, 0))
+    except OSError as e:
+        return e.strerror or str(e)
+    finally:
+        sock.close()
+    return None
+
+
+def check_client_limits(client_count, server_url, source_addresses=None, processes=1):
+    """
+    Kiểm tra máy harness có mở được client_count kết nối đến server_url không, chia cho processes tiến trình.
+    Nâng soft limit RLIMIT_NOFILE của tiến trình hiện tại (tiến trình worker tạo sau đó thừa hưởng giới hạn mới).
+    Trả về dict gồm giới hạn đo được, các địa chỉ nguồn dùng được và danh sách problems (rỗng nếu đủ).
+    """
+    problems = []
+    per_process = -(-client_count // max(1, processes)) + FD_MARGIN
+
+    before = read_nofile_limit()
+    after = raise_nofile_limit(per_process)
+    nofile = None
+    if after is not None:
+        soft, hard = after
+        unlimited = soft == resource.RLIM_INFINITY
+        nofile = {
+            'soft': None if unlimited else soft,
+            'hard': None if hard == resource.RLIM_INFINITY else hard,
+            'raised_from': before[0] if before != after else None,
+            'needed_per_process': per_process
+        }
+        if not unlimited and soft < per_process:
+            problems.append(f'RLIMIT_NOFILE chỉ cho {soft} fd mỗi tiến trình, cần khoảng {per_process} '
+                            f'(hard limit {nofile["hard"] or "không giới hạn"}; tăng bằng ulimit -n hoặc chia thêm --workers)')
+
+    usable = []
+    for address in source_addresses or []:
+        error = check_source_address(address)
+        if error is None:
+            usable.append(address)
+        else:
+            problems.append(f'Không dùng được địa chỉ nguồn {address}: {error}')
+
+    port_range = read_ephemeral_port_range()
+    ports = None
+    if port_range is not None:
+        per_address = port_range[1] - port_range[0] + 1
+        # Mỗi địa chỉ nguồn có dải cổng tạm riêng cho cùng một host:port của server
+        address_count = len(usable) if source_addresses else 1
+        ports = {
+            'low': port_range[0],
+            'high': port_range[1],
+            'per_address': per_address,
+            'max_connections': per_address * address_count
+        }
+        if client_count > ports['max_connections']:
+            hint = ('thêm địa chỉ, ví dụ --source-addrs 127.0.0.2-127.0.0.20' if is_loopback_server(server_url)
+                    else 'thêm địa chỉ nguồn đã gán cho card mạng bằng --source-addrs')
+            problems.append(f'Dải cổng tạm {port_range[0]}-{port_range[1]} chỉ đủ cho khoảng {ports["max_connections"]:,} '
+                            f'kết nối từ {address_count} địa chỉ nguồn, cần {client_count:,} ({hint})')
+
+    return {
+        'client_count': client_count,
+        'processes': processes,
+        'nofile': nofile,
+        'ephemeral_ports': ports,
+        'source_addresses': usable,
+        'problems': problems
+    }
+
+
+def describe_connect_error(error):
+    """Giải thích lỗi kết nối do cạn tài nguyên của máy harness (fd, cổng tạm); None nếu không phải các lỗi này"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        # aiohttp.ClientConnectorError giữ lỗi gốc trong os_error
+        os_error = getattr(error, 'os_error', None)
+        for candidate in (error, os_error):
+            if isinstance(candidate, OSError):
+                if candidate.errno in (errno.EMFILE, errno.ENFILE):
+                    return 'hết file descriptor (RLIMIT_NOFILE) trên máy harness'
+                if candidate.errno == errno.EADDRNOTAVAIL:
+                    return 'hết cổng tạm (ephemeral port) hoặc địa chỉ nguồn không hợp lệ, thêm --source-addrs'
+                if candidate.errno == errno.EADDRINUSE:
+                    return 'hết cổng tạm (ephemeral port) của địa chỉ nguồn, thêm --source-addrs'
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def format_host_limits(limits):
+    """Các dòng mô tả kết quả của check_client_limits để in ra màn hình (không gồm problems)"""
+    lines = []
+    nofile = limits['nofile']
+    if nofile is not None:
+        raised = f" (đã nâng từ {nofile['raised_from']})" if nofile['raised_from'] is not None else ''
+        lines.append(f"RLIMIT_NOFILE: {nofile['soft'] or 'không giới hạn'}{raised}, "
+                     f"cần khoảng {nofile['needed_per_process']} mỗi tiến trình")
+    ports = limits['ephemeral_ports']
+    if ports is not None:
+        lines.append(f"Cổng tạm: {ports['low']}-{ports['high']}, tối đa khoảng {ports['max_connections']:,} kết nối đến server")
+    addresses = limits['source_addresses']
+    if addresses:
+        listed = addresses[0] if len(addresses) == 1 else f'{addresses[0]} ... {addresses[-1]}'
+        lines.append(f"Địa chỉ nguồn: {len(addresses)} địa chỉ ({listed}), dùng lần lượt cho từng kết nối")
+    return lines
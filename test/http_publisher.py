@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Gửi cập nhật giá vàng đến API /api/add mà không chặn event loop
+- Dùng aiohttp session với pool kết nối keep-alive, tái sử dụng giữa các lần gửi
+- Đo thời gian bằng đồng hồ đơn điệu (time.perf_counter), cùng đồng hồ với thời điểm nhận
+  dữ liệu của các client WebSocket
+- Ghi riêng thời điểm gửi, thời điểm nhận response header và thời điểm server xác nhận (body)
+"""
+
+import json
+import time
+
+import aiohttp
+
+
+class GoldPricePublisher:
+    """Client HTTP bất đồng bộ, giữ kết nối đến server giữa các lần gửi"""
+
+    def __init__(self, server_url, api_endpoint='/api/add', pool_size=4, timeout=5):
+        self.server_url = server_url.rstrip('/')
+        self.api_endpoint = api_endpoint
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = None
+
+    async def start(self):
+        """Tạo session và mở sẵn một kết nối để lần gửi đầu không phải chịu TCP handshake"""
+        if self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            json_serialize=lambda data: json.dumps(data, ensure_ascii=False)
+        )
+        try:
+            async with self.session.get(f"{self.server_url}/api/gold-prices") as response:
+                await response.read()
+        except Exception:
+            pass
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def publish(self, payload, sent_at=None):
+        """
+        Gửi POST và trả về dict gồm:
+        ok, status, body, error, sent_at, response_at, ack_at (perf_counter, giây)
+        sent_at có thể được truyền vào để trùng với mốc thời gian mà client dùng để tính độ trễ.
+        """
+        if self.session is None:
+            await self.start()
+
+        result = {
+            'ok': False,
+            'status': None,
+            'body': None,
+            'error': None,
+            'sent_at': sent_at if sent_at is not None else time.perf_counter(),
+            'response_at': None,
+            'ack_at': None
+        }
+
+        try:
+            async with self.session.post(f"{self.server_url}{self.api_endpoint}", json=payload) as response:
+                result['response_at'] = time.perf_counter()
+                result['status'] = response.status
+                result['body'] = await response.text()
+                result['ack_at'] = time.perf_counter()
+                # Node trả về 200, server Go trả về 201 cho /api/add
+                result['ok'] = response.status in (200, 201)
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+
+        return result
+
+
+def summarize_publish(result):
+    """Rút gọn kết quả gửi thành các khoảng thời gian (ms) để lưu vào JSON"""
+    summary = {'status': result['status'], 'ok': result['ok']}
+    if result['response_at'] is not None:
+        summary['response_ms'] = (result['response_at'] - result['sent_at']) * 1000
+    if result['ack_at'] is not None:
+        summary['ack_ms'] = (result['ack_at'] - result['sent_at']) * 1000
+    if result['error']:
+        summary['error'] = result['error']
+    return summary
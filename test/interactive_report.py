@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Biểu đồ tương tác cho báo cáo HTML
+- Dữ liệu được gộp sẵn ở Python (histogram theo thang log, đường percentile, chuỗi tài nguyên server)
+  và nhúng vào HTML dưới dạng JSON gọn, không nhúng mẫu thô
+- Một đoạn script nhỏ nhúng sẵn trong trang vẽ lên <canvas>: kéo chuột để phóng to một khoảng
+  (trục y tự co theo dữ liệu trong khoảng đó, tiện xem phần đuôi), nhấp đúp để trở lại, rê chuột để xem giá trị
+- Không cần thư viện JS bên ngoài, báo cáo mở được khi không có mạng và đủ nhỏ để đính kèm
+"""
+
+import json
+
+import numpy as np
+
+from latency_histogram import LatencyHistogram
+from raw_samples import load_raw_samples
+
+# Tăng khi thay đổi cấu trúc dữ liệu gộp sẵn để bộ đệm không dùng lại dữ liệu cũ
+REPORT_DATA_VERSION = 2
+# Số khoảng (thang log) của histogram độ trễ
+INTERACTIVE_BINS = 60
+# Các mức percentile của đường percentile
+PERCENTILE_LEVELS = [0, 10, 25, 50, 75, 90, 95, 98, 99, 99.5, 99.9, 99.95, 99.99]
+
+
+def _rounded(values, digits=3):
+    return [round(float(v), digits) for v in values]
+
+
+def build_run_data(data, file_path):
+    """
+    Dữ liệu gộp sẵn của một file kết quả: histogram độ trễ theo thang log, đường percentile,
+    chuỗi tài nguyên server và thời điểm gửi cập nhật. Ưu tiên histogram đã lưu trong file, nếu không có thì dùng mẫu thô.
+    """
+    run = {'bins': None, 'percentiles': [], 'resources': None, 'update_offsets_s': []}
+
+    if data.get('histogram'):
+        histogram = LatencyHistogram.from_dict(data['histogram'])
+        if histogram.count > 0:
+            edges, counts = histogram.log_bins(INTERACTIVE_BINS)
+            percentiles = [histogram.percentile(level) for level in PERCENTILE_LEVELS]
+            run['bins'] = {'edges': _rounded(edges), 'counts': [int(c) for c in counts]}
+            run['percentiles'] = list(zip(PERCENTILE_LEVELS, _rounded(percentiles)))
+    else:
+        times = load_raw_samples(data, file_path)
+        if len(times) > 0:
+            low = max(float(np.min(times)), 1e-3)
+            high = max(float(np.max(times)), low * 1.01)
+            counts, edges = np.histogram(np.clip(times, low, high), bins=np.geomspace(low, high, INTERACTIVE_BINS + 1))
+            run['bins'] = {'edges': _rounded(edges), 'counts': [int(c) for c in counts]}
+            run['percentiles'] = list(zip(PERCENTILE_LEVELS, _rounded(np.percentile(times, PERCENTILE_LEVELS))))
+
+    samples = (data.get('server_resources') or {}).get('samples') or []
+    if samples:
+        run['resources'] = {
+            key: _rounded([sample[key] for sample in samples], 2)
+            for key in ('time_s', 'cpu_percent', 'rss_mb', 'num_fds')
+        }
+
+    # ws_latency_analyzer.py lưu một thời điểm gửi (chế độ sweep: các thời điểm gửi của mức tải),
+    # ws_performance_test.py lưu thời điểm của từng cập nhật
+    if (data.get('sweep') or {}).get('update_offsets_s'):
+        run['update_offsets_s'] = _rounded(data['sweep']['update_offsets_s'], 2)
+    elif data.get('update_offset_s') is not None:
+        run['update_offsets_s'] = _rounded([data['update_offset_s']], 2)
+    else:
+        run['update_offsets_s'] = _rounded([u['offset_s'] for u in data.get('updates', []) if u.get('offset_s') is not None], 2)
+
+    return run
+
+
+def render_interactive_charts(runs):
+    """
+    Phần HTML của các biểu đồ tương tác. runs là danh sách (đã sắp xếp theo số client) các dict
+    {'client_count', 'summary': dòng thống kê tóm tắt, ...build_run_data()}
+    """
+    # Tránh chuỗi "</script>" trong dữ liệu đóng thẻ script sớm
+    payload = json.dumps({'runs': runs}, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+    return f"""
+            <div class="ichart" id="chart-scaling"><h3>Độ trễ theo số client</h3></div>
+            <div class="ichart" id="chart-distribution"><h3>Phân phối độ trễ (thang log)</h3></div>
+            <div class="ichart" id="chart-percentiles"><h3>Đường percentile</h3></div>
+            <div class="ichart" id="chart-cpu"><h3>CPU của server</h3></div>
+            <div class="ichart" id="chart-rss"><h3>Bộ nhớ (RSS) của server</h3></div>
+            <p class="hint">Kéo chuột để phóng to một khoảng, nhấp đúp để trở lại, rê chuột để xem giá trị.</p>
+            <script type="application/json" id="report-data">{payload}</script>
+            <script>{_SCRIPT}</script>
+    """
+
+
+INTERACTIVE_STYLE = """
+            .ichart { position: relative; margin: 30px 0; }
+            .ichart canvas { width: 100%; border: 1px solid #ddd; cursor: crosshair; }
+            .ichart button { position: absolute; right: 0; top: 0; }
+            .ichart .tip { position: absolute; display: none; pointer-events: none; background: rgba(255,255,255,0.95);
+                           border: 1px solid #aaa; padding: 4px 8px; font-size: 12px; white-space: nowrap; }
+            .hint { color: #777; font-size: 0.9em; }
+"""
+
+_SCRIPT = r"""
+(function () {
+  var data = JSON.parse(document.getElementById('report-data').textContent);
+  var COLORS = ['#4169e1', '#2e8b57', '#b22222', '#ff8c00', '#8a2be2', '#008b8b', '#d2691e'];
+  var PAD = {l: 64, r: 16, t: 12, b: 44};
+
+  function fmt(v) {
+    var a = Math.abs(v);
+    return a >= 100 ? v.toFixed(0) : a >= 1 ? v.toFixed(1) : a > 0 ? v.toPrecision(2) : '0';
+  }
+  function niceTicks(lo, hi) {
+    var span = hi - lo || 1, step = Math.pow(10, Math.floor(Math.log10(span / 5))), err = span / 5 / step, ticks = [];
+    step *= err >= 7.5 ? 10 : err >= 3.5 ? 5 : err >= 1.5 ? 2 : 1;
+    for (var v = Math.ceil(lo / step) * step; v <= hi + step * 1e-9; v += step) ticks.push(v);
+    return ticks;
+  }
+  function logTicks(lo, hi) {
+    var ticks = [];
+    for (var e = Math.floor(lo); e <= Math.ceil(hi); e++) {
+      [1, 2, 5].forEach(function (m) { var v = e + Math.log10(m); if (v >= lo && v <= hi) ticks.push(v); });
+    }
+    return ticks.length > 12 ? ticks.filter(function (v) { return Math.abs(v - Math.round(v)) < 1e-9; }) : ticks;
+  }
+
+  // cfg: {series: [{name, color, points: [[x, y]]}], xLabel, yLabel, xLog, yLog, xTicks, xFormat, markers: [{x, color}]}
+  function Chart(container, cfg) {
+    var canvas = document.createElement('canvas'), tip = document.createElement('div'), ctx = canvas.getContext('2d');
+    var yLog = !!cfg.yLog, dragFrom = null, dragTo = null, view, full, scale;
+    tip.className = 'tip';
+    container.appendChild(canvas);
+    container.appendChild(tip);
+    if (cfg.logToggle) {
+      var button = document.createElement('button');
+      button.textContent = 'Trục y: log / tuyến tính';
+      button.onclick = function () { yLog = !yLog; draw(); };
+      container.appendChild(button);
+    }
+    function tx(v) { return cfg.xLog ? Math.log10(v) : v; }
+    function ty(v) { return yLog ? Math.log10(v) : v; }
+    function xLabel(v) { return cfg.xFormat ? cfg.xFormat(v) : fmt(cfg.xLog ? Math.pow(10, v) : v); }
+    function yLabel(v) { return fmt(yLog ? Math.pow(10, v) : v); }
+    function points(s) {
+      return s.points.map(function (p) { return [tx(p[0]), ty(p[1]), p]; })
+        .filter(function (p) { return isFinite(p[0]) && isFinite(p[1]); });
+    }
+    var xs = [];
+    cfg.series.forEach(function (s) { points(s).forEach(function (p) { xs.push(p[0]); }); });
+    if (!xs.length) { container.style.display = 'none'; return; }
+    full = [Math.min.apply(null, xs), Math.max.apply(null, xs)];
+    if (full[0] === full[1]) { full = [full[0] - 0.5, full[1] + 0.5]; }
+    view = full.slice();
+
+    function draw() {
+      var w = canvas.width = container.clientWidth || 900, h = canvas.height = cfg.height || 340;
+      var pw = w - PAD.l - PAD.r, ph = h - PAD.t - PAD.b, ys = [], series = cfg.series.map(points);
+      series.forEach(function (ps) { ps.forEach(function (p) { if (p[0] >= view[0] && p[0] <= view[1]) ys.push(p[1]); }); });
+      var y0 = ys.length ? Math.min.apply(null, ys) : 0, y1 = ys.length ? Math.max.apply(null, ys) : 1;
+      if (!yLog) y0 = Math.min(y0, 0);
+      if (y1 === y0) y1 = y0 + 1;
+      y1 += (y1 - y0) * 0.05;
+      scale = {
+        x: function (v) { return PAD.l + (v - view[0]) / (view[1] - view[0]) * pw; },
+        y: function (v) { return PAD.t + ph - (v - y0) / (y1 - y0) * ph; },
+        invX: function (px) { return view[0] + (px - PAD.l) / pw * (view[1] - view[0]); }
+      };
+      ctx.clearRect(0, 0, w, h);
+      ctx.font = '12px Arial';
+      ctx.strokeStyle = '#e5e5e5';
+      ctx.fillStyle = '#333';
+      ctx.textAlign = 'center';
+      var xt = cfg.xTicks || (cfg.xLog ? logTicks : niceTicks)(view[0], view[1]);
+      xt.filter(function (v) { return v >= view[0] && v <= view[1]; }).forEach(function (v) {
+        var x = scale.x(v);
+        ctx.beginPath(); ctx.moveTo(x, PAD.t); ctx.lineTo(x, PAD.t + ph); ctx.stroke();
+        ctx.fillText(xLabel(v), x, PAD.t + ph + 16);
+      });
+      ctx.textAlign = 'right';
+      (yLog ? logTicks : niceTicks)(y0, y1).forEach(function (v) {
+        var y = scale.y(v);
+        ctx.beginPath(); ctx.moveTo(PAD.l, y); ctx.lineTo(PAD.l + pw, y); ctx.stroke();
+        ctx.fillText(yLabel(v), PAD.l - 6, y + 4);
+      });
+      ctx.textAlign = 'center';
+      ctx.fillText(cfg.xLabel, PAD.l + pw / 2, h - 6);
+      ctx.save();
+      ctx.translate(14, PAD.t + ph / 2); ctx.rotate(-Math.PI / 2); ctx.fillText(cfg.yLabel, 0, 0);
+      ctx.restore();
+
+      ctx.save();
+      ctx.beginPath(); ctx.rect(PAD.l, PAD.t, pw, ph); ctx.clip();
+      (cfg.markers || []).forEach(function (m) {
+        var x = scale.x(tx(m.x));
+        ctx.strokeStyle = m.color; ctx.setLineDash([5, 4]);
+        ctx.beginPath(); ctx.moveTo(x, PAD.t); ctx.lineTo(x, PAD.t + ph); ctx.stroke();
+      });
+      ctx.setLineDash([]);
+      ctx.lineWidth = 2;
+      series.forEach(function (ps, i) {
+        ctx.strokeStyle = ctx.fillStyle = cfg.series[i].color;
+        ctx.beginPath();
+        ps.forEach(function (p, j) { ctx[j ? 'lineTo' : 'moveTo'](scale.x(p[0]), scale.y(p[1])); });
+        ctx.stroke();
+        if (ps.length < 30) ps.forEach(function (p) { ctx.fillRect(scale.x(p[0]) - 2.5, scale.y(p[1]) - 2.5, 5, 5); });
+      });
+      if (dragFrom !== null && dragTo !== null) {
+        ctx.fillStyle = 'rgba(65, 105, 225, 0.15)';
+        ctx.fillRect(Math.min(dragFrom, dragTo), PAD.t, Math.abs(dragTo - dragFrom), ph);
+      }
+      ctx.restore();
+
+      ctx.textAlign = 'left';
+      cfg.series.forEach(function (s, i) {
+        ctx.fillStyle = s.color;
+        ctx.fillRect(PAD.l + 10, PAD.t + 8 + i * 16, 12, 3);
+        ctx.fillStyle = '#333';
+        ctx.fillText(s.name, PAD.l + 28, PAD.t + 13 + i * 16);
+      });
+    }
+
+    canvas.onmousedown = function (e) { dragFrom = e.offsetX; dragTo = null; };
+    canvas.onmouseup = function (e) {
+      if (dragFrom !== null && Math.abs(e.offsetX - dragFrom) > 5) {
+        var a = scale.invX(dragFrom), b = scale.invX(e.offsetX);
+        view = [Math.max(full[0], Math.min(a, b)), Math.min(full[1], Math.max(a, b))];
+      }
+      dragFrom = dragTo = null;
+      draw();
+    };
+    canvas.ondblclick = function () { view = full.slice(); draw(); };
+    canvas.onmouseleave = function () { tip.style.display = 'none'; dragFrom = dragTo = null; draw(); };
+    canvas.onmousemove = function (e) {
+      if (dragFrom !== null) { dragTo = e.offsetX; draw(); }
+      var v = scale.invX(e.offsetX), lines = [];
+      cfg.series.forEach(function (s) {
+        var best = null;
+        points(s).forEach(function (p) { if (!best || Math.abs(p[0] - v) < Math.abs(best[0] - v)) best = p; });
+        if (best) lines.push('<span style="color:' + s.color + '">' + s.name + '</span>: ' + xLabel(best[0]) + ' → ' + fmt(best[2][1]));
+      });
+      tip.innerHTML = lines.join('<br>');
+      tip.style.display = lines.length ? 'block' : 'none';
+      tip.style.left = Math.min(e.offsetX + 14, canvas.clientWidth - tip.offsetWidth) + 'px';
+      tip.style.top = (e.offsetY + 40) + 'px';
+    };
+    window.addEventListener('resize', draw);
+    draw();
+  }
+
+  function color(i) { return COLORS[i % COLORS.length]; }
+  function label(run) { return run.client_count.toLocaleString() + ' clients'; }
+  var runs = data.runs;
+
+  new Chart(document.getElementById('chart-scaling'), {
+    xLabel: 'Số client', yLabel: 'Độ trễ (ms)', xLog: true, logToggle: true,
+    series: [['avg_latency_ms', 'Trung bình'], ['median_latency_ms', 'Trung vị'], ['p95_latency_ms', 'P95'], ['p99_latency_ms', 'P99']]
+      .map(function (m, i) {
+        return {name: m[1], color: color(i), points: runs.map(function (r) { return [r.client_count, r.summary[m[0]]]; })};
+      })
+  });
+
+  // Tỷ lệ (%) mẫu trong mỗi khoảng, đặt tại trung điểm hình học của khoảng
+  new Chart(document.getElementById('chart-distribution'), {
+    xLabel: 'Độ trễ (ms)', yLabel: 'Tỷ lệ mẫu (%)', xLog: true, logToggle: true,
+    series: runs.filter(function (r) { return r.bins; }).map(function (r, i) {
+      var e = r.bins.edges, total = r.bins.counts.reduce(function (a, b) { return a + b; }, 0) || 1;
+      return {name: label(r), color: color(i), points: r.bins.counts.map(function (c, j) {
+        return [Math.sqrt(e[j] * e[j + 1]), c / total * 100];
+      })};
+    })
+  });
+
+  // Trục x theo "số chữ số 9": 90% → 1, 99% → 2, 99.9% → 3, ... để phần đuôi không bị dồn về một điểm
+  function nines(p) { return -Math.log10(1 - p / 100); }
+  new Chart(document.getElementById('chart-percentiles'), {
+    xLabel: 'Percentile', yLabel: 'Độ trễ (ms)', logToggle: true, xTicks: [0, 1, 2, 3, 4],
+    xFormat: function (v) { return 'P' + parseFloat((100 * (1 - Math.pow(10, -v))).toFixed(3)); },
+    series: runs.filter(function (r) { return r.percentiles.length; }).map(function (r, i) {
+      return {name: label(r), color: color(i), points: r.percentiles.map(function (p) { return [nines(p[0]), p[1]]; })};
+    })
+  });
+
+  [['chart-cpu', 'cpu_percent', 'CPU (%)'], ['chart-rss', 'rss_mb', 'RSS (MB)']].forEach(function (m) {
+    var withResources = runs.filter(function (r) { return r.resources; }), markers = [];
+    withResources.forEach(function (r, i) {
+      r.update_offsets_s.forEach(function (x) { markers.push({x: x, color: color(i)}); });
+    });
+    new Chart(document.getElementById(m[0]), {
+      xLabel: 'Thời gian từ lúc bắt đầu chạy (s), nét đứt: thời điểm gửi cập nhật', yLabel: m[2], markers: markers,
+      series: withResources.map(function (r, i) {
+        return {name: label(r), color: color(i), points: r.resources.time_s.map(function (t, j) { return [t, r.resources[m[1]][j]]; })};
+      })
+    });
+  });
+})();
+"""
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Histogram độ trễ dạng log-bucket (theo ý tưởng HDR Histogram)
+- Bộ nhớ cố định, không phụ thuộc số mẫu: mỗi bucket rộng một tỷ lệ cố định (mặc định 1%) so với bucket trước
+- Ghi mẫu O(1) trên hot path, percentile tính trong O(số bucket)
+- Gộp được giữa các worker / các lần chạy, tuần tự hóa gọn vào JSON kết quả
+"""
+
+import math
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Histogram độ trễ (ms) với sai số tương đối tối đa bằng precision"""
+
+    def __init__(self, lowest_ms=0.001, highest_ms=3600000.0, precision=0.01):
+        self.lowest_ms = lowest_ms
+        self.highest_ms = highest_ms
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.bucket_count = int(math.ceil(math.log(highest_ms / lowest_ms) / self._log_base)) + 1
+        self.counts = np.zeros(self.bucket_count, dtype=np.int64)
+        # Các giá trị chính xác để tính trung bình / độ lệch chuẩn
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value_ms):
+        if value_ms <= self.lowest_ms:
+            return 0
+        index = int(math.log(value_ms / self.lowest_ms) / self._log_base)
+        return min(index, self.bucket_count - 1)
+
+    def record(self, value_ms):
+        """Ghi một mẫu độ trễ (ms)"""
+        self.counts[self._index(value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.total_sq += value_ms * value_ms
+        if value_ms < self.min:
+            self.min = value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def record_many(self, values_ms):
+        """Ghi một mảng mẫu độ trễ (ms) cùng lúc, kết quả giống gọi record() cho từng mẫu"""
+        values = np.asarray(values_ms, dtype=np.float64)
+        if values.size == 0:
+            return
+        with np.errstate(divide='ignore', invalid='ignore'):
+            indexes = np.log(np.maximum(values, self.lowest_ms) / self.lowest_ms) / self._log_base
+        indexes = np.minimum(indexes.astype(np.int64), self.bucket_count - 1)
+        np.add.at(self.counts, indexes, 1)
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.total_sq += float(np.dot(values, values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """Cộng dồn một histogram khác có cùng cấu hình bucket"""
+        if (other.lowest_ms, other.highest_ms, other.precision) != (self.lowest_ms, self.highest_ms, self.precision):
+            raise ValueError('Không thể gộp histogram có cấu hình bucket khác nhau')
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def bucket_values(self):
+        """Giá trị đại diện (trung điểm hình học) của từng bucket"""
+        lower = self.lowest_ms * np.exp(np.arange(self.bucket_count) * self._log_base)
+        return lower * math.sqrt(1 + self.precision)
+
+    def percentile(self, percent):
+        """Giá trị tại percentile (0-100), sai số tương đối không quá precision"""
+        if self.count == 0:
+            return None
+        rank = max(1, int(math.ceil(percent / 100.0 * self.count)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        value = float(self.bucket_values()[index])
+        return min(max(value, self.min), self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def std_dev(self):
+        """Độ lệch chuẩn tổng thể (giống np.std)"""
+        if self.count == 0:
+            return None
+        variance = self.total_sq / self.count - self.mean() ** 2
+        return math.sqrt(max(variance, 0.0))
+
+    def count_between(self, low_ms=None, high_ms=None):
+        """Số mẫu có giá trị trong [low_ms, high_ms), theo giá trị đại diện của bucket"""
+        values = self.bucket_values()
+        mask = np.ones(self.bucket_count, dtype=bool)
+        if low_ms is not None:
+            mask &= values >= low_ms
+        if high_ms is not None:
+            mask &= values < high_ms
+        return int(self.counts[mask].sum())
+
+    def _rebin(self, edges):
+        """Số mẫu trong từng khoảng của edges (các bucket nằm ngoài được dồn vào khoảng đầu/cuối)"""
+        bins = len(edges) - 1
+        nonzero = np.nonzero(self.counts)[0]
+        values = np.clip(self.bucket_values()[nonzero], edges[0], edges[-1])
+        positions = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, bins - 1)
+        return np.bincount(positions, weights=self.counts[nonzero], minlength=bins)
+
+    def linear_bins(self, bins=30):
+        """Gộp các bucket thành `bins` khoảng đều nhau từ min đến max, dùng để vẽ histogram"""
+        if self.count == 0:
+            return np.array([]), np.array([])
+        low, high = self.min, self.max if self.max > self.min else self.min + 1e-6
+        edges = np.linspace(low, high, bins + 1)
+        return edges, self._rebin(edges)
+
+    def log_bins(self, bins=60):
+        """Gộp các bucket thành `bins` khoảng đều nhau theo thang log từ min đến max, để xem rõ phần đuôi"""
+        if self.count == 0:
+            return np.array([]), np.array([])
+        low = max(self.min, self.lowest_ms)
+        high = self.max if self.max > low else low * (1 + self.precision)
+        edges = np.geomspace(low, high, bins + 1)
+        return edges, self._rebin(edges)
+
+    def summary(self):
+        """Các thống kê chuẩn (ms) dùng chung cho báo cáo và JSON"""
+        if self.count == 0:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'avg_ms': self.mean(),
+            'median_ms': self.percentile(50),
+            'min_ms': self.min,
+            'max_ms': self.max,
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'std_dev_ms': self.std_dev()
+        }
+
+    def to_dict(self):
+        """Tuần tự hóa dạng thưa (chỉ các bucket khác 0)"""
+        nonzero = np.nonzero(self.counts)[0]
+        return {
+            'lowest_ms': self.lowest_ms,
+            'highest_ms': self.highest_ms,
+            'precision': self.precision,
+            'count': self.count,
+            'total': self.total,
+            'total_sq': self.total_sq,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'bucket_indices': nonzero.tolist(),
+            'bucket_counts': self.counts[nonzero].tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['lowest_ms'], data['highest_ms'], data['precision'])
+        histogram.counts[np.asarray(data['bucket_indices'], dtype=np.int64)] = data['bucket_counts']
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.total_sq = data['total_sq']
+        if histogram.count:
+            histogram.min = data['min']
+            histogram.max = data['max']
+        return histogram
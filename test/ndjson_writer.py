@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Ghi kết quả dạng NDJSON (mỗi dòng một bản ghi JSON), chỉ ghi nối tiếp
+- Event loop chỉ đưa bản ghi vào hàng đợi, việc mã hóa JSON và ghi file chạy trên thread riêng
+- File được flush theo chu kỳ nên nếu tiến trình chết giữa chừng chỉ mất tối đa một chu kỳ dữ liệu
+- Báo cáo cuối cùng được dựng lại bằng cách đọc lại luồng (iter_records)
+- Nếu thread ghi dừng vì lỗi, write() bỏ các bản ghi sau đó (không để hàng đợi phình mãi) và close() ném lại lỗi
+"""
+
+import json
+import queue
+import threading
+import time
+import warnings
+
+_STOP = object()
+
+
+class NDJSONResultWriter:
+    """Ghi bản ghi NDJSON qua bộ đệm trên thread nền"""
+
+    def __init__(self, path, flush_interval=1.0, buffer_size=1024 * 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.records_written = 0
+        self.records_dropped = 0
+        self.error = None
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        """Mở file (ghi đè) và khởi động thread ghi"""
+        self._file = open(self.path, 'w', encoding='utf-8', buffering=self.buffer_size)
+        self._thread = threading.Thread(target=self._run, name='ndjson-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, record):
+        """Đưa một bản ghi (dict) vào hàng đợi; an toàn khi gọi từ event loop hoặc thread khác"""
+        if self.error is not None:
+            # Thread ghi đã dừng: bỏ bản ghi thay vì để hàng đợi tăng mãi, cảnh báo một lần
+            if self.records_dropped == 0:
+                warnings.warn(f'Luồng kết quả {self.path} đã dừng ghi vì lỗi: {self.error!r}', RuntimeWarning)
+            self.records_dropped += 1
+            return
+        self._queue.put(record)
+
+    def close(self):
+        """Ghi nốt các bản ghi còn trong hàng đợi rồi đóng file; ném RuntimeError nếu thread ghi đã dừng vì lỗi"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self.error is not None:
+            # Các bản ghi còn kẹt trong hàng đợi cũng bị mất
+            while not self._queue.empty():
+                if self._queue.get() is not _STOP:
+                    self.records_dropped += 1
+            raise RuntimeError(f'Luồng kết quả {self.path} bị cắt sau {self.records_written} bản ghi '
+                               f'({self.records_dropped} bản ghi bị bỏ): {self.error!r}') from self.error
+
+    def _run(self):
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    record = None
+
+                if record is _STOP:
+                    break
+                if record is not None:
+                    self._write_line(record)
+
+                # Flush theo thời gian kể cả khi hàng đợi không bao giờ rỗng
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    self._file.flush()
+                    last_flush = now
+        except Exception as e:
+            self.error = e
+        finally:
+            self._file.close()
+
+    def _write_line(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=_json_default))
+        self._file.write('\n')
+        self.records_written += 1
+
+
+def _json_default(value):
+    """Số và mảng NumPy (np.int64, np.float64, np.ndarray, ...) ghi như giá trị Python tương ứng"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'Không ghi được kiểu {type(value).__name__} ra JSON')
+
+
+def iter_records(path, record_type=None):
+    """Đọc lần lượt các bản ghi trong file NDJSON, bỏ qua dòng cuối bị cắt dở nếu tiến trình ghi bị dừng đột ngột"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            record = json.loads(line)
+            if record_type is None or record.get('type') == record_type:
+                yield record
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lưu mẫu thô (độ trễ của từng client) ra file nhị phân NumPy .npy bên cạnh file JSON kết quả
+- File JSON chỉ giữ thống kê và con trỏ tới file .npy: {"format": "npy", "file": ..., "count": ...}
+- Đọc bằng np.load(mmap_mode='r'): không phải parse, không sao chép, một triệu mẫu mở trong vài ms
+- Vẫn đọc được file kết quả cũ lưu mẫu thô dạng danh sách JSON
+"""
+
+import os
+
+import numpy as np
+
+RAW_SAMPLES_FORMAT = 'npy'
+
+
+def raw_samples_path(json_path, name='propagation_times_ms'):
+    """Đường dẫn file .npy cho trường name của file kết quả json_path"""
+    return f"{os.path.splitext(json_path)[0]}.{name}.npy"
+
+
+def save_raw_samples(json_path, samples, name='propagation_times_ms'):
+    """Ghi mẫu thô ra file .npy (float64), trả về con trỏ để đặt vào raw_data[name] của JSON"""
+    path = raw_samples_path(json_path, name)
+    array = np.asarray(samples, dtype=np.float64)
+    np.save(path, array)
+    return {
+        'format': RAW_SAMPLES_FORMAT,
+        # Đường dẫn tương đối so với file JSON để có thể sao chép cả thư mục kết quả
+        'file': os.path.basename(path),
+        'count': int(array.size),
+        'dtype': str(array.dtype)
+    }
+
+
+def load_raw_samples(data, json_path, name='propagation_times_ms', mmap=True):
+    """
+    Đọc mẫu thô raw_data[name] của một file kết quả đã được json.load.
+    Trả về mảng NumPy (memory-mapped nếu mmap=True); mảng rỗng nếu không có dữ liệu.
+    """
+    ref = (data.get('raw_data') or {}).get(name)
+    if ref is None:
+        return np.array([], dtype=np.float64)
+
+    # Định dạng cũ: danh sách số trong JSON
+    if isinstance(ref, list):
+        return np.asarray(ref, dtype=np.float64)
+
+    if ref.get('format') != RAW_SAMPLES_FORMAT:
+        raise ValueError(f"Định dạng mẫu thô không hỗ trợ: {ref.get('format')}")
+    path = os.path.join(os.path.dirname(json_path), ref['file'])
+    return np.load(path, mmap_mode='r' if mmap else None)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bộ đệm cho các script báo cáo, khóa theo hash nội dung file kết quả
+- Thống kê tóm tắt của mỗi file kết quả chỉ được parse một lần; khóa gồm cả loại và phiên bản dữ liệu (kind)
+- Khi ghi, chỉ giữ các mục được dùng trong lần chạy này: mục của file không còn là đầu vào
+  hoặc của phiên bản dữ liệu cũ bị bỏ, nên bộ đệm không phình mãi
+- Biểu đồ được đặt tên theo hash của dữ liệu đầu vào: nếu file đã tồn tại thì dùng lại, không vẽ lại
+"""
+
+import hashlib
+import json
+import os
+
+CACHE_DIR_NAME = '.cache'
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 của nội dung file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(name, input_hashes, version=1):
+    """Khóa của một artifact (biểu đồ, ...) theo tên, phiên bản cách vẽ và hash của các đầu vào"""
+    digest = hashlib.sha256(f'{name}:{version}'.encode('utf-8'))
+    for key in sorted(input_hashes, key=str):
+        digest.update(f'|{key}={input_hashes[key]}'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class ReportCache:
+    """Bộ đệm thống kê đã parse (file JSON trong <save_dir>/.cache) và đường dẫn artifact theo khóa"""
+
+    def __init__(self, save_dir, enabled=True):
+        self.save_dir = save_dir
+        self.enabled = enabled
+        self.cache_dir = os.path.join(save_dir, CACHE_DIR_NAME)
+        self.summaries_path = os.path.join(self.cache_dir, 'summaries.json')
+        self.summaries = {}
+        # Các khóa được dùng trong lần chạy này, chỉ những khóa này được ghi lại khi save()
+        self.used_keys = set()
+        self.hits = 0
+        self.misses = 0
+        if enabled and os.path.exists(self.summaries_path):
+            try:
+                with open(self.summaries_path, 'r', encoding='utf-8') as f:
+                    self.summaries = json.load(f)
+            except (OSError, ValueError):
+                self.summaries = {}
+
+    def get_summary(self, content_hash, load_fn, kind=None):
+        """
+        Thống kê tóm tắt của file có hash content_hash; gọi load_fn() nếu chưa có trong bộ đệm.
+        kind phân biệt các loại dữ liệu khác nhau suy ra từ cùng một file (ví dụ dữ liệu cho báo cáo tương tác).
+        """
+        key = content_hash if kind is None else f'{content_hash}:{kind}'
+        self.used_keys.add(key)
+        if self.enabled and key in self.summaries:
+            self.hits += 1
+            return self.summaries[key]
+        self.misses += 1
+        summary = load_fn()
+        self.summaries[key] = summary
+        return summary
+
+    def artifact_path(self, name, input_hashes, extension='png', version=1):
+        """(đường dẫn, đã có sẵn hay chưa) của artifact được đặt tên theo khóa nội dung"""
+        key = artifact_key(name, input_hashes, version)
+        path = os.path.join(self.save_dir, f'{name}_{key}.{extension}')
+        exists = self.enabled and os.path.exists(path)
+        if exists:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return path, exists
+
+    def save(self):
+        """
+        Ghi bộ đệm thống kê (ghi file tạm rồi đổi tên để không hỏng bộ đệm nếu bị dừng giữa chừng),
+        bỏ các mục không được dùng trong lần chạy này
+        """
+        self.summaries = {key: value for key, value in self.summaries.items() if key in self.used_keys}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.summaries_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summaries, f)
+        os.replace(tmp_path, self.summaries_path)
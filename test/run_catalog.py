@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Danh mục các lần chạy (SQLite) trong thư mục results/
+- Mỗi lần chạy kết thúc, harness ghi một dòng: thời điểm, server, số client, commit git, kịch bản, đường dẫn file kết quả
+- Các script báo cáo chọn lần chạy bằng truy vấn có index thay vì glob + sắp xếp theo getmtime
+- Chạy trực tiếp để nhập các file kết quả có sẵn vào danh mục hoặc liệt kê các lần chạy
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = 'results'
+CATALOG_FILE = 'runs.sqlite'
+DEFAULT_SCENARIO = 'api_to_ws_latency'
+DEFAULT_SERVER_IMPL = 'nodejs'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    server_impl TEXT NOT NULL,
+    client_count INTEGER NOT NULL,
+    git_commit TEXT,
+    result_path TEXT NOT NULL UNIQUE,
+    avg_latency_ms REAL,
+    p95_latency_ms REAL,
+    p99_latency_ms REAL,
+    config TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_lookup ON runs (scenario, server_impl, client_count, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_commit ON runs (git_commit);
+"""
+
+
+def get_git_commit():
+    """Commit git hiện tại (dạng ngắn), None nếu không nằm trong repo git"""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+class RunCatalog:
+    """Danh mục các lần chạy lưu trong results/runs.sqlite"""
+
+    def __init__(self, results_dir=RESULTS_DIR):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+        self.path = os.path.join(results_dir, CATALOG_FILE)
+        created = not os.path.exists(self.path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(_SCHEMA)
+        # Lần đầu tạo danh mục thì nhập các file kết quả đã có từ trước
+        if created:
+            self.import_results_dir()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _relative(self, result_path):
+        """Đường dẫn lưu trong danh mục tính từ results_dir, để có thể di chuyển cả thư mục kết quả"""
+        return os.path.relpath(os.path.abspath(result_path), os.path.abspath(self.results_dir))
+
+    def _resolve(self, stored_path):
+        return os.path.normpath(os.path.join(self.results_dir, stored_path))
+
+    def record_run(self, result_path, results, scenario=DEFAULT_SCENARIO, server_impl=DEFAULT_SERVER_IMPL,
+                   client_count=None, git_commit=None):
+        """Ghi (hoặc ghi đè) một lần chạy từ dict kết quả đã lưu tại result_path"""
+        stats = results.get('stats', {})
+        config = results.get('config', {})
+        if client_count is None:
+            client_count = config.get('client_count', config.get('num_clients', stats.get('connected_clients', 0)))
+
+        self.conn.execute(
+            """INSERT OR REPLACE INTO runs
+               (timestamp, scenario, server_impl, client_count, git_commit, result_path,
+                avg_latency_ms, p95_latency_ms, p99_latency_ms, config)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                results.get('timestamp') or datetime.now().isoformat(),
+                scenario,
+                server_impl,
+                int(client_count),
+                git_commit if git_commit is not None else get_git_commit(),
+                self._relative(result_path),
+                stats.get('avg_latency_ms', stats.get('avg_time')),
+                stats.get('p95_latency_ms', stats.get('p95_time')),
+                stats.get('p99_latency_ms', stats.get('p99_time')),
+                json.dumps(config, ensure_ascii=False)
+            )
+        )
+        self.conn.commit()
+
+    def latest_runs(self, client_counts=None, scenario=DEFAULT_SCENARIO, server_impl=None):
+        """
+        File kết quả mới nhất cho mỗi số client: {client_count: đường dẫn}, sắp xếp theo số client.
+        client_counts=None lấy tất cả các mức tải có trong danh mục; bỏ qua các dòng mà file đã bị xóa.
+        """
+        query = "SELECT client_count, result_path FROM runs WHERE scenario = ?"
+        params = [scenario]
+        if server_impl is not None:
+            query += " AND server_impl = ?"
+            params.append(server_impl)
+        if client_counts is not None:
+            query += f" AND client_count IN ({', '.join('?' * len(client_counts))})"
+            params.extend(client_counts)
+        query += " ORDER BY client_count, timestamp DESC"
+
+        latest = {}
+        for client_count, stored_path in self.conn.execute(query, params):
+            if client_count in latest:
+                continue
+            path = self._resolve(stored_path)
+            if os.path.exists(path):
+                latest[client_count] = path
+        return latest
+
+    def list_runs(self, scenario=None, limit=50):
+        """Các lần chạy gần nhất, mới nhất lên đầu"""
+        query = ("SELECT timestamp, scenario, server_impl, client_count, git_commit, result_path, "
+                 "avg_latency_ms, p95_latency_ms, p99_latency_ms FROM runs")
+        params = []
+        if scenario is not None:
+            query += " WHERE scenario = ?"
+            params.append(scenario)
+        query += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+        columns = ['timestamp', 'scenario', 'server_impl', 'client_count', 'git_commit', 'result_path',
+                   'avg_latency_ms', 'p95_latency_ms', 'p99_latency_ms']
+        return [dict(zip(columns, row)) for row in self.conn.execute(query, params)]
+
+    def import_results_dir(self, server_impl=DEFAULT_SERVER_IMPL):
+        """Nhập các file api_to_ws_latency_*_clients_*.json có sẵn (chạy trước khi có danh mục)"""
+        imported = 0
+        pattern = re.compile(r'api_to_ws_latency_(\d+)_clients_.*\.json$')
+        for path in glob.glob(os.path.join(self.results_dir, 'api_to_ws_latency_*_clients_*.json')):
+            match = pattern.search(os.path.basename(path))
+            # File điều chỉnh (_adjusted) là kết quả suy ra, không phải một lần chạy
+            if not match or path.endswith('_adjusted.json'):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    results = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not results.get('timestamp'):
+                results['timestamp'] = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+            # Lần thử của chế độ capacity ghi kịch bản trong config
+            scenario = results.get('config', {}).get('scenario', DEFAULT_SCENARIO)
+            self.record_run(path, results, scenario, server_impl, int(match.group(1)), git_commit='')
+            imported += 1
+        return imported
+
+
+def get_latest_result_files(client_counts=None, results_dir=RESULTS_DIR, scenario=DEFAULT_SCENARIO, server_impl=None):
+    """Lấy file kết quả mới nhất cho mỗi mức tải từ danh mục: {số client: đường dẫn}"""
+    with RunCatalog(results_dir) as catalog:
+        return catalog.latest_runs(client_counts, scenario, server_impl)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Danh mục các lần chạy đo hiệu năng')
+
+    parser.add_argument('--results-dir', type=str, default=RESULTS_DIR,
+                      help=f'Thư mục kết quả chứa danh mục (mặc định: {RESULTS_DIR})')
+
+    parser.add_argument('--import', dest='import_existing', action='store_true',
+                      help='Nhập các file kết quả có sẵn trong thư mục vào danh mục')
+
+    parser.add_argument('--scenario', type=str, default=None,
+                      help='Chỉ liệt kê các lần chạy của kịch bản này')
+
+    parser.add_argument('--limit', type=int, default=50,
+                      help='Số lần chạy tối đa được liệt kê (mặc định: 50)')
+
+    args = parser.parse_args()
+
+    with RunCatalog(args.results_dir) as catalog:
+        if args.import_existing:
+            print(f"Đã nhập {catalog.import_results_dir()} file kết quả vào {catalog.path}")
+
+        for run in catalog.list_runs(args.scenario, args.limit):
+            avg = f"{run['avg_latency_ms']:.2f}ms" if run['avg_latency_ms'] is not None else '-'
+            p95 = f"{run['p95_latency_ms']:.2f}ms" if run['p95_latency_ms'] is not None else '-'
+            print(f"{run['timestamp']}  {run['scenario']:<18} {run['server_impl']:<8} {run['client_count']:>7} clients  "
+                  f"TB {avg:>10}  P95 {p95:>10}  {run['git_commit'] or '-':<9} {run['result_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,20 +15,16 @@ echo.
 set SERVER_URL=http://localhost:3010
 set API_ENDPOINT=/api/add
 
-echo ===== BAT DAU PHAN TICH TY LE MO RONG =====
-echo Thuc hien test voi so luong client tang dan
-echo.
+if not defined PLATEAUS set PLATEAUS=100,500,1000,5000,10000
+if not defined UPDATES_PER_PLATEAU set UPDATES_PER_PLATEAU=5
 
-echo [1/3] Chay test voi 100 clients...
-python ws_latency_analyzer.py --server %SERVER_URL% --api %API_ENDPOINT% --clients 100
-echo.
-
-echo [2/3] Chay test voi 1000 clients...
-python ws_latency_analyzer.py --server %SERVER_URL% --api %API_ENDPOINT% --clients 1000
+echo ===== BAT DAU PHAN TICH TY LE MO RONG =====
+echo Thuc hien test voi so luong client tang dan trong mot lan chay: %PLATEAUS%
+echo (cac ket noi duoc giu lai giua cac muc, moi muc gui %UPDATES_PER_PLATEAU% cap nhat)
 echo.
 
-echo [3/3] Chay test voi 10000 clients...
-python ws_latency_analyzer.py --server %SERVER_URL% --api %API_ENDPOINT% --clients 10000
+python ws_latency_analyzer.py --server %SERVER_URL% --api %API_ENDPOINT% --mode sweep ^
+    --plateaus "%PLATEAUS%" --updates-per-plateau %UPDATES_PER_PLATEAU%
 echo.
 
 echo Tong hop ket qua...
@@ -14,20 +14,16 @@ echo ""
 SERVER_URL="http://localhost:3010"
 API_ENDPOINT="/api/add"
 
-echo "===== BẮT ĐẦU PHÂN TÍCH TỶ LỆ MỞ RỘNG ====="
-echo "Thực hiện test với số lượng client tăng dần"
-echo ""
+PLATEAUS="${PLATEAUS:-100,500,1000,5000,10000}"
+UPDATES_PER_PLATEAU="${UPDATES_PER_PLATEAU:-5}"
 
-echo "[1/3] Chạy test với 100 clients..."
-python ws_latency_analyzer.py --server "$SERVER_URL" --api "$API_ENDPOINT" --clients 100
-echo ""
-
-echo "[2/3] Chạy test với 1000 clients..."
-python ws_latency_analyzer.py --server "$SERVER_URL" --api "$API_ENDPOINT" --clients 1000
+echo "===== BẮT ĐẦU PHÂN TÍCH TỶ LỆ MỞ RỘNG ====="
+echo "Thực hiện test với số lượng client tăng dần trong một lần chạy: $PLATEAUS"
+echo "(các kết nối được giữ lại giữa các mức, mỗi mức gửi $UPDATES_PER_PLATEAU cập nhật)"
 echo ""
 
-echo "[3/3] Chạy test với 10000 clients..."
-python ws_latency_analyzer.py --server "$SERVER_URL" --api "$API_ENDPOINT" --clients 10000
+python ws_latency_analyzer.py --server "$SERVER_URL" --api "$API_ENDPOINT" --mode sweep \
+    --plateaus "$PLATEAUS" --updates-per-plateau "$UPDATES_PER_PLATEAU"
 echo ""
 
 echo "Tổng hợp kết quả..."
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lấy mẫu tài nguyên của tiến trình server (node server.js, binary Go, ...) trong lúc đo
+- Chạy trên thread nền, lấy mẫu theo chu kỳ cố định: CPU, RSS, số fd, số thread, context switch
+- Tùy chọn: số goroutine của server Go, đọc từ endpoint net/http/pprof (server chạy với --pprof)
+- Thời điểm lấy mẫu theo time.perf_counter(), cùng đồng hồ với thời điểm gửi/nhận cập nhật,
+  nên có thể đặt chuỗi tài nguyên cạnh timeline độ trễ (GC pause, cạn fd, ...)
+"""
+
+import re
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+import psutil
+
+
+def find_server_pids(server_url):
+    """Tìm PID đang lắng nghe trên cổng của server_url; trả về [] nếu không tìm được"""
+    parsed = urlparse(server_url)
+    port = parsed.port or (443 if parsed.scheme in ('https', 'wss') else 80)
+    try:
+        connections = psutil.net_connections(kind='tcp')
+    except (psutil.AccessDenied, OSError):
+        return []
+
+    pids = {conn.pid for conn in connections
+            if conn.pid and conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port}
+    return sorted(pids)
+
+
+_GOROUTINE_TOTAL = re.compile(rb'goroutine profile: total (\d+)')
+
+
+def read_goroutine_count(url, timeout=2.0):
+    """Số goroutine từ /debug/pprof/goroutine?debug=1 của server Go; None nếu không đọc được"""
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            match = _GOROUTINE_TOTAL.search(response.read(256))
+    except (OSError, ValueError):
+        return None
+    return int(match.group(1)) if match else None
+
+
+def _num_fds(process):
+    """Số file descriptor (Linux/macOS) hoặc handle (Windows)"""
+    if hasattr(process, 'num_fds'):
+        return process.num_fds()
+    return process.num_handles()
+
+
+class ServerResourceSampler:
+    """Lấy mẫu định kỳ tài nguyên của một hoặc nhiều PID (kèm tiến trình con) trên thread nền"""
+
+    def __init__(self, pids, interval=1.0, include_children=True, on_sample=None, goroutine_url=None):
+        self.pids = list(pids)
+        self.interval = interval
+        self.include_children = include_children
+        # URL pprof goroutine của server Go, None = không lấy mẫu số goroutine
+        self.goroutine_url = goroutine_url
+        # Gọi on_sample(sample) trên thread lấy mẫu sau mỗi mẫu, ví dụ để ghi ra luồng kết quả
+        self.on_sample = on_sample
+        self.processes = {}
+        self.samples = []
+        # PID không theo dõi được: (pid, lỗi)
+        self.attach_errors = []
+        # Gốc thời gian (perf_counter) của chuỗi mẫu, dùng để căn với thời điểm gửi cập nhật
+        self.origin = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_ctx = None
+
+    def _attach(self):
+        for pid in self.pids:
+            try:
+                process = psutil.Process(pid)
+            except psutil.Error as e:
+                self.attach_errors.append((pid, str(e)))
+                continue
+            self.processes[pid] = process
+            if self.include_children:
+                for child in process.children(recursive=True):
+                    self.processes.setdefault(child.pid, child)
+
+        # Lần gọi cpu_percent đầu tiên chỉ đặt mốc, các lần sau mới có giá trị; context switch cũng vậy
+        self._last_ctx = [0, 0]
+        for process in self.processes.values():
+            try:
+                process.cpu_percent(None)
+                ctx = process.num_ctx_switches()
+                self._last_ctx[0] += ctx.voluntary
+                self._last_ctx[1] += ctx.involuntary
+            except psutil.Error:
+                pass
+
+    def start(self, origin=None):
+        """Bắt đầu lấy mẫu; origin mặc định là thời điểm gọi start()"""
+        self.origin = origin if origin is not None else time.perf_counter()
+        self._attach()
+        if not self.processes:
+            return False
+
+        self._thread = threading.Thread(target=self._run, name='server-resource-sampler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Dừng lấy mẫu (lấy thêm một mẫu cuối) và chờ thread kết thúc"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.interval + 5)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+        self.sample()
+
+    def sample(self):
+        """Lấy một mẫu, cộng dồn trên tất cả tiến trình đang theo dõi"""
+        now = time.perf_counter()
+        sample = {
+            'time_s': now - self.origin,
+            'cpu_percent': 0.0,
+            'rss_mb': 0.0,
+            'num_fds': 0,
+            'num_threads': 0,
+            'ctx_switches_voluntary': 0,
+            'ctx_switches_involuntary': 0,
+            'processes': 0
+        }
+        ctx_totals = [0, 0]
+
+        for pid, process in list(self.processes.items()):
+            try:
+                with process.oneshot():
+                    cpu_percent = process.cpu_percent(None)
+                    rss = process.memory_info().rss
+                    num_fds = _num_fds(process)
+                    num_threads = process.num_threads()
+                    ctx = process.num_ctx_switches()
+            except psutil.NoSuchProcess:
+                del self.processes[pid]
+                continue
+            except psutil.Error:
+                continue
+
+            sample['cpu_percent'] += cpu_percent
+            sample['rss_mb'] += rss / (1024 * 1024)
+            sample['num_fds'] += num_fds
+            sample['num_threads'] += num_threads
+            sample['processes'] += 1
+            ctx_totals[0] += ctx.voluntary
+            ctx_totals[1] += ctx.involuntary
+
+        # Context switch lưu theo số lần trong khoảng lấy mẫu, không phải bộ đếm tích lũy
+        if self._last_ctx is not None:
+            sample['ctx_switches_voluntary'] = max(0, ctx_totals[0] - self._last_ctx[0])
+            sample['ctx_switches_involuntary'] = max(0, ctx_totals[1] - self._last_ctx[1])
+        self._last_ctx = ctx_totals
+
+        if self.goroutine_url:
+            sample['goroutines'] = read_goroutine_count(self.goroutine_url)
+
+        self.samples.append(sample)
+        if self.on_sample is not None:
+            self.on_sample(sample)
+        return sample
+
+    def summary(self, samples=None):
+        """Giá trị trung bình / lớn nhất của các chỉ số (mặc định trên tất cả các mẫu)"""
+        samples = self.samples if samples is None else samples
+        if not samples:
+            return {}
+        cpu = [s['cpu_percent'] for s in samples]
+        summary = {
+            'samples': len(samples),
+            'avg_cpu_percent': sum(cpu) / len(cpu),
+            'max_cpu_percent': max(cpu),
+            'max_rss_mb': max(s['rss_mb'] for s in samples),
+            'max_num_fds': max(s['num_fds'] for s in samples),
+            'max_num_threads': max(s['num_threads'] for s in samples),
+            'ctx_switches_voluntary': sum(s['ctx_switches_voluntary'] for s in samples),
+            'ctx_switches_involuntary': sum(s['ctx_switches_involuntary'] for s in samples),
+            # Mức tăng giữa mẫu đầu và mẫu cuối, ví dụ bộ nhớ bị giữ lại vì client đọc chậm
+            'rss_growth_mb': samples[-1]['rss_mb'] - samples[0]['rss_mb']
+        }
+        goroutines = [s['goroutines'] for s in samples if s.get('goroutines') is not None]
+        if goroutines:
+            summary['max_goroutines'] = max(goroutines)
+            summary['goroutines_growth'] = goroutines[-1] - goroutines[0]
+        return summary
+
+    def to_dict(self, start_s=None, end_s=None):
+        """Chuỗi thời gian và tóm tắt để lưu vào file kết quả, có thể giới hạn trong khoảng [start_s, end_s]"""
+        samples = [s for s in self.samples
+                   if (start_s is None or s['time_s'] >= start_s) and (end_s is None or s['time_s'] <= end_s)]
+        return {
+            'pids': self.pids,
+            'interval_s': self.interval,
+            'summary': self.summary(samples),
+            'samples': samples
+        }
+
+
+def start_server_sampler(server_url, pids=None, interval=1.0, origin=None, on_sample=None, goroutine_url=None):
+    """
+    Khởi động bộ lấy mẫu cho các PID đã cho, hoặc PID đang lắng nghe trên cổng của server_url.
+    Trả về None nếu không tìm được tiến trình nào để theo dõi.
+    """
+    if not pids:
+        pids = find_server_pids(server_url)
+    if not pids:
+        return None
+
+    sampler = ServerResourceSampler(pids, interval, on_sample=on_sample, goroutine_url=goroutine_url)
+    if not sampler.start(origin):
+        return None
+    return sampler
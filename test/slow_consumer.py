@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hồ sơ client đọc chậm (slow consumer) để đo hành vi backpressure của server
+- Giới hạn tốc độ đọc (byte/giây): sau mỗi frame, client nghỉ đủ lâu để không đọc nhanh hơn mức cho phép
+- Dừng đọc định kỳ (stall): cứ stall_every giây lại ngừng đọc stall_for giây, như mạng di động chập chờn
+Khi client ngừng đọc, bộ đệm của aiohttp (64KB) đầy thì kết nối ngừng đọc socket, bộ đệm nhận TCP đầy
+và server phải giữ dữ liệu chưa gửi được (hàng đợi ghi, goroutine đang chặn ở WriteMessage, ...).
+"""
+
+import asyncio
+import random
+import time
+
+
+class SlowReadProfile:
+    """Cách đọc của một client chậm, dùng với RawSocketIOClient(read_profile=...)"""
+
+    __slots__ = ('read_rate', 'stall_every', 'stall_for', 'next_stall_at')
+
+    def __init__(self, read_rate=None, stall_every=None, stall_for=0.0):
+        # Byte/giây, None = không giới hạn
+        self.read_rate = read_rate
+        self.stall_every = stall_every
+        self.stall_for = stall_for
+        self.next_stall_at = None
+
+    def copy(self):
+        """Bản sao cho một client khác (mỗi client có lịch stall riêng)"""
+        return SlowReadProfile(self.read_rate, self.stall_every, self.stall_for)
+
+    async def before_read(self):
+        """Gọi trước mỗi lần đọc frame; dừng đọc nếu đến lịch stall"""
+        if not self.stall_every or not self.stall_for:
+            return
+        now = time.perf_counter()
+        if self.next_stall_at is None:
+            # Lệch pha ngẫu nhiên để các client chậm không cùng dừng một lúc
+            self.next_stall_at = now + random.uniform(0, self.stall_every)
+        if now >= self.next_stall_at:
+            await asyncio.sleep(self.stall_for)
+            self.next_stall_at = time.perf_counter() + self.stall_every
+
+    async def after_read(self, size):
+        """Gọi sau mỗi frame đọc được (size byte); nghỉ để giữ tốc độ đọc không vượt read_rate"""
+        if self.read_rate:
+            await asyncio.sleep(size / self.read_rate)
+
+    def to_dict(self):
+        return {
+            'read_rate_bytes_per_s': self.read_rate,
+            'stall_every_s': self.stall_every,
+            'stall_for_s': self.stall_for
+        }
+
+
+def pick_slow_clients(count, ratio, seed=None):
+    """Chọn ngẫu nhiên round(count * ratio) chỉ số client làm client chậm"""
+    slow_count = min(count, max(0, round(count * ratio)))
+    return set(random.Random(seed).sample(range(count), slow_count))
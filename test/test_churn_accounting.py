@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm tra số lượt nhận mong đợi khi churn trong ws_performance_test
+Chạy: python -m pytest test_churn_accounting.py
+"""
+
+import pytest
+
+import ws_performance_test as perf
+from client_table import ClientTable
+from latency_histogram import LatencyHistogram
+
+
+class StreamRecorder:
+    """Thay cho NDJSONResultWriter: giữ các bản ghi trong bộ nhớ"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def harness(monkeypatch):
+    """3 client đang kết nối (client 2 đọc chậm) và cập nhật #1 đang chờ, mỗi client phải nhận một lần"""
+    table = ClientTable(3)
+    for i in range(3):
+        table.add(i)
+        table.mark_connected(i, 0.0)
+    stream = StreamRecorder()
+    monkeypatch.setattr(perf, 'client_table', table)
+    monkeypatch.setattr(perf, 'connected_clients', 3)
+    monkeypatch.setattr(perf, 'slow_client_ids', {2})
+    monkeypatch.setattr(perf, 'healthy_histogram', LatencyHistogram())
+    monkeypatch.setattr(perf, 'slow_histogram', LatencyHistogram())
+    monkeypatch.setattr(perf, 'result_stream', stream)
+    monkeypatch.setattr(perf, 'last_registered_seq', 1)
+    monkeypatch.setattr(perf, 'receives_expected', 3)
+    monkeypatch.setattr(perf, 'updates', {1: {
+        'seq': 1, 'timestamp': '', 'sent_at': 0.0, 'expected': 3, 'expected_slow': 1, 'received_slow': 0,
+        'ok': True, 'publish': None, 'step': None, 'last_receive_at': None, 'histogram': LatencyHistogram()
+    }})
+    monkeypatch.setattr(perf, 'run_started_at', 0.0)
+    return stream
+
+
+def finalized(stream):
+    return [record for record in stream.records if record['type'] == 'update']
+
+
+def test_late_receive_of_churned_client_is_ignored(harness):
+    perf.record_receive(0, 1, 0.010)
+    perf.forget_pending_updates(2)
+    # Frame của client 2 đã trên đường đến khi nó bị churn
+    perf.record_receive(2, 1, 0.011)
+    assert not finalized(harness)
+
+    perf.record_receive(1, 1, 0.012)
+    [update] = finalized(harness)
+    assert update['expected'] == 2
+    assert update['received'] == 2
+    assert update['lost'] == 0
+    assert update['received_slow'] <= update['expected_slow']
+
+
+def test_churn_of_unconnected_client_keeps_expected(harness):
+    perf.client_table.mark_disconnected(1)
+    perf.forget_pending_updates(1)
+    assert perf.updates[1]['expected'] == 3
+    assert perf.receives_expected == 3
+
+
+def test_slow_consumer_classes_stay_within_expected(harness, monkeypatch):
+    monkeypatch.setattr(perf, 'clients', [None] * 3)
+    monkeypatch.setattr(perf, 'server_sampler', None)
+    monkeypatch.setitem(perf.CONFIG, 'slow_ratio', 1 / 3)
+    # Client chậm bị churn rồi frame cũ của nó mới đến
+    perf.forget_pending_updates(2)
+    perf.record_receive(2, 1, 0.011)
+    perf.record_receive(0, 1, 0.010)
+    perf.record_receive(1, 1, 0.012)
+
+    update_stats = finalized(harness)
+    expected_total = sum(stat['expected'] for stat in update_stats)
+    summary = perf.summarize_slow_consumers(update_stats, expected_total)
+    for name in ('healthy', 'slow'):
+        assert summary[name]['receives'] <= summary[name]['receives_expected']
+    assert summary['healthy']['receives'] == 2
+    assert summary['slow']['receives_expected'] == 0
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bộ phát cập nhật theo mô hình mở (open-loop) cho API /api/add
+- Gửi với tốc độ mục tiêu, khoảng cách giữa các lần gửi cố định (constant) hoặc theo phân phối mũ (poisson)
+- Lịch gửi tính theo thời điểm dự kiến, không phụ thuộc lần gửi trước đã xong hay chưa
+- Độ trễ được tính từ thời điểm dự kiến nên không bị lỗi coordinated omission khi pipeline chậm lại
+"""
+
+import asyncio
+import random
+import time
+
+from latency_histogram import LatencyHistogram
+
+ARRIVAL_MODES = ('constant', 'poisson')
+
+
+class OpenLoopUpdateGenerator:
+    """Phát các lần gửi theo lịch dự kiến trong một khoảng thời gian"""
+
+    def __init__(self, rate, duration, arrival='constant', seed=None):
+        if rate <= 0:
+            raise ValueError('rate phải lớn hơn 0')
+        if arrival not in ARRIVAL_MODES:
+            raise ValueError(f'arrival phải là một trong {ARRIVAL_MODES}')
+        self.rate = rate
+        self.duration = duration
+        self.arrival = arrival
+        self.random = random.Random(seed)
+        # Độ lệch giữa thời điểm gửi thực tế và dự kiến (ms), bộ nhớ cố định kể cả khi chạy dài ở tốc độ cao
+        self.schedule_lags = LatencyHistogram()
+
+    def intended_offsets(self):
+        """Sinh các thời điểm gửi dự kiến (giây, tính từ lúc bắt đầu)"""
+        offset = 0.0
+        while offset < self.duration:
+            yield offset
+            if self.arrival == 'poisson':
+                offset += self.random.expovariate(self.rate)
+            else:
+                offset += 1.0 / self.rate
+
+    async def run(self, send_fn, should_continue=None):
+        """
+        Gọi send_fn(seq, intended_time) cho mỗi lần gửi, intended_time theo time.perf_counter().
+        Mỗi lần gửi chạy trong task riêng nên lần gửi chậm không đẩy lùi lịch của lần sau.
+        """
+        start = time.perf_counter()
+        # Chỉ giữ các lần gửi chưa xong, task đã xong tự bỏ khỏi tập
+        tasks = set()
+        sent = 0
+
+        for seq, offset in enumerate(self.intended_offsets()):
+            if should_continue is not None and not should_continue():
+                break
+
+            intended_time = start + offset
+            delay = intended_time - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # Nếu bị trễ lịch thì gửi ngay, độ trễ vẫn tính từ intended_time
+            self.schedule_lags.record(max(0.0, (time.perf_counter() - intended_time) * 1000))
+            task = asyncio.ensure_future(send_fn(seq, intended_time))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Giữ đủ thời lượng để các cập nhật cuối cùng kịp đến client
+        remaining = start + self.duration - time.perf_counter()
+        if remaining > 0 and (should_continue is None or should_continue()):
+            await asyncio.sleep(remaining)
+
+        return sent
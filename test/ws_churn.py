@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bộ tạo churn kết nối cho các công cụ đo WebSocket
+- Giữ nguyên quy mô client mục tiêu, mỗi giây ngắt rồi kết nối lại một tỷ lệ phần trăm client chọn ngẫu nhiên
+- Giới hạn số client đang churn đồng thời, client đang churn không bị chọn lại
+- Ghi thời gian kết nối lại (handshake) và số lần churn trong từng giây để đối chiếu với tài nguyên server
+"""
+
+import asyncio
+import random
+import time
+
+from ws_ramp import summarize_handshakes
+
+
+class ChurnScheduler:
+    """Ngắt và kết nối lại percent_per_s % của population client mỗi giây"""
+
+    def __init__(self, population, percent_per_s, max_in_flight=100, tick=0.1):
+        self.population = population
+        self.percent_per_s = percent_per_s
+        self.max_in_flight = max(1, max_in_flight)
+        self.tick = tick
+        self.handshake_times = []
+        self.failed = 0
+        self.cycles = 0
+        self.started_at = None
+        self.ended_at = None
+        # giây (tính từ origin) -> [số lần churn, số lần kết nối lại lỗi]
+        self._per_second = {}
+        self._origin = None
+
+    async def run(self, disconnect_fn, connect_fn, should_continue, origin=None):
+        """
+        Churn cho đến khi should_continue() trả về False, rồi chờ các lần churn đang dở hoàn tất.
+        disconnect_fn(i) ngắt client i; connect_fn(i) kết nối lại và trả về True nếu thành công.
+        origin (perf_counter) là gốc thời gian của timeline.
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        busy = set()
+        tasks = set()
+        self.started_at = time.perf_counter()
+        self._origin = origin if origin is not None else self.started_at
+        # Số lần churn cần bắt đầu sau mỗi tick; phần lẻ được cộng dồn sang tick sau
+        per_tick = self.population * self.percent_per_s / 100 * self.tick
+        due = 0.0
+
+        async def cycle(index):
+            try:
+                try:
+                    await disconnect_fn(index)
+                except Exception:
+                    pass
+                begin = time.perf_counter()
+                try:
+                    ok = await connect_fn(index)
+                except Exception:
+                    ok = False
+                handshake_ms = (time.perf_counter() - begin) * 1000
+            finally:
+                busy.discard(index)
+                semaphore.release()
+
+            self.cycles += 1
+            if ok:
+                self.handshake_times.append(handshake_ms)
+            else:
+                self.failed += 1
+            counts = self._per_second.setdefault(int(time.perf_counter() - self._origin), [0, 0])
+            counts[0] += 1
+            if not ok:
+                counts[1] += 1
+
+        next_tick = self.started_at
+        while should_continue():
+            # Lịch theo thời điểm dự kiến như RampScheduler, một tick chậm không làm giảm tốc độ churn
+            next_tick += self.tick
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            due += per_tick
+
+            while due >= 1 and len(busy) < self.population and should_continue():
+                await semaphore.acquire()
+                index = random.randrange(self.population)
+                while index in busy:
+                    index = random.randrange(self.population)
+                busy.add(index)
+                due -= 1
+                task = asyncio.ensure_future(cycle(index))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        self.ended_at = time.perf_counter()
+
+    def summary(self):
+        """Tốc độ churn mục tiêu và thực tế, thời gian kết nối lại"""
+        elapsed = (self.ended_at or time.perf_counter()) - self.started_at if self.started_at else 0.0
+        return {
+            'population': self.population,
+            'percent_per_s': self.percent_per_s,
+            'target_per_s': self.population * self.percent_per_s / 100,
+            'achieved_per_s': self.cycles / elapsed if elapsed > 0 else 0.0,
+            'cycles': self.cycles,
+            'failed': self.failed,
+            'handshake': summarize_handshakes(self.handshake_times, self.failed)
+        }
+
+    def to_dict(self):
+        return dict(self.summary(), timeline=[[second, counts[0], counts[1]]
+                                              for second, counts in sorted(self._per_second.items())])
@@ -4,26 +4,40 @@
 """
 Công cụ đo lường và phân tích thời gian truyền dữ liệu từ API đến WebSocket clients
 - Kết nối nhiều WebSocket clients đến server
-- Gửi yêu cầu POST đến API /api/add để cập nhật giá vàng
-- Đo thời gian từ khi POST thành công đến khi các clients nhận được dữ liệu mới
+- Gửi yêu cầu POST đến API /api/add để cập nhật giá vàng (aiohttp, không chặn event loop)
+- Đo thời gian từ khi gửi POST đến khi các clients nhận được dữ liệu mới
 - Vẽ biểu đồ phân tích độ trễ
 """
 
 import asyncio
 import time
 import json
-import requests
-import socketio
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import os
 import threading
+import multiprocessing
 from datetime import datetime
 from colorama import Fore, Style, init
 from tqdm import tqdm
 
+from ws_ramp import RampScheduler, summarize_handshakes
+from ws_raw_client import RawSocketIOClient, build_ws_url, create_http_sessions
+from ws_receive_counter import ReceiveCounter
+from http_publisher import GoldPricePublisher, summarize_publish
+from latency_histogram import LatencyHistogram
+from server_resource_sampler import start_server_sampler
+from raw_samples import save_raw_samples
+from run_catalog import RunCatalog
+from capacity_search import CapacitySearch
+from harness_monitor import HarnessMonitor, evaluate_harness
+from connection_phases import ConnectionPhaseRecorder, PHASES, PHASE_LABELS
+from client_table import ClientTable, IndexedAsyncClient
+from host_limits import (FD_MARGIN, check_client_limits, describe_connect_error, format_host_limits,
+                         parse_source_addresses, raise_nofile_limit)
+
 # Khởi tạo colorama
 init(autoreset=True)
 
@@ -34,11 +48,29 @@ class WSLatencyAnalyzer:
         self.ensure_results_dir()
         
         # Biến để theo dõi
+        # clients[index] là IndexedAsyncClient / RawSocketIOClient; trạng thái của client index nằm ở hàng index của client_table
         self.clients = []
+        self.timelines = []
+        self.client_table = ClientTable()
         self.connected_clients = 0
-        self.client_receive_times = []
-        self.post_success_time = None
+        self.update_sent_time = None
+        self.publisher = None
+        self.publish_result = None
         self.propagation_times = []
+        self.latency_histogram = LatencyHistogram()
+        self.server_sampler = None
+        self.run_started_at = None
+        # Độ trễ event loop và CPU của chính harness; worker_harness là số liệu gửi về từ các worker
+        self.harness_monitor = None
+        self.worker_harness = []
+        self.harness_window_reset = False
+        self.handshake_times = []
+        self.failed_handshakes = 0
+        # Histogram thời gian từng giai đoạn mở kết nối (TCP, nâng cấp WebSocket, Engine.IO, Socket.IO, snapshot)
+        self.connection_phases = ConnectionPhaseRecorder()
+        # Một aiohttp session cho mỗi địa chỉ nguồn, client index dùng session index % số session
+        self.http_sessions = []
+        self.receive_counter = ReceiveCounter()
         self.test_running = True
         
         # Tạo dữ liệu gold price để gửi
@@ -57,18 +89,32 @@ class WSLatencyAnalyzer:
         if not os.path.exists(self.results_dir):
             os.makedirs(self.results_dir)
     
-    async def create_clients(self):
-        """Tạo và kết nối các client WebSocket"""
-        print(f"{Fore.YELLOW}⏳ Đang tạo {self.config['client_count']} kết nối WebSocket...{Style.RESET_ALL}")
-        progress_bar = tqdm(total=self.config['client_count'], desc="Kết nối client", unit="client")
+    async def create_clients(self, count=None, offset=None):
+        """
+        Tạo và kết nối count client WebSocket (mặc định: config['client_count']).
+        Gọi nhiều lần để thêm client vào các kết nối đã có (chế độ sweep).
+        """
+        count = self.config['client_count'] if count is None else count
+        if offset is None:
+            offset = self.config.get('client_offset', 0) + len(self.clients)
+        target = len(self.clients) + count
         
-        for i in range(self.config['client_count']):
-            client = await self.create_client(i)
-            self.clients.append(client)
-            progress_bar.update(1)
-            
-            # Chờ một chút giữa các kết nối để tránh quá tải
-            await asyncio.sleep(0.05)
+        print(f"{Fore.YELLOW}⏳ Đang tạo {count} kết nối WebSocket...{Style.RESET_ALL}")
+        progress_bar = tqdm(total=count, desc="Kết nối client", unit="client",
+                            disable=not self.config.get('show_progress', True))
+        
+        ramp = RampScheduler(self.config.get('ramp_rate', 200), self.config.get('max_in_flight', 100))
+        self.client_table.reserve(count)
+        # Mỗi kết nối tốn một fd; tiến trình worker cũng tự nâng giới hạn của mình
+        raise_nofile_limit(len(self.clients) + count + FD_MARGIN)
+        
+        async def connect_client(i):
+            return await self.create_client(offset + i)
+        
+        await ramp.run(count, connect_client,
+                       on_done=lambda i, ok, handshake_ms: progress_bar.update(1))
+        self.handshake_times.extend(ramp.handshake_times)
+        self.failed_handshakes += ramp.failed
         
         progress_bar.close()
         
@@ -78,68 +124,131 @@ class WSLatencyAnalyzer:
         
         print(f"{Fore.YELLOW}⏳ Chờ tất cả các client kết nối...{Style.RESET_ALL}")
         
-        while self.connected_clients < self.config['client_count'] and time.time() - start_time < timeout:
-            print(f"  Đã kết nối: {self.connected_clients}/{self.config['client_count']}", end="\r")
+        while self.connected_clients < target and time.time() - start_time < timeout:
+            print(f"  Đã kết nối: {self.connected_clients}/{target}", end="\r")
             await asyncio.sleep(0.5)
         
-        if self.connected_clients < self.config['client_count']:
-            print(f"{Fore.YELLOW}⚠ Chỉ có {self.connected_clients}/{self.config['client_count']} client kết nối được{Style.RESET_ALL}")
+        if self.connected_clients < target:
+            print(f"{Fore.YELLOW}⚠ Chỉ có {self.connected_clients}/{target} client kết nối được{Style.RESET_ALL}")
         else:
-            print(f"{Fore.GREEN}✓ Tất cả {self.config['client_count']} client đã kết nối thành công!{Style.RESET_ALL}")
+            print(f"{Fore.GREEN}✓ Tất cả {target} client đã kết nối thành công!{Style.RESET_ALL}")
         
         # Đợi thêm chút nữa để đảm bảo các kết nối ổn định
         await asyncio.sleep(2)
     
-    async def create_client(self, index):
-        """Tạo một client WebSocket"""
-        client = {
-            'id': f"client-{index}",
-            'sio': socketio.AsyncClient(),
-            'connected': False,
-            'receive_time': None
-        }
-        
-        @client['sio'].event
-        async def connect():
-            client['connected'] = True
-            self.connected_clients += 1
+    def record_receive(self, index, receive_time):
+        """Ghi nhận lần nhận dữ liệu đầu tiên của client index sau khi gửi POST"""
+        if self.update_sent_time and self.client_table.record_receive(index, receive_time):
+            propagation_time = (receive_time - self.update_sent_time) * 1000  # ms
+            self.latency_histogram.record(propagation_time)
+            self.receive_counter.increment()
+            
             if self.config['verbose']:
-                print(f"{Fore.GREEN}✓ Client {client['id']} đã kết nối{Style.RESET_ALL}")
+                print(f"{Fore.CYAN}→ Client {self.client_table.client_id[index]} nhận cập nhật sau {propagation_time:.2f}ms{Style.RESET_ALL}")
+    
+    def handle_update(self, index, receive_time, packet=None):
+        """Xử lý một lần nhận gold-prices-updated: snapshot lúc kết nối chỉ được tính vào giai đoạn first_snapshot"""
+        if self.timelines[index].is_snapshot(receive_time, self.update_sent_time):
+            return
+        self.record_receive(index, receive_time)
+    
+    # Handler dùng chung cho mọi client, nhận index của client thay vì closure riêng cho từng client
+    
+    def on_client_event(self, event, index, *args):
+        """Sự kiện của client socketio (IndexedAsyncClient)"""
+        if event == 'gold-prices-updated':
+            # Lưu thời gian nhận dữ liệu nếu đã gửi POST (perf_counter, cùng đồng hồ với publisher)
+            self.handle_update(index, time.perf_counter())
+        elif event == 'eio_open':
+            self.timelines[index].mark('eio_open')
+        elif event == 'connect':
+            self.on_client_connect(index)
+        elif event == 'disconnect':
+            self.on_client_disconnect(index)
+    
+    def on_client_connect(self, index):
+        self.timelines[index].mark('sio_connect')
+        self.client_table.mark_connected(index, time.perf_counter())
+        self.connected_clients += 1
+        if self.config['verbose']:
+            print(f"{Fore.GREEN}✓ Client {self.client_table.client_id[index]} đã kết nối{Style.RESET_ALL}")
+    
+    def on_client_disconnect(self, index):
+        self.client_table.mark_disconnected(index)
+        if self.config['verbose']:
+            print(f"{Fore.RED}✗ Client {self.client_table.client_id[index]} đã ngắt kết nối{Style.RESET_ALL}")
+    
+    def add_client(self, client_id, client):
+        """Thêm client vào bảng trạng thái, trả về index của nó"""
+        index = self.client_table.add(client_id)
+        self.clients.append(client)
+        self.timelines.append(self.connection_phases.timeline())
+        return index
+    
+    def session_for(self, index):
+        """aiohttp session của client index: các địa chỉ nguồn được dùng lần lượt (round-robin)"""
+        if not self.http_sessions:
+            self.http_sessions = create_http_sessions(self.config.get('source_addresses'))
+        return self.http_sessions[index % len(self.http_sessions)]
+    
+    def report_connect_error(self, client_id, error):
+        hint = describe_connect_error(error)
+        print(f"{Fore.RED}✗ Lỗi kết nối client {client_id}: {str(error)}{f' ({hint})' if hint else ''}{Style.RESET_ALL}")
+    
+    async def create_client(self, client_id):
+        """Tạo và kết nối một client WebSocket, trả về True nếu kết nối thành công"""
+        if self.config.get('transport') == 'raw':
+            return await self.create_raw_client(client_id)
         
-        @client['sio'].event
-        async def disconnect():
-            client['connected'] = False
-            if self.config['verbose']:
-                print(f"{Fore.RED}✗ Client {client['id']} đã ngắt kết nối{Style.RESET_ALL}")
-        
-        @client['sio'].on('gold-prices-updated')
-        async def on_gold_prices_updated(data):
-            # Lưu thời gian nhận dữ liệu nếu đã gửi POST thành công
-            if self.post_success_time and client['receive_time'] is None:
-                client['receive_time'] = time.time()
-                propagation_time = (client['receive_time'] - self.post_success_time) * 1000  # ms
-                self.propagation_times.append(propagation_time)
-                
-                if self.config['verbose']:
-                    print(f"{Fore.CYAN}→ Client {client['id']} nhận cập nhật sau {propagation_time:.2f}ms{Style.RESET_ALL}")
+        # Các client dùng chung aiohttp session (một session cho mỗi địa chỉ nguồn),
+        # TraceConfig của session ghi giai đoạn TCP và nâng cấp WebSocket
+        index = len(self.clients)
+        sio = IndexedAsyncClient(index, self.on_client_event, http_session=self.session_for(index))
+        self.add_client(client_id, sio)
         
         try:
-            await client['sio'].connect(
+            self.timelines[index].begin()
+            await sio.connect(
                 self.config['server_url'],
                 transports=['websocket'],
                 socketio_path='/socket.io',
                 wait_timeout=10
             )
         except Exception as e:
-            print(f"{Fore.RED}✗ Lỗi kết nối client {client['id']}: {str(e)}{Style.RESET_ALL}")
+            self.report_connect_error(client_id, e)
         
-        return client
+        return bool(self.client_table.connected[index])
+    
+    async def create_raw_client(self, client_id):
+        """Tạo một client dùng giao thức Socket.IO tối giản trên WebSocket thuần"""
+        index = len(self.clients)
+        raw = RawSocketIOClient(
+            build_ws_url(self.config['server_url']),
+            self.session_for(index),
+            on_update=self.handle_update,
+            on_disconnect=self.on_client_disconnect,
+            index=index
+        )
+        self.add_client(client_id, raw)
+        raw.timeline = self.timelines[index]
+        
+        try:
+            await raw.connect(wait_timeout=10)
+        except Exception as e:
+            self.report_connect_error(client_id, e)
+            return False
+        self.on_client_connect(index)
+        return True
     
     async def disconnect_clients(self):
         """Ngắt kết nối tất cả client"""
-        for client in self.clients:
-            if client['connected']:
-                await client['sio'].disconnect()
+        for index, client in enumerate(self.clients):
+            if self.client_table.connected[index]:
+                await client.disconnect()
+        
+        for session in self.http_sessions:
+            await session.close()
+        self.http_sessions = []
     
     async def send_gold_update(self):
         """Gửi yêu cầu POST để cập nhật giá vàng"""
@@ -152,87 +261,136 @@ class WSLatencyAnalyzer:
         print(f"Dữ liệu gửi đi: {json.dumps(self.gold_data, indent=2, ensure_ascii=False)}")
         
         # Reset trạng thái nhận dữ liệu
-        for client in self.clients:
-            client['receive_time'] = None
+        self.client_table.reset_receives()
         self.propagation_times = []
+        self.latency_histogram = LatencyHistogram()
+        self.receive_counter.reset(self.connected_clients)
         
-        try:
-            # Gửi POST request
-            response = requests.post(
-                f"{self.config['server_url']}{self.config['api_endpoint']}",
-                json=self.gold_data,
-                headers={'Content-Type': 'application/json'},
-                timeout=5
-            )
-            
-            print(f"Response status: {response.status_code}")
-            print(f"Response body: {response.text}")
-            
-            if response.status_code == 200:
-                self.post_success_time = time.time()
-                print(f"{Fore.GREEN}✓ Gửi cập nhật thành công{Style.RESET_ALL}")
-                return True
-            else:
-                print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: HTTP {response.status_code} - {response.text}{Style.RESET_ALL}")
-                return False
-                
-        except Exception as e:
-            print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: {str(e)}{Style.RESET_ALL}")
+        if self.publisher is None:
+            self.publisher = GoldPricePublisher(self.config['server_url'], self.config['api_endpoint'])
+            await self.publisher.start()
+        
+        # Mốc tính độ trễ là thời điểm gửi POST; client chỉ ghi nhận dữ liệu đến sau mốc này
+        self.update_sent_time = time.perf_counter()
+        result = await self.publisher.publish(self.gold_data, sent_at=self.update_sent_time)
+        self.publish_result = result
+        
+        if result['error']:
+            self.update_sent_time = None
+            print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: {result['error']}{Style.RESET_ALL}")
+            return False
+        
+        print(f"Response status: {result['status']}")
+        print(f"Response body: {result['body']}")
+        
+        if result['ok']:
+            print(f"{Fore.GREEN}✓ Gửi cập nhật thành công (response {(result['response_at'] - result['sent_at']) * 1000:.2f}ms, "
+                  f"ack {(result['ack_at'] - result['sent_at']) * 1000:.2f}ms){Style.RESET_ALL}")
+            return True
+        else:
+            self.update_sent_time = None
+            print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: HTTP {result['status']} - {result['body']}{Style.RESET_ALL}")
             return False
     
+    async def close_publisher(self):
+        """Đóng pool kết nối HTTP"""
+        if self.publisher is not None:
+            await self.publisher.close()
+            self.publisher = None
+    
+    def begin_server_sampling(self):
+        """Đặt gốc thời gian của lần chạy và bắt đầu lấy mẫu tài nguyên server (nếu được bật)"""
+        self.run_started_at = time.perf_counter()
+        if self.config.get('sample_interval'):
+            self.server_sampler = start_server_sampler(self.config['server_url'], self.config.get('server_pids'),
+                                                       self.config['sample_interval'], origin=self.run_started_at)
+            if self.server_sampler is not None:
+                print(f"Lấy mẫu tài nguyên server: PID {', '.join(map(str, self.server_sampler.pids))} mỗi {self.config['sample_interval']}s")
+            else:
+                print(f"{Fore.YELLOW}⚠ Không tìm được tiến trình server để lấy mẫu tài nguyên (dùng --server-pid){Style.RESET_ALL}")
+    
+    def begin_harness_monitor(self):
+        """Bắt đầu đo độ trễ event loop và CPU của harness (cùng gốc thời gian với lần chạy)"""
+        self.harness_monitor = HarnessMonitor(self.config.get('lag_interval', 0.01),
+                                              self.config.get('sample_interval') or 1.0).start(self.run_started_at)
+    
+    def reset_harness_window(self):
+        """Bắt đầu cửa sổ đánh giá harness mới (bỏ qua giai đoạn mở kết nối)"""
+        if self.harness_monitor is not None:
+            self.harness_monitor.reset_window()
+            self.harness_window_reset = True
+    
+    async def stop_harness_monitor(self):
+        if self.harness_monitor is not None:
+            await self.harness_monitor.stop()
+    
+    def evaluate_harness(self):
+        """Số liệu của tất cả tiến trình harness và đánh giá lần đo có hợp lệ không"""
+        processes = ([self.harness_monitor.to_dict()] if self.harness_monitor is not None else []) + self.worker_harness
+        verdict = evaluate_harness(processes, self.config.get('max_loop_lag_ms', 50.0),
+                                   self.config.get('max_harness_cpu', 90.0))
+        return dict(verdict, processes=processes)
+    
+    async def stop_server_sampler(self):
+        """Dừng lấy mẫu tài nguyên server (join thread ngoài event loop)"""
+        if self.server_sampler is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.server_sampler.stop)
+    
+    def get_connection_phases(self):
+        """Histogram các giai đoạn mở kết nối của tất cả client"""
+        return self.connection_phases
+    
+    def get_received_count(self):
+        """Đếm số client đã nhận được cập nhật"""
+        return self.receive_counter.count
+    
     async def wait_for_all_clients_to_receive(self):
         """Chờ tất cả client nhận được dữ liệu"""
-        # Khởi tạo progress bar
-        progress_bar = tqdm(total=self.connected_clients, desc="Nhận cập nhật", unit="client")
-        
         timeout = 10  # Thời gian tối đa chờ đợi (giây)
-        start_time = time.time()
         
-        last_received_count = 0
+        # Progress bar được handler nhận dữ liệu cập nhật trực tiếp, không cần quét lại các client
+        progress_bar = tqdm(total=self.receive_counter.target, initial=self.receive_counter.count,
+                            desc="Nhận cập nhật", unit="client",
+                            disable=not self.config.get('show_progress', True))
+        self.receive_counter.progress_bar = progress_bar
         
-        while time.time() - start_time < timeout:
-            # Đếm số client đã nhận được dữ liệu
-            received_count = sum(1 for client in self.clients if client['receive_time'] is not None)
-            
-            # Cập nhật progress bar
-            if received_count > last_received_count:
-                progress_bar.update(received_count - last_received_count)
-                last_received_count = received_count
-            
-            # Nếu tất cả đã nhận, dừng lại
-            if received_count == self.connected_clients:
-                break
-                
-            await asyncio.sleep(0.1)
+        await self.receive_counter.wait(timeout)
         
+        self.receive_counter.progress_bar = None
         progress_bar.close()
         
-        received_count = sum(1 for client in self.clients if client['receive_time'] is not None)
+        # Mẫu thô lấy thẳng từ cột thời điểm nhận, hot path chỉ ghi vào bảng và histogram
+        self.propagation_times = self.client_table.latencies_ms(self.update_sent_time)
+        
+        received_count = self.get_received_count()
         if received_count == self.connected_clients:
-            print(f"{Fore.GREEN}✓ Tất cả {self.connected_clients} client đã nhận được cập nhật!{Style.RESET_ALL}")
+            drain_ms = (self.receive_counter.completed_at - self.update_sent_time) * 1000
+            print(f"{Fore.GREEN}✓ Tất cả {self.connected_clients} client đã nhận được cập nhật sau {drain_ms:.2f}ms!{Style.RESET_ALL}")
         else:
             print(f"{Fore.YELLOW}⚠ Chỉ có {received_count}/{self.connected_clients} client nhận được cập nhật sau {timeout}s{Style.RESET_ALL}")
     
     def create_latency_chart(self):
         """Tạo biểu đồ phân tích độ trễ"""
-        if not self.propagation_times:
+        if self.latency_histogram.count == 0:
             print(f"{Fore.RED}✗ Không có dữ liệu độ trễ để phân tích{Style.RESET_ALL}")
             return None
         
-        # Tính các thống kê
-        avg_latency = np.mean(self.propagation_times)
-        median_latency = np.median(self.propagation_times)
-        min_latency = np.min(self.propagation_times)
-        max_latency = np.max(self.propagation_times)
-        p95_latency = np.percentile(self.propagation_times, 95)
-        p99_latency = np.percentile(self.propagation_times, 99)
-        std_dev = np.std(self.propagation_times)
+        # Tính các thống kê từ histogram (O(số bucket), không duyệt lại các mẫu)
+        stats = self.latency_histogram.summary()
+        avg_latency = stats['avg_ms']
+        median_latency = stats['median_ms']
+        min_latency = stats['min_ms']
+        max_latency = stats['max_ms']
+        p95_latency = stats['p95_ms']
+        p99_latency = stats['p99_ms']
+        std_dev = stats['std_dev_ms']
         
         # Tạo biểu đồ histogram
         plt.figure(figsize=(12, 7))
         
-        # Hiển thị histogram
-        n, bins, patches = plt.hist(self.propagation_times, bins=30, alpha=0.7, color='skyblue', edgecolor='black')
+        # Hiển thị histogram (các bucket đã được gộp sẵn thành 30 khoảng)
+        edges, counts = self.latency_histogram.linear_bins(30)
+        n, bins, patches = plt.hist(edges[:-1], bins=edges, weights=counts, alpha=0.7, color='skyblue', edgecolor='black')
         
         # Thêm các đường thẳng cho các thống kê
         plt.axvline(avg_latency, color='red', linestyle='dashed', linewidth=2, label=f'Trung bình: {avg_latency:.2f}ms')
@@ -266,66 +424,112 @@ P99: {p99_latency:.2f}ms
         # Lưu biểu đồ
         chart_path = os.path.join(self.results_dir, f'api_to_ws_latency_{self.connected_clients}_clients_{datetime.now().strftime("%Y%m%d_%H%M%S")}.png')
         plt.savefig(chart_path, dpi=300)
+        # Đóng figure để các lần đo liên tiếp trong cùng tiến trình (chế độ capacity) không giữ lại bộ nhớ
+        plt.close()
         print(f"{Fore.GREEN}✓ Đã lưu biểu đồ tại: {chart_path}{Style.RESET_ALL}")
         
         return chart_path
     
-    def save_results_as_json(self):
-        """Lưu kết quả phân tích dưới dạng JSON"""
-        if not self.propagation_times:
+    def save_results_as_json(self, received_count=None, extra=None, resource_window=None):
+        """
+        Lưu kết quả phân tích dưới dạng JSON.
+        received_count ghi đè số client nhận được cập nhật, extra được thêm vào kết quả,
+        resource_window (giây, tính từ lúc bắt đầu chạy) giới hạn các mẫu tài nguyên server được lưu.
+        """
+        if self.latency_histogram.count == 0:
             print(f"{Fore.RED}✗ Không có dữ liệu độ trễ để lưu{Style.RESET_ALL}")
             return None
         
         # Tính các thống kê
+        stats = self.latency_histogram.summary()
         results = {
             'timestamp': datetime.now().isoformat(),
             'config': {
                 'server_url': self.config['server_url'],
                 'api_endpoint': self.config['api_endpoint'],
-                'client_count': self.config['client_count']
+                'client_count': self.config['client_count'],
+                'transport': self.config.get('transport', 'socketio'),
+                'server_impl': self.config.get('server_impl', 'nodejs'),
+                'scenario': self.config.get('scenario', 'api_to_ws_latency'),
+                'source_addresses': self.config.get('source_addresses') or []
             },
+            # Giới hạn fd / cổng tạm của máy harness đo được trước khi chạy
+            'host_limits': self.config.get('host_limits'),
             'stats': {
                 'connected_clients': self.connected_clients,
-                'clients_received_update': sum(1 for client in self.clients if client['receive_time'] is not None),
-                'avg_latency_ms': float(np.mean(self.propagation_times)),
-                'median_latency_ms': float(np.median(self.propagation_times)),
-                'min_latency_ms': float(np.min(self.propagation_times)),
-                'max_latency_ms': float(np.max(self.propagation_times)),
-                'p95_latency_ms': float(np.percentile(self.propagation_times, 95)),
-                'p99_latency_ms': float(np.percentile(self.propagation_times, 99)),
-                'std_dev_ms': float(np.std(self.propagation_times))
+                'clients_received_update': self.get_received_count() if received_count is None else received_count,
+                'avg_latency_ms': stats['avg_ms'],
+                'median_latency_ms': stats['median_ms'],
+                'min_latency_ms': stats['min_ms'],
+                'max_latency_ms': stats['max_ms'],
+                'p95_latency_ms': stats['p95_ms'],
+                'p99_latency_ms': stats['p99_ms'],
+                'std_dev_ms': stats['std_dev_ms']
             },
-            'raw_data': {
-                'propagation_times_ms': [float(t) for t in self.propagation_times]
-            }
+            'histogram': self.latency_histogram.to_dict(),
+            'handshake': summarize_handshakes(self.handshake_times, self.failed_handshakes),
+            'connection_phases': self.get_connection_phases().to_dict(),
+            'publish': summarize_publish(self.publish_result) if self.publish_result else None,
+            # Thời điểm gửi cập nhật, cùng gốc thời gian với time_s của các mẫu tài nguyên server
+            'update_offset_s': self.update_sent_time - self.run_started_at,
+            'server_resources': (self.server_sampler.to_dict(*(resource_window or ()))
+                                 if self.server_sampler is not None else None)
         }
+        results['harness'] = self.evaluate_harness()
+        if extra:
+            results.update(extra)
         
-        # Lưu vào file JSON
         json_path = os.path.join(self.results_dir, f'api_to_ws_latency_{self.connected_clients}_clients_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        
+        # Mẫu thô lưu ra file .npy bên cạnh, JSON chỉ giữ con trỏ tới file đó
+        results['raw_data'] = {
+            'propagation_times_ms': save_raw_samples(json_path, self.propagation_times)
+        }
+        
+        # Lưu vào file JSON
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(results, f, indent=2)
             
         print(f"{Fore.GREEN}✓ Đã lưu kết quả phân tích tại: {json_path}{Style.RESET_ALL}")
+        
+        if not results['harness']['valid']:
+            print(f"{Fore.RED}✗ Harness quá tải trong lúc đo, độ trễ đo được gồm cả độ trễ của chính harness:{Style.RESET_ALL}")
+            for reason in results['harness']['reasons']:
+                print(f"{Fore.RED}  - {reason}{Style.RESET_ALL}")
+            if self.config.get('reject_saturated'):
+                print(f"{Fore.RED}✗ Lần đo bị loại: không ghi vào danh mục lần chạy (--reject-saturated){Style.RESET_ALL}")
+                return json_path
+        
+        # Ghi lần chạy vào danh mục để các script báo cáo tìm được bằng truy vấn
+        try:
+            with RunCatalog(self.results_dir) as catalog:
+                # Lần thử của chế độ capacity có kịch bản riêng để không lẫn vào các báo cáo theo mức tải
+                catalog.record_run(json_path, results, self.config.get('scenario', 'api_to_ws_latency'),
+                                   self.config.get('server_impl', 'nodejs'), self.config['client_count'])
+        except Exception as e:
+            print(f"{Fore.YELLOW}⚠ Không ghi được vào danh mục lần chạy: {str(e)}{Style.RESET_ALL}")
+        
         return json_path
     
     def print_summary(self):
         """In tóm tắt kết quả phân tích"""
-        if not self.propagation_times:
+        if self.latency_histogram.count == 0:
             print(f"{Fore.RED}✗ Không có dữ liệu độ trễ để phân tích{Style.RESET_ALL}")
             return
         
-        # Tính các thống kê
-        avg_latency = np.mean(self.propagation_times)
-        median_latency = np.median(self.propagation_times)
-        min_latency = np.min(self.propagation_times)
-        max_latency = np.max(self.propagation_times)
-        p95_latency = np.percentile(self.propagation_times, 95)
-        p99_latency = np.percentile(self.propagation_times, 99)
-        std_dev = np.std(self.propagation_times)
+        # Tính các thống kê từ histogram (O(số bucket), không duyệt lại các mẫu)
+        stats = self.latency_histogram.summary()
+        avg_latency = stats['avg_ms']
+        median_latency = stats['median_ms']
+        min_latency = stats['min_ms']
+        max_latency = stats['max_ms']
+        p95_latency = stats['p95_ms']
+        p99_latency = stats['p99_ms']
+        std_dev = stats['std_dev_ms']
         
         print(f"\n{Fore.CYAN}📊 Tóm tắt độ trễ từ API đến WebSocket:{Style.RESET_ALL}")
         print(f"Tổng số client: {self.connected_clients}")
-        print(f"Số client nhận được cập nhật: {sum(1 for client in self.clients if client['receive_time'] is not None)}")
+        print(f"Số client nhận được cập nhật: {self.get_received_count()}")
         print(f"Độ trễ trung bình: {avg_latency:.2f}ms")
         print(f"Độ trễ trung vị: {median_latency:.2f}ms")
         print(f"Độ trễ tối thiểu: {min_latency:.2f}ms")
@@ -334,34 +538,50 @@ P99: {p99_latency:.2f}ms
         print(f"P99: {p99_latency:.2f}ms")
         print(f"Độ lệch chuẩn: {std_dev:.2f}ms")
         
+        handshake = summarize_handshakes(self.handshake_times, self.failed_handshakes)
+        if handshake['connected']:
+            print(f"Handshake: TB {handshake['avg_ms']:.2f}ms, P95 {handshake['p95_ms']:.2f}ms, "
+                  f"P99 {handshake['p99_ms']:.2f}ms, lỗi {handshake['failed']}")
+        
+        phases = self.get_connection_phases().summary()
+        if any(phases[phase]['count'] for phase in PHASES):
+            print(f"\n{Fore.CYAN}🔌 Các giai đoạn mở kết nối:{Style.RESET_ALL}")
+            for phase in PHASES:
+                stats = phases[phase]
+                if stats['count']:
+                    print(f"- {PHASE_LABELS[phase]}: TB {stats['avg_ms']:.2f}ms, P95 {stats['p95_ms']:.2f}ms, "
+                          f"P99 {stats['p99_ms']:.2f}ms, tối đa {stats['max_ms']:.2f}ms ({stats['count']} client)")
+        
         # Phân tích thêm
+        histogram = self.latency_histogram
         time_ranges = {
-            'Dưới 10ms': 0,
-            '10-50ms': 0,
-            '50-100ms': 0,
-            '100-200ms': 0,
-            '200-500ms': 0,
-            'Trên 500ms': 0
+            'Dưới 10ms': histogram.count_between(None, 10),
+            '10-50ms': histogram.count_between(10, 50),
+            '50-100ms': histogram.count_between(50, 100),
+            '100-200ms': histogram.count_between(100, 200),
+            '200-500ms': histogram.count_between(200, 500),
+            'Trên 500ms': histogram.count_between(500, None)
         }
         
-        for t in self.propagation_times:
-            if t < 10:
-                time_ranges['Dưới 10ms'] += 1
-            elif t < 50:
-                time_ranges['10-50ms'] += 1
-            elif t < 100:
-                time_ranges['50-100ms'] += 1
-            elif t < 200:
-                time_ranges['100-200ms'] += 1
-            elif t < 500:
-                time_ranges['200-500ms'] += 1
-            else:
-                time_ranges['Trên 500ms'] += 1
-                
         print(f"\n{Fore.CYAN}📈 Phân phối độ trễ:{Style.RESET_ALL}")
         for range_name, count in time_ranges.items():
-            percent = (count / len(self.propagation_times)) * 100
+            percent = (count / histogram.count) * 100
             print(f"- {range_name}: {count} clients ({percent:.1f}%)")
+        
+        if self.server_sampler is not None and self.server_sampler.samples:
+            usage = self.server_sampler.summary()
+            print(f"\n{Fore.CYAN}🖥️  Tài nguyên server (PID {', '.join(map(str, self.server_sampler.pids))}):{Style.RESET_ALL}")
+            print(f"CPU: TB {usage['avg_cpu_percent']:.1f}%, cao nhất {usage['max_cpu_percent']:.1f}%")
+            print(f"RSS cao nhất: {usage['max_rss_mb']:.1f}MB, fd cao nhất: {usage['max_num_fds']}, thread cao nhất: {usage['max_num_threads']}")
+            print(f"Context switch: {usage['ctx_switches_voluntary']} tự nguyện, {usage['ctx_switches_involuntary']} không tự nguyện")
+        
+        harness = self.evaluate_harness()
+        if harness['processes']:
+            color = Fore.GREEN if harness['valid'] else Fore.RED
+            print(f"\n{Fore.CYAN}🧪 Harness ({len(harness['processes'])} tiến trình):{Style.RESET_ALL}")
+            lag = f"{harness['max_loop_lag_p99_ms']:.2f}ms" if harness['max_loop_lag_p99_ms'] is not None else '-'
+            cpu = f"{harness['max_cpu_percent']:.0f}%" if harness['max_cpu_percent'] is not None else '-'
+            print(f"{color}P99 độ trễ event loop lớn nhất: {lag}, CPU lớn nhất: {cpu}{Style.RESET_ALL}")
     
     async def run_test(self):
         """Thực hiện đo lường và phân tích"""
@@ -374,18 +594,27 @@ P99: {p99_latency:.2f}ms
         print(f"API Endpoint: {self.config['api_endpoint']}")
         print(f"Số lượng clients: {self.config['client_count']}")
         
+        # Lấy mẫu tài nguyên server suốt lần đo (kể cả lúc mở kết nối)
+        self.begin_server_sampling()
+        self.begin_harness_monitor()
+        
         # Tạo và kết nối các client
         await self.create_clients()
         
         # Đợi một chút để các kết nối ổn định
         await asyncio.sleep(2)
         
+        # Harness chỉ được đánh giá trong thời gian đo, không tính lúc mở kết nối
+        self.reset_harness_window()
+        
         # Gửi POST cập nhật
         success = await self.send_gold_update()
         
         if success:
             # Chờ tất cả client nhận được cập nhật
             await self.wait_for_all_clients_to_receive()
+            await self.stop_server_sampler()
+            await self.stop_harness_monitor()
             
             # Phân tích và hiển thị kết quả
             self.print_summary()
@@ -404,15 +633,389 @@ P99: {p99_latency:.2f}ms
             
         # Ngắt kết nối tất cả client
         await self.disconnect_clients()
+        await self.close_publisher()
+        await self.stop_server_sampler()
+        await self.stop_harness_monitor()
         
         print(f"\n{Fore.GREEN}✓ Hoàn thành đo lường!{Style.RESET_ALL}")
         
         return results
+    
+    async def run_sweep(self, plateaus, updates_per_plateau=5, update_interval=2.0):
+        """
+        Một lần chạy dài cho cả đường cong mở rộng: thêm client theo từng mức (plateau) trên các kết nối đã mở,
+        gửi updates_per_plateau cập nhật ở mỗi mức và lưu phân phối độ trễ của từng mức thành một file kết quả
+        """
+        print(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}⏱️  ĐO ĐỘ TRỄ THEO TỪNG MỨC TẢI (SWEEP){Style.RESET_ALL}")
+        print(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
+        
+        print(f"\n{Fore.YELLOW}ℹ️ Cấu hình:{Style.RESET_ALL}")
+        print(f"Server URL: {self.config['server_url']}")
+        print(f"API Endpoint: {self.config['api_endpoint']}")
+        print(f"Các mức client: {', '.join(f'{p:,}' for p in plateaus)}")
+        print(f"Số cập nhật mỗi mức: {updates_per_plateau}, cách nhau {update_interval}s")
+        
+        self.begin_server_sampling()
+        self.begin_harness_monitor()
+        
+        plateau_results = []
+        current = 0
+        
+        for index, plateau in enumerate(plateaus):
+            print(f"\n{Fore.CYAN}📶 Mức {index + 1}/{len(plateaus)}: {plateau:,} client{Style.RESET_ALL}")
+            await self.create_clients(plateau - current)
+            current = plateau
+            self.config['client_count'] = plateau
+            
+            plateau_started = time.perf_counter() - self.run_started_at
+            self.reset_harness_window()
+            histogram = LatencyHistogram()
+            propagation_times = []
+            update_offsets = []
+            receives = 0
+            expected = 0
+            
+            for update_index in range(updates_per_plateau):
+                if update_index:
+                    await asyncio.sleep(update_interval)
+                if not await self.send_gold_update():
+                    continue
+                await self.wait_for_all_clients_to_receive()
+                
+                histogram.merge(self.latency_histogram)
+                propagation_times.append(self.propagation_times)
+                update_offsets.append(self.update_sent_time - self.run_started_at)
+                receives += self.get_received_count()
+                expected += self.connected_clients
+            
+            if histogram.count == 0:
+                print(f"{Fore.RED}✗ Không có dữ liệu độ trễ ở mức {plateau:,} client{Style.RESET_ALL}")
+                continue
+            
+            # Lưu phân phối gộp của tất cả cập nhật ở mức này như một lần đo bình thường
+            self.latency_histogram = histogram
+            self.propagation_times = np.concatenate(propagation_times)
+            stats = histogram.summary()
+            json_path = self.save_results_as_json(
+                received_count=round(receives / len(update_offsets)),
+                extra={'sweep': {
+                    'plateau_index': index,
+                    'plateaus': list(plateaus),
+                    'updates': len(update_offsets),
+                    'update_offsets_s': update_offsets,
+                    'receives': receives,
+                    'expected_receives': expected
+                }},
+                resource_window=(plateau_started, time.perf_counter() - self.run_started_at)
+            )
+            
+            plateau_results.append({
+                'client_count': plateau,
+                'connected_clients': self.connected_clients,
+                'delivery_ratio': receives / expected if expected else 0.0,
+                'avg_latency_ms': stats['avg_ms'],
+                'p95_latency_ms': stats['p95_ms'],
+                'p99_latency_ms': stats['p99_ms'],
+                'harness_valid': self.evaluate_harness()['valid'],
+                'json_path': json_path
+            })
+        
+        await self.disconnect_clients()
+        await self.close_publisher()
+        await self.stop_server_sampler()
+        await self.stop_harness_monitor()
+        
+        print(f"\n{Fore.CYAN}📊 Độ trễ theo từng mức tải:{Style.RESET_ALL}")
+        for result in plateau_results:
+            print(f"  {result['client_count']:>8,} client: TB {result['avg_latency_ms']:8.2f}ms, "
+                  f"P95 {result['p95_latency_ms']:8.2f}ms, P99 {result['p99_latency_ms']:8.2f}ms, "
+                  f"nhận {result['delivery_ratio'] * 100:6.2f}%"
+                  f"{'' if result['harness_valid'] else f'  {Fore.RED}(harness quá tải){Style.RESET_ALL}'}")
+        
+        print(f"\n{Fore.GREEN}✓ Hoàn thành đo lường!{Style.RESET_ALL}")
+        
+        return {
+            'chart_path': None,
+            'json_path': plateau_results[-1]['json_path'] if plateau_results else None,
+            'plateaus': plateau_results
+        }
+
+
+class ShardedWSLatencyAnalyzer(WSLatencyAnalyzer):
+    """
+    Chia client_count cho nhiều tiến trình worker, mỗi worker chạy event loop riêng.
+    Tiến trình điều phối chỉ gửi POST và gộp thời điểm nhận dữ liệu từ các worker,
+    nên kết quả vẫn theo đúng định dạng của save_results_as_json().
+    """
+    
+    def __init__(self, config):
+        super().__init__(config)
+        self.workers = []
+        self.received_count = 0
+        # Tổng số client đã chia cho các worker (tăng dần trong chế độ sweep)
+        self.assigned_clients = 0
+        # Histogram các giai đoạn kết nối mới nhất (cộng dồn) của từng worker
+        self.worker_phases = {}
+    
+    def split_client_count(self, count=None, worker_count=None):
+        """Chia đều số client cho các worker, trả về danh sách (offset, số client)"""
+        count = self.config['client_count'] if count is None else count
+        if worker_count is None:
+            worker_count = max(1, min(self.config['workers'], count))
+        base, extra = divmod(count, worker_count)
+        
+        shards = []
+        offset = self.assigned_clients
+        for i in range(worker_count):
+            size = base + (1 if i < extra else 0)
+            shards.append((offset, size))
+            offset += size
+        return shards
+    
+    async def recv_from_worker(self, conn, timeout):
+        """Đọc một thông điệp từ worker mà không chặn event loop"""
+        loop = asyncio.get_running_loop()
+        has_data = await loop.run_in_executor(None, conn.poll, timeout)
+        if not has_data:
+            raise TimeoutError('worker không phản hồi')
+        return conn.recv()
+    
+    async def create_clients(self, count=None, offset=None):
+        """Khởi động các worker, mỗi worker tự kết nối phần client của mình; nếu worker đã chạy thì chia thêm client cho chúng"""
+        count = self.config['client_count'] if count is None else count
+        if self.workers:
+            await self.grow_clients(count)
+            return
+        
+        shards = self.split_client_count(count)
+        self.assigned_clients = count
+        print(f"{Fore.YELLOW}⏳ Khởi động {len(shards)} worker cho {count} kết nối WebSocket...{Style.RESET_ALL}")
+        
+        ctx = multiprocessing.get_context('spawn')
+        for index, (offset, size) in enumerate(shards):
+            worker_config = dict(self.config)
+            worker_config.update({
+                'client_count': size,
+                'client_offset': offset,
+                # Tổng tốc độ ramp của các worker bằng tốc độ được cấu hình
+                'ramp_rate': self.config.get('ramp_rate', 200) / len(shards),
+                'max_in_flight': max(1, self.config.get('max_in_flight', 100) // len(shards)),
+                'show_progress': False,
+                # Gốc thời gian chung để timeline của worker căn được với tiến trình điều phối
+                'run_started_at': self.run_started_at
+            })
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(target=shard_worker_main, args=(index, worker_config, child_conn), daemon=True)
+            process.start()
+            child_conn.close()
+            self.workers.append({'index': index, 'process': process, 'conn': parent_conn, 'connected': 0})
+        
+        # Thời gian chờ kết nối tỷ lệ với số client của worker lớn nhất
+        ready_timeout = 30 + max(size for _, size in shards) * 0.1
+        for worker in self.workers:
+            try:
+                message = await self.recv_from_worker(worker['conn'], ready_timeout)
+                worker['connected'] = message['connected']
+                self.handshake_times.extend(message['handshake_times'])
+                self.failed_handshakes += message['failed_handshakes']
+                self.worker_phases[worker['index']] = message['connection_phases']
+                print(f"  Worker {worker['index']}: {worker['connected']} client đã kết nối")
+            except Exception as e:
+                print(f"{Fore.RED}✗ Worker {worker['index']} lỗi khi kết nối client: {str(e)}{Style.RESET_ALL}")
+        
+        self.report_connected()
+    
+    async def grow_clients(self, count):
+        """Chia thêm count client cho các worker đang chạy, giữ nguyên các kết nối đã có"""
+        shards = self.split_client_count(count, len(self.workers))
+        self.assigned_clients += count
+        print(f"{Fore.YELLOW}⏳ Thêm {count} kết nối WebSocket trên {len(self.workers)} worker...{Style.RESET_ALL}")
+        
+        for worker, (offset, size) in zip(self.workers, shards):
+            worker['conn'].send({'cmd': 'grow', 'count': size, 'offset': offset})
+        
+        ready_timeout = 30 + max(size for _, size in shards) * 0.1
+        for worker in self.workers:
+            try:
+                message = await self.recv_from_worker(worker['conn'], ready_timeout)
+                worker['connected'] = message['connected']
+                self.handshake_times.extend(message['handshake_times'])
+                self.failed_handshakes += message['failed_handshakes']
+                self.worker_phases[worker['index']] = message['connection_phases']
+            except Exception as e:
+                print(f"{Fore.RED}✗ Worker {worker['index']} lỗi khi kết nối client: {str(e)}{Style.RESET_ALL}")
+        
+        self.report_connected()
+    
+    def get_connection_phases(self):
+        """Gộp histogram các giai đoạn kết nối của tất cả worker"""
+        recorder = ConnectionPhaseRecorder()
+        for phases in self.worker_phases.values():
+            recorder.merge(ConnectionPhaseRecorder.from_dict(phases))
+        return recorder
+    
+    def report_connected(self):
+        """Cập nhật và in tổng số client đã kết nối trên tất cả worker"""
+        self.connected_clients = sum(worker['connected'] for worker in self.workers)
+        
+        if self.connected_clients < self.assigned_clients:
+            print(f"{Fore.YELLOW}⚠ Chỉ có {self.connected_clients}/{self.assigned_clients} client kết nối được{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}✓ Tất cả {self.assigned_clients} client đã kết nối thành công!{Style.RESET_ALL}")
+    
+    async def send_gold_update(self):
+        """Báo các worker bắt đầu ghi nhận rồi mới gửi POST cập nhật"""
+        self.received_count = 0
+        
+        for worker in self.workers:
+            try:
+                worker['conn'].send({'cmd': 'arm', 'reset_harness': self.harness_window_reset})
+                await self.recv_from_worker(worker['conn'], 10)
+            except Exception as e:
+                print(f"{Fore.RED}✗ Worker {worker['index']} không sẵn sàng: {str(e)}{Style.RESET_ALL}")
+        self.harness_window_reset = False
+        
+        return await super().send_gold_update()
+    
+    async def wait_for_all_clients_to_receive(self):
+        """Thu thập histogram độ trễ của các worker và gộp lại"""
+        timeout = 10
+        self.worker_harness = []
+        propagation_times = [self.propagation_times]
+        
+        for worker in self.workers:
+            try:
+                worker['conn'].send({'cmd': 'collect', 'sent_at': self.update_sent_time})
+                message = await self.recv_from_worker(worker['conn'], timeout + 5)
+                self.latency_histogram.merge(LatencyHistogram.from_dict(message['histogram']))
+                propagation_times.append(message['propagation_times'])
+                self.worker_harness.append(message['harness'])
+            except Exception as e:
+                print(f"{Fore.RED}✗ Không nhận được kết quả từ worker {worker['index']}: {str(e)}{Style.RESET_ALL}")
+        
+        self.propagation_times = np.concatenate(propagation_times)
+        self.received_count = self.latency_histogram.count
+        
+        if self.received_count == self.connected_clients:
+            print(f"{Fore.GREEN}✓ Tất cả {self.connected_clients} client đã nhận được cập nhật!{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.YELLOW}⚠ Chỉ có {self.received_count}/{self.connected_clients} client nhận được cập nhật sau {timeout}s{Style.RESET_ALL}")
+    
+    def get_received_count(self):
+        """Số client nhận được cập nhật, gộp từ tất cả worker"""
+        return self.received_count
+    
+    async def disconnect_clients(self):
+        """Yêu cầu các worker ngắt kết nối và dừng tiến trình"""
+        for worker in self.workers:
+            try:
+                worker['conn'].send({'cmd': 'stop'})
+            except Exception:
+                pass
+        
+        for worker in self.workers:
+            await asyncio.get_running_loop().run_in_executor(None, worker['process'].join, 30)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+            worker['conn'].close()
+
+
+async def run_shard_worker(index, config, conn):
+    """Vòng đời của một worker: kết nối client, ghi nhận thời điểm nhận dữ liệu theo lệnh điều phối"""
+    analyzer = WSLatencyAnalyzer(config)
+    loop = asyncio.get_running_loop()
+    
+    # Mỗi worker tự đo độ trễ event loop và CPU của mình, gửi về cùng kết quả
+    analyzer.run_started_at = config.get('run_started_at') or time.perf_counter()
+    analyzer.begin_harness_monitor()
+    analyzer.harness_monitor.label = f'worker-{index}'
+    
+    await analyzer.create_clients()
+    conn.send({
+        'connected': analyzer.connected_clients,
+        'handshake_times': analyzer.handshake_times,
+        'failed_handshakes': analyzer.failed_handshakes,
+        'connection_phases': analyzer.connection_phases.to_dict()
+    })
+    
+    while True:
+        message = await loop.run_in_executor(None, conn.recv)
+        
+        if message['cmd'] == 'arm':
+            # Chỉ ghi nhận dữ liệu đến sau thời điểm này; độ trễ do tiến trình điều phối tính
+            # (perf_counter dùng đồng hồ đơn điệu chung của hệ thống nên so sánh được giữa các tiến trình)
+            analyzer.client_table.reset_receives()
+            analyzer.receive_counter.reset(analyzer.connected_clients)
+            analyzer.update_sent_time = time.perf_counter()
+            if message.get('reset_harness'):
+                analyzer.reset_harness_window()
+            conn.send({'armed': True})
+        elif message['cmd'] == 'collect':
+            await analyzer.wait_for_all_clients_to_receive()
+            # Tính lại độ trễ theo thời điểm gửi POST của tiến trình điều phối
+            propagation_times = analyzer.client_table.latencies_ms(message['sent_at'])
+            histogram = LatencyHistogram()
+            histogram.record_many(propagation_times)
+            conn.send({'histogram': histogram.to_dict(), 'propagation_times': propagation_times,
+                       'harness': analyzer.harness_monitor.to_dict()})
+        elif message['cmd'] == 'grow':
+            # Chế độ sweep: thêm client, chỉ gửi về thời gian handshake của các client mới
+            handshakes_before = len(analyzer.handshake_times)
+            failed_before = analyzer.failed_handshakes
+            await analyzer.create_clients(message['count'], message['offset'])
+            conn.send({
+                'connected': analyzer.connected_clients,
+                'handshake_times': analyzer.handshake_times[handshakes_before:],
+                'failed_handshakes': analyzer.failed_handshakes - failed_before,
+                'connection_phases': analyzer.connection_phases.to_dict()
+            })
+        elif message['cmd'] == 'stop':
+            break
+    
+    await analyzer.stop_harness_monitor()
+    await analyzer.disconnect_clients()
+
+
+def shard_worker_main(index, config, conn):
+    """Điểm vào của tiến trình worker"""
+    try:
+        asyncio.run(run_shard_worker(index, config, conn))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+def create_analyzer(config):
+    """Analyzer một tiến trình hoặc chia client cho nhiều worker, theo config['workers']"""
+    if config.get('workers', 1) > 1:
+        return ShardedWSLatencyAnalyzer(config)
+    return WSLatencyAnalyzer(config)
+
+
+def check_host_limits(config, client_count):
+    """Kiểm tra giới hạn fd / cổng tạm của máy harness cho client_count kết nối (nâng RLIMIT_NOFILE nếu cần) và in kết quả"""
+    limits = check_client_limits(client_count, config['server_url'], config.get('source_addresses'),
+                                 config.get('workers', 1))
+    config['source_addresses'] = limits['source_addresses']
+    config['host_limits'] = limits
+    
+    print(f"{Fore.YELLOW}🖥️  Giới hạn máy harness ({client_count:,} client):{Style.RESET_ALL}")
+    for line in format_host_limits(limits):
+        print(f"  {line}")
+    for problem in limits['problems']:
+        print(f"{Fore.YELLOW}⚠ {problem}{Style.RESET_ALL}")
+    return limits
 
 
 async def main():
     parser = argparse.ArgumentParser(description='Đo lường độ trễ từ API đến WebSocket')
     
+    parser.add_argument('--mode', choices=['single', 'capacity', 'sweep'], default='single',
+                      help='single: đo một lần với --clients; capacity: tìm số client lớn nhất đạt SLO; '
+                           'sweep: một lần chạy tăng dần số client theo --plateaus (mặc định: single)')
+    
     parser.add_argument('--server', type=str, default='http://localhost:3010',
                       help='URL máy chủ (mặc định: http://localhost:3010)')
     
@@ -425,17 +1028,109 @@ async def main():
     parser.add_argument('--verbose', action='store_true',
                       help='Hiển thị log chi tiết cho từng client')
     
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Số tiến trình worker chia nhau các client (mặc định: 1)')
+    
+    parser.add_argument('--transport', choices=['socketio', 'raw'], default='socketio',
+                      help='socketio: python-socketio AsyncClient; raw: client Socket.IO tối giản trên WebSocket thuần (mặc định: socketio)')
+    
+    parser.add_argument('--ramp-rate', type=float, default=200,
+                      help='Tốc độ mở kết nối, kết nối/giây; 0 = không giới hạn (mặc định: 200)')
+    
+    parser.add_argument('--max-inflight', type=int, default=100,
+                      help='Số handshake đồng thời tối đa khi ramp (mặc định: 100)')
+    
+    parser.add_argument('--source-addrs', type=str, default=None,
+                      help='Các địa chỉ nguồn dùng lần lượt cho kết nối client, ví dụ 127.0.0.2-127.0.0.20 hoặc 10.0.0.5,10.0.0.6; '
+                           'mỗi địa chỉ có dải cổng tạm riêng (mặc định: địa chỉ do hệ điều hành chọn)')
+    
+    parser.add_argument('--server-pid', type=int, action='append', default=None,
+                      help='PID của server cần lấy mẫu tài nguyên, có thể lặp lại (mặc định: tự tìm tiến trình lắng nghe trên cổng của --server)')
+    
+    parser.add_argument('--sample-interval', type=float, default=0.5,
+                      help='Chu kỳ lấy mẫu tài nguyên server, tính bằng giây; 0 = tắt (mặc định: 0.5)')
+    
+    parser.add_argument('--server-impl', type=str, default='nodejs',
+                      help='Tên bản cài đặt server để ghi vào danh mục lần chạy, ví dụ nodejs hoặc golang (mặc định: nodejs)')
+    
+    parser.add_argument('--max-loop-lag', type=float, default=50.0,
+                      help='P99 độ trễ event loop tối đa của harness (ms); vượt ngưỡng thì lần đo bị đánh dấu không hợp lệ (mặc định: 50)')
+    
+    parser.add_argument('--max-harness-cpu', type=float, default=90.0,
+                      help='CPU tối đa của một tiến trình harness (%%); vượt ngưỡng thì lần đo bị đánh dấu không hợp lệ (mặc định: 90)')
+    
+    parser.add_argument('--reject-saturated', action='store_true',
+                      help='Không ghi lần đo có harness quá tải vào danh mục lần chạy')
+    
+    parser.add_argument('--slo-p99', type=float, default=200.0,
+                      help='Chế độ capacity: P99 độ trễ lan truyền tối đa, ms (mặc định: 200)')
+    
+    parser.add_argument('--slo-delivery', type=float, default=0.999,
+                      help='Chế độ capacity: tỷ lệ client nhận được cập nhật tối thiểu, 0-1 (mặc định: 0.999)')
+    
+    parser.add_argument('--min-clients', type=int, default=100,
+                      help='Chế độ capacity: số client của lần thử đầu tiên (mặc định: 100)')
+    
+    parser.add_argument('--max-clients', type=int, default=100000,
+                      help='Chế độ capacity: số client tối đa được thử (mặc định: 100000)')
+    
+    parser.add_argument('--growth', type=float, default=2.0,
+                      help='Chế độ capacity: hệ số tăng số client trước khi vi phạm SLO (mặc định: 2.0)')
+    
+    parser.add_argument('--resolution', type=int, default=100,
+                      help='Chế độ capacity: dừng tìm nhị phân khi khoảng còn nhỏ hơn số client này (mặc định: 100)')
+    
+    parser.add_argument('--settle', type=float, default=5.0,
+                      help='Chế độ capacity: thời gian chờ giữa hai lần thử, giây (mặc định: 5.0)')
+    
+    parser.add_argument('--plateaus', type=str, default='100,500,1000,5000,10000',
+                      help='Chế độ sweep: các mức số client tăng dần, cách nhau bởi dấu phẩy (mặc định: 100,500,1000,5000,10000)')
+    
+    parser.add_argument('--updates-per-plateau', type=int, default=5,
+                      help='Chế độ sweep: số cập nhật được gửi ở mỗi mức (mặc định: 5)')
+    
+    parser.add_argument('--update-interval', type=float, default=2.0,
+                      help='Chế độ sweep: thời gian giữa hai cập nhật trong một mức, giây (mặc định: 2.0)')
+    
     args = parser.parse_args()
     
     config = {
         'server_url': args.server,
         'api_endpoint': args.api,
         'client_count': args.clients,
-        'verbose': args.verbose
+        'verbose': args.verbose,
+        'workers': args.workers,
+        'transport': args.transport,
+        'ramp_rate': args.ramp_rate,
+        'max_in_flight': args.max_inflight,
+        'server_pids': args.server_pid,
+        'sample_interval': args.sample_interval,
+        'server_impl': args.server_impl,
+        'max_loop_lag_ms': args.max_loop_lag,
+        'max_harness_cpu': args.max_harness_cpu,
+        'reject_saturated': args.reject_saturated,
+        'source_addresses': parse_source_addresses(args.source_addrs)
     }
     
-    analyzer = WSLatencyAnalyzer(config)
-    results = await analyzer.run_test()
+    plateaus = sorted({int(p) for p in args.plateaus.split(',') if p.strip()})
+    # Kiểm tra với số client lớn nhất của lần chạy trước khi mở kết nối
+    check_host_limits(config, args.max_clients if args.mode == 'capacity'
+                      else plateaus[-1] if args.mode == 'sweep' else args.clients)
+    
+    if args.mode == 'capacity':
+        search = CapacitySearch(config, create_analyzer, args.slo_p99, args.slo_delivery, args.min_clients,
+                                args.max_clients, args.growth, args.resolution, args.settle)
+        result = await search.run()
+        search.print_summary(result)
+        json_path, chart_path = search.save_results(result)
+        results = {'chart_path': chart_path, 'json_path': json_path}
+    elif args.mode == 'sweep':
+        config['client_count'] = plateaus[0]
+        analyzer = create_analyzer(config)
+        results = await analyzer.run_sweep(plateaus, args.updates_per_plateau, args.update_interval)
+    else:
+        analyzer = create_analyzer(config)
+        results = await analyzer.run_test()
     
     # Mở biểu đồ (trong môi trường đồ họa)
     if results and results['chart_path']:
@@ -11,95 +11,144 @@ Công cụ đo hiệu suất WebSocket cho ứng dụng Gold Price Tracker
 import asyncio
 import time
 import json
-import requests
-import socketio
+import aiohttp
 import argparse
-import psutil
 import os
-import statistics
+import re
 from datetime import datetime
 from colorama import Fore, Style, init
 from tqdm import tqdm
 
+from ws_ramp import RampScheduler, summarize_handshakes
+from ws_receive_counter import ReceiveCounter
+from http_publisher import GoldPricePublisher, summarize_publish
+from update_generator import OpenLoopUpdateGenerator, ARRIVAL_MODES
+from latency_histogram import LatencyHistogram
+from server_resource_sampler import start_server_sampler
+from ndjson_writer import NDJSONResultWriter, iter_records
+from run_catalog import RunCatalog
+from harness_monitor import HarnessMonitor, evaluate_harness
+from connection_phases import ConnectionPhaseRecorder, PHASES, PHASE_LABELS, create_trace_config
+from ws_churn import ChurnScheduler
+from ws_raw_client import PlainWebSocketClient, RawSocketIOClient, build_plain_ws_url, build_ws_url
+from slow_consumer import SlowReadProfile, pick_slow_clients
+from client_table import ClientTable, IndexedAsyncClient
+from host_limits import (FD_MARGIN, check_client_limits, describe_connect_error, format_host_limits,
+                         parse_source_addresses, raise_nofile_limit)
+
 # Khởi tạo colorama
 init(autoreset=True)
 
 # Cấu hình mặc định
 CONFIG = {
     'server_url': 'http://localhost:3010',
+    'protocol': 'socketio',  # socketio (server Node.js) hoặc ws (WebSocket thuần ở ws_path, server Go)
+    'ws_path': '/ws',
     'api_endpoint': '/api/add',
     'num_clients': 100,
     'test_duration': 30,  # Giây
     'update_interval': 5,  # Giây
-    'result_file': 'ws_performance_results.json'
+    'update_rate': None,  # Cập nhật/giây, None = 1 / update_interval
+    'arrival': 'constant',  # constant hoặc poisson
+    'ramp_rate': 200,  # Kết nối/giây
+    'max_in_flight': 100,  # Số handshake đồng thời
+    'server_pids': None,  # PID của server cần lấy mẫu tài nguyên, None = tự tìm theo cổng
+    'sample_interval': 1.0,  # Giây, 0 = tắt lấy mẫu tài nguyên server
+    'result_file': None,  # None = file mới trong results_dir cho mỗi lần chạy (xem default_result_file)
+    'stream_file': None,  # File NDJSON ghi luồng kết quả, None = cùng tên với result_file, đuôi .ndjson
+    'server_impl': 'nodejs',  # Ghi vào danh mục lần chạy (results/runs.sqlite)
+    'results_dir': 'results',
+    'rate_steps': None,  # Các mức tốc độ cập nhật (cập nhật/giây) của chế độ tìm tốc độ tối đa, None = tắt
+    'step_duration': 20,  # Giây gửi cập nhật ở mỗi mức tốc độ
+    'max_drop_rate': 0.001,  # Tỷ lệ lượt nhận bị mất tối đa để một mức còn được coi là chịu được
+    'min_throughput_ratio': 0.95,  # Thông lượng nhận thực tế / thông lượng đưa vào tối thiểu
+    'slo_p99': None,  # P99 độ trễ tối đa (ms) của một mức, None = không xét
+    'max_loop_lag_ms': 50.0,  # P99 độ trễ event loop tối đa của harness, vượt thì lần chạy không hợp lệ
+    'max_harness_cpu': 90.0,  # CPU tối đa của tiến trình harness (%)
+    'reject_saturated': False,  # Không ghi lần chạy có harness quá tải vào danh mục
+    'churn_rate': 0.0,  # Phần trăm client bị ngắt rồi kết nối lại mỗi giây trong lúc gửi cập nhật, 0 = tắt
+    'slow_ratio': 0.0,  # Tỷ lệ client đọc chậm trong tổng số client, 0 = tắt
+    'slow_read_rate': None,  # Tốc độ đọc tối đa của client chậm (byte/giây), None = không giới hạn
+    'slow_stall_every': None,  # Client chậm ngừng đọc mỗi bao nhiêu giây, None = không dừng
+    'slow_stall_for': 0.0,  # Thời gian mỗi lần ngừng đọc (giây)
+    'goroutine_url': None,  # URL pprof goroutine của server Go, None = không lấy mẫu số goroutine
+    'source_addresses': None  # Các địa chỉ nguồn dùng lần lượt cho kết nối client, None = do hệ điều hành chọn
 }
 
+# Mỗi cập nhật mang số thứ tự trong trường name của loại vàng được cập nhật: "<tên> #<run_tag>:<seq>"
+UPDATE_GOLD_TYPE = 'gold_1'
+RUN_TAG = datetime.now().strftime('%Y%m%d%H%M%S')
+SEQ_MARKER = f'#{RUN_TAG}:'
+# Tìm seq trong frame chưa giải mã của client đọc chậm
+SEQ_PATTERN = re.compile(re.escape(SEQ_MARKER) + r'(\d+)')
+
 # Biến toàn cục
 clients = []
-client_receive_times = []
+# Trạng thái của client theo cột, hàng client_id: kết nối, seq và thời điểm nhận của cập nhật gần nhất, số lần nhận
+client_table = ClientTable()
 connected_clients = 0
 disconnected_clients = 0
 test_running = True
-update_start_time = None
 received_updates = 0
-propagation_times = []
-client_receive_statuses = []
+# seq -> thông tin và histogram độ trễ của các cập nhật chưa nhận đủ;
+# cập nhật đã nhận đủ được ghi ra luồng kết quả rồi bỏ khỏi bộ nhớ (finalize_update)
+updates = {}
+updates_sent = 0
+# seq lớn nhất đã đăng ký: client kết nối (lại) sau đó không được tính vào expected của các cập nhật đến seq này
+last_registered_seq = -1
+receives_expected = 0
+# Một aiohttp session cho mỗi địa chỉ nguồn, client i dùng session i % số session
+http_sessions = []
+# Giới hạn fd / cổng tạm của máy harness đo được trước khi mở kết nối
+host_limits = None
+handshake_times = []
+failed_handshakes = 0
+# Histogram thời gian từng giai đoạn mở kết nối của các client
+connection_phases = ConnectionPhaseRecorder()
+# Chế độ churn: bộ điều phối churn và các giai đoạn kết nối của những lần kết nối lại
+churn = None
+churn_phases = ConnectionPhaseRecorder()
+# Client đọc chậm: chỉ số client và histogram độ trễ tách riêng cho client khỏe / client chậm
+slow_client_ids = set()
+healthy_histogram = LatencyHistogram()
+slow_histogram = LatencyHistogram()
+receive_counter = ReceiveCounter()
+publisher = None
+server_sampler = None
+# Độ trễ event loop và CPU của chính harness
+harness_monitor = None
+# Luồng kết quả NDJSON, báo cáo cuối cùng được dựng lại từ luồng này
+result_stream = None
+# Gốc thời gian (perf_counter) của lần chạy, dùng chung cho timeline cập nhật và mẫu tài nguyên server
+run_started_at = None
+# Chế độ tìm tốc độ tối đa: số liệu gộp của từng mức tốc độ và chỉ số của mức đang gửi
+rate_steps = []
+current_step = None
 
 class WSClient:
-    """Lớp đại diện cho một kết nối WebSocket client"""
+    """Lớp đại diện cho một kết nối WebSocket client (asyncio, không tạo thread riêng)"""
     
-    def __init__(self, client_id, server_url):
+    # Dùng __slots__ để giữ bộ nhớ mỗi client cố định khi chạy hàng chục nghìn client;
+    # trạng thái kết nối và nhận dữ liệu nằm ở hàng client_id của client_table
+    __slots__ = ('client_id', 'sio', 'server_url', 'timeline')
+    
+    def __init__(self, client_id, server_url, http_session=None):
         self.client_id = client_id
-        self.sio = socketio.Client()
+        # Tất cả client dùng chung một aiohttp session nên không phát sinh thread hay connector riêng;
+        # mọi sự kiện đi vào handler dùng chung on_client_event kèm client_id
+        self.sio = IndexedAsyncClient(client_id, on_client_event, http_session=http_session)
         self.server_url = server_url
-        self.connected = False
-        self.received_updates = 0
-        self.last_update_time = None
-        self.connect_time = None
-        self.response_times = []
-        self.setup_handlers()
-    
-    def setup_handlers(self):
-        """Thiết lập các event handler cho client"""
-        
-        @self.sio.event
-        def connect():
-            global connected_clients
-            self.connected = True
-            self.connect_time = time.time()
-            connected_clients += 1
-            if CONFIG.get('verbose'):
-                print(f"{Fore.GREEN}✓ Client {self.client_id} đã kết nối{Style.RESET_ALL}")
-        
-        @self.sio.event
-        def disconnect():
-            global disconnected_clients
-            self.connected = False
-            disconnected_clients += 1
-            if CONFIG.get('verbose'):
-                print(f"{Fore.RED}✗ Client {self.client_id} đã ngắt kết nối{Style.RESET_ALL}")
-        
-        @self.sio.on('gold-prices-updated')
-        def on_gold_prices_updated(data):
-            global received_updates, update_start_time, client_receive_statuses
-            
-            receive_time = time.time()
-            self.received_updates += 1
-            received_updates += 1
-            
-            # Nếu đây là cập nhật đầu tiên sau khi gửi POST request
-            if update_start_time and client_receive_statuses[self.client_id] is None:
-                propagation_time = (receive_time - update_start_time) * 1000  # chuyển đổi thành ms
-                propagation_times.append(propagation_time)
-                client_receive_statuses[self.client_id] = propagation_time
-                
-                if CONFIG.get('verbose'):
-                    print(f"{Fore.CYAN}→ Client {self.client_id} nhận được cập nhật sau {propagation_time:.2f}ms{Style.RESET_ALL}")
-    
-    def connect(self):
+        self.timeline = connection_phases.timeline()
+    
+    @property
+    def connected(self):
+        return bool(client_table.connected[self.client_id])
+    
+    async def connect(self):
         """Kết nối đến server"""
         try:
-            self.sio.connect(
+            self.timeline.begin()
+            await self.sio.connect(
                 self.server_url,
                 transports=['websocket'],
                 socketio_path='/socket.io',
@@ -108,37 +157,177 @@ class WSClient:
             )
             return True
         except Exception as e:
-            print(f"{Fore.RED}✗ Lỗi khi kết nối client {self.client_id}: {str(e)}{Style.RESET_ALL}")
+            report_connect_error(self.client_id, e)
             return False
     
-    def disconnect(self):
-        """Ngắt kết nối"""
-        if self.connected:
+    async def disconnect(self):
+        """Ngắt kết nối (theo trạng thái của kết nối, client churn đã được đánh dấu ngắt trong client_table trước đó)"""
+        if self.sio.connected:
             try:
-                self.sio.disconnect()
-            except:
+                await self.sio.disconnect()
+            except Exception:
                 pass
 
 
+class RawWSClient:
+    """
+    Client dùng kết nối tối giản của ws_raw_client, cùng giao diện với WSClient (connect, disconnect, connected, timeline).
+    Dùng cho client đọc chậm (giới hạn tốc độ đọc hoặc ngừng đọc định kỳ theo SlowReadProfile, cần kiểm soát
+    được lúc đọc socket) và cho mọi client khi server chỉ có WebSocket thuần (--protocol ws).
+    """
+    
+    __slots__ = ('client_id', 'raw')
+    
+    def __init__(self, client_id, server_url, http_session, read_profile=None):
+        self.client_id = client_id
+        if CONFIG.get('protocol') == 'ws':
+            client_class, ws_url = PlainWebSocketClient, build_plain_ws_url(server_url, CONFIG['ws_path'])
+        else:
+            client_class, ws_url = RawSocketIOClient, build_ws_url(server_url)
+        self.raw = client_class(ws_url, http_session, on_update=on_raw_client_update,
+                                on_disconnect=on_client_disconnect, index=client_id,
+                                timeline=connection_phases.timeline(), read_profile=read_profile)
+    
+    @property
+    def connected(self):
+        return bool(client_table.connected[self.client_id])
+    
+    @property
+    def timeline(self):
+        return self.raw.timeline
+    
+    @timeline.setter
+    def timeline(self, timeline):
+        self.raw.timeline = timeline
+    
+    async def connect(self):
+        """Kết nối đến server"""
+        try:
+            await self.raw.connect(wait_timeout=10)
+        except Exception as e:
+            report_connect_error(self.client_id, e)
+            return False
+        on_client_connect(self.client_id)
+        return True
+    
+    async def disconnect(self):
+        """Ngắt kết nối (raw.disconnect tự bỏ qua nếu WebSocket chưa mở hoặc đã đóng)"""
+        try:
+            await self.raw.disconnect()
+        except Exception:
+            pass
+
+
+# Handler dùng chung cho mọi client, nhận client_id thay vì đối tượng client
+
+def on_client_event(event, client_id, *args):
+    """Sự kiện của client socketio (IndexedAsyncClient)"""
+    if event == 'gold-prices-updated':
+        handle_client_update(client_id, extract_update_seq(args[0] if args else None), time.perf_counter())
+    elif event == 'eio_open':
+        clients[client_id].timeline.mark('eio_open')
+    elif event == 'connect':
+        on_client_connect(client_id)
+    elif event == 'disconnect':
+        on_client_disconnect(client_id)
+
+
+def on_client_connect(client_id):
+    global connected_clients
+    clients[client_id].timeline.mark('sio_connect')
+    client_table.mark_connected(client_id, time.perf_counter())
+    # Các cập nhật đã gửi trước lúc kết nối không tính client này: coi như đã xử lý xong
+    client_table.last_seq[client_id] = max(client_table.last_seq[client_id], last_registered_seq)
+    connected_clients += 1
+    if CONFIG.get('verbose'):
+        print(f"{Fore.GREEN}✓ Client {client_id} đã kết nối{Style.RESET_ALL}")
+
+
+def on_client_disconnect(client_id):
+    global connected_clients, disconnected_clients
+    if not client_table.mark_disconnected(client_id):
+        return
+    # Số lượt nhận mong đợi của mỗi cập nhật tính theo số client đang kết nối khi gửi
+    connected_clients -= 1
+    disconnected_clients += 1
+    if CONFIG.get('verbose'):
+        print(f"{Fore.RED}✗ Client {client_id} đã ngắt kết nối{Style.RESET_ALL}")
+
+
+def on_raw_client_update(client_id, receive_time, packet):
+    # RawWSClient nhận frame chưa giải mã, tìm seq trực tiếp trong chuỗi
+    match = SEQ_PATTERN.search(packet)
+    handle_client_update(client_id, int(match.group(1)) if match else None, receive_time)
+
+
+def handle_client_update(client_id, seq, receive_time):
+    """Xử lý một lần client nhận gold-prices-updated mang cập nhật số seq"""
+    global received_updates
+    
+    # Snapshot goldPricesCache server gửi khi vừa kết nối chỉ được tính vào giai đoạn first_snapshot
+    update = updates.get(seq)
+    if clients[client_id].timeline.is_snapshot(receive_time, update['sent_at'] if update is not None else None):
+        return
+    client_table.receive_count[client_id] += 1
+    received_updates += 1
+    
+    record_receive(client_id, seq, receive_time)
+
+
+def report_connect_error(client_id, error):
+    hint = describe_connect_error(error)
+    print(f"{Fore.RED}✗ Lỗi khi kết nối client {client_id}: {str(error)}{f' ({hint})' if hint else ''}{Style.RESET_ALL}")
+
+
+def create_http_session(local_addr=None):
+    """Tạo aiohttp session dùng chung cho các client WebSocket; local_addr là địa chỉ nguồn của các kết nối (tùy chọn)"""
+    # limit=0: không giới hạn số kết nối đồng thời (mặc định aiohttp chỉ cho 100)
+    connector = aiohttp.TCPConnector(limit=0, force_close=False, local_addr=(local_addr, 0) if local_addr else None)
+    # TraceConfig ghi thời gian kết nối TCP và nâng cấp WebSocket của từng client
+    return aiohttp.ClientSession(connector=connector, trace_configs=[create_trace_config()])
+
+
+def check_host_limits():
+    """Kiểm tra giới hạn fd / cổng tạm của máy harness cho số client cấu hình, nâng RLIMIT_NOFILE nếu cần"""
+    global host_limits
+    host_limits = check_client_limits(CONFIG['num_clients'], CONFIG['server_url'], CONFIG.get('source_addresses'))
+    CONFIG['source_addresses'] = host_limits['source_addresses']
+
+
 async def create_clients(num_clients, server_url):
     """Tạo và kết nối các client"""
-    global clients, client_receive_statuses
+    global clients, client_table, http_sessions, handshake_times, failed_handshakes, slow_client_ids
     
     print(f"{Fore.YELLOW}⏳ Đang khởi tạo {num_clients} client...{Style.RESET_ALL}")
     progress_bar = tqdm(total=num_clients, desc="Kết nối client", unit="client")
     
-    client_receive_statuses = [None] * num_clients
+    # Mỗi kết nối tốn một fd
+    raise_nofile_limit(num_clients + FD_MARGIN)
+    # Các địa chỉ nguồn được dùng lần lượt (round-robin), mỗi địa chỉ có dải cổng tạm riêng
+    http_sessions = [create_http_session(address) for address in CONFIG.get('source_addresses') or [None]]
     
+    # Tạo trước toàn bộ client để client_id trùng với vị trí trong clients và hàng trong client_table
+    client_table = ClientTable(num_clients)
     for i in range(num_clients):
-        client = WSClient(i, server_url)
-        clients.append(client)
-        
-        # Thử kết nối
-        if client.connect():
+        client_table.add(i)
+    slow_client_ids = pick_slow_clients(num_clients, CONFIG.get('slow_ratio') or 0.0)
+    read_profile = SlowReadProfile(CONFIG.get('slow_read_rate'), CONFIG.get('slow_stall_every'), CONFIG.get('slow_stall_for') or 0.0)
+    clients = [RawWSClient(i, server_url, http_sessions[i % len(http_sessions)], read_profile.copy()) if i in slow_client_ids
+               else RawWSClient(i, server_url, http_sessions[i % len(http_sessions)]) if CONFIG.get('protocol') == 'ws'
+               else WSClient(i, server_url, http_sessions[i % len(http_sessions)]) for i in range(num_clients)]
+    
+    async def connect_client(i):
+        return await clients[i].connect()
+    
+    def on_handshake_done(i, ok, handshake_ms):
+        if ok:
             progress_bar.update(1)
-        
-        # Chờ một chút giữa các kết nối để tránh quá tải
-        await asyncio.sleep(0.05)
+    
+    # Mở kết nối theo tốc độ ramp và giới hạn số handshake đồng thời
+    ramp = RampScheduler(CONFIG['ramp_rate'], CONFIG['max_in_flight'])
+    await ramp.run(num_clients, connect_client, on_done=on_handshake_done)
+    handshake_times = ramp.handshake_times
+    failed_handshakes = ramp.failed
     
     progress_bar.close()
     
@@ -158,26 +347,167 @@ async def create_clients(num_clients, server_url):
         print(f"{Fore.GREEN}✓ Tất cả {num_clients} client đã kết nối thành công!{Style.RESET_ALL}")
 
 
-def send_gold_update():
-    """Gửi yêu cầu cập nhật giá vàng"""
-    global update_start_time, client_receive_statuses
+def extract_update_seq(data):
+    """Lấy số thứ tự cập nhật từ trường name của loại vàng được cập nhật trong payload"""
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        if isinstance(item, dict) and item.get('type') == UPDATE_GOLD_TYPE:
+            name = item.get('name') or ''
+            pos = name.rfind(SEQ_MARKER)
+            if pos < 0:
+                return None
+            try:
+                return int(name[pos + len(SEQ_MARKER):])
+            except ValueError:
+                return None
+    return None
+
+
+def record_receive(client_id, seq, receive_time):
+    """Ghi nhận (seq, thời điểm nhận) của client và độ trễ của cập nhật tương ứng"""
+    update = updates.get(seq)
+    if update is None:
+        # Snapshot gửi khi kết nối hoặc cập nhật không do bài kiểm tra này gửi
+        return
+    
+    # Mỗi client chỉ tính một lần cho mỗi cập nhật, bỏ qua payload cũ hơn cái đã nhận
+    if client_table.last_seq[client_id] >= seq:
+        return
+    
+    client_table.last_seq[client_id] = seq
+    client_table.receive_time[client_id] = receive_time
+    update['last_receive_at'] = receive_time
+    propagation_time = (receive_time - update['sent_at']) * 1000  # chuyển đổi thành ms
+    update['histogram'].record(propagation_time)
+    if client_id in slow_client_ids:
+        update['received_slow'] += 1
+        slow_histogram.record(propagation_time)
+    else:
+        healthy_histogram.record(propagation_time)
+    receive_counter.increment()
+    result_stream.write({'type': 'receive', 'seq': seq, 'client': client_id, 'latency_ms': propagation_time})
+    
+    if update['ok'] and update['histogram'].count >= update['expected']:
+        finalize_update(seq)
+    
+    if CONFIG.get('verbose'):
+        print(f"{Fore.CYAN}→ Client {client_id} nhận được cập nhật #{seq} sau {propagation_time:.2f}ms{Style.RESET_ALL}")
+
+
+def forget_pending_updates(client_id):
+    """Client sắp bị ngắt (churn): bỏ nó khỏi số lượt nhận mong đợi của các cập nhật nó chưa nhận"""
+    global receives_expected
+    # Client chưa từng kết nối hoặc đã bị server ngắt không nằm trong expected của cập nhật nào đang chờ
+    if not client_table.connected[client_id]:
+        return
+    last_seq = client_table.last_seq[client_id]
+    for seq in list(updates):
+        if last_seq >= seq:
+            continue
+        update = updates[seq]
+        update['expected'] -= 1
+        if client_id in slow_client_ids:
+            update['expected_slow'] -= 1
+        receives_expected -= 1
+        if update['ok'] and update['histogram'].count >= update['expected']:
+            finalize_update(seq)
+    # Frame đang trên đường đến (nhận trong lúc chờ ngắt) của các cập nhật đã bỏ không được tính nữa
+    client_table.last_seq[client_id] = max(last_seq, last_registered_seq)
+
+
+async def churn_disconnect(client_id):
+    forget_pending_updates(client_id)
+    # Coi như đã ngắt ngay: cập nhật gửi trong lúc chờ ngắt không tính client này vào expected
+    on_client_disconnect(client_id)
+    await clients[client_id].disconnect()
+
+
+async def churn_connect(client_id):
+    """Kết nối lại client; các giai đoạn kết nối được ghi riêng vào churn_phases"""
+    client = clients[client_id]
+    client.timeline = churn_phases.timeline()
+    return await client.connect()
+
+
+def summarize_latencies(histogram):
+    """Thống kê cơ bản (ms) của một histogram độ trễ"""
+    if histogram.count == 0:
+        return {}
+    return {
+        'avg_time': histogram.mean(),
+        'min_time': histogram.min,
+        'median_time': histogram.percentile(50),
+        'p95_time': histogram.percentile(95),
+        'p99_time': histogram.percentile(99),
+        'max_time': histogram.max
+    }
+
+
+def finalize_update(seq):
+    """Ghi thống kê của cập nhật ra luồng kết quả rồi bỏ nó (và histogram của nó) khỏi bộ nhớ"""
+    update = updates.pop(seq, None)
+    if update is None:
+        return
+    
+    histogram = update['histogram']
     
-    # Reset trạng thái nhận cho mỗi client
-    client_receive_statuses = [None] * len(clients)
+    # Gộp vào số liệu của mức tốc độ mà cập nhật thuộc về
+    if update['step'] is not None:
+        step = rate_steps[update['step']]
+        step['histogram'].merge(histogram)
+        step['expected'] += update['expected']
+        step['received'] += histogram.count
+        if update['last_receive_at'] is not None:
+            step['last_receive_at'] = max(step['last_receive_at'] or 0.0, update['last_receive_at'])
+    
+    result_stream.write(dict({
+        'type': 'update',
+        'seq': seq,
+        'step': update['step'],
+        'timestamp': update['timestamp'],
+        'offset_s': update['sent_at'] - run_started_at,
+        'ok': update['ok'],
+        'expected': update['expected'],
+        'received': histogram.count,
+        'expected_slow': update['expected_slow'],
+        'received_slow': update['received_slow'],
+        'lost': max(0, update['expected'] - histogram.count),
+        'publish': update['publish'],
+        'histogram': histogram.to_dict()
+    }, **summarize_latencies(histogram)))
+
+
+def mark_update_failed(update):
+    """Cập nhật gửi lỗi: không client nào phải nhận nữa"""
+    global receives_expected
+    # Các lượt đã nhận trước khi biết gửi lỗi vẫn được giữ để số nhận không vượt số mong đợi
+    received = update['histogram'].count
+    receives_expected -= update['expected'] - received
+    update['expected'] = received
+    update['expected_slow'] = update['received_slow']
+    finalize_update(update['seq'])
+
+
+async def send_gold_update(seq=None, intended_time=None):
+    """Gửi cập nhật giá vàng số seq, độ trễ tính từ intended_time nếu có (thời điểm gửi dự kiến)"""
+    global publisher, updates_sent, last_registered_seq, receives_expected
+    
+    if seq is None:
+        seq = updates_sent
     
     # Tạo dữ liệu cập nhật - ví dụ giá vàng
     base_price = 7500000  # Giá cơ bản
     variation = 50000     # Dao động
     
     # Tạo một đối tượng duy nhất thay vì mảng
-    gold_type = 'gold_1'  # Chỉ cập nhật một loại vàng cho đơn giản
+    gold_type = UPDATE_GOLD_TYPE  # Chỉ cập nhật một loại vàng cho đơn giản
     buy_variation = int(variation * (2 * (time.time() % 1) - 1))
     sell_variation = int(variation * (2 * ((time.time() + 0.5) % 1) - 1))
     
     # Tạo đối tượng duy nhất với tất cả trường bắt buộc
     gold_data = {
         'type': gold_type,
-        'name': 'VÀNG MIẾNG SJC 1L',
+        'name': f'VÀNG MIẾNG SJC 1L {SEQ_MARKER}{seq}',
         'karat': '24k',
         'purity': '999.9',
         'buy_price': base_price + buy_variation,
@@ -185,156 +515,398 @@ def send_gold_update():
         'updated_at': datetime.now().isoformat()
     }
     
-    print(f"{Fore.YELLOW}\n[{datetime.now().strftime('%H:%M:%S')}] Gửi cập nhật giá vàng...{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}\n[{datetime.now().strftime('%H:%M:%S')}] Gửi cập nhật giá vàng #{seq}...{Style.RESET_ALL}")
     # In dữ liệu sẽ gửi đi để debug
-    print(f"Dữ liệu gửi đi: {json.dumps(gold_data, indent=2)}")
+    if CONFIG.get('verbose'):
+        print(f"Dữ liệu gửi đi: {json.dumps(gold_data, indent=2)}")
     
-    try:
-        # Ghi lại thời điểm bắt đầu cập nhật
-        update_start_time = time.time()
-        
-        # Gửi yêu cầu POST với đối tượng duy nhất
-        response = requests.post(
-            f"{CONFIG['server_url']}{CONFIG['api_endpoint']}",
-            json=gold_data,  # Gửi đối tượng duy nhất
-            headers={'Content-Type': 'application/json'},
-            timeout=5
-        )
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        if response.status_code == 200:
-            print(f"{Fore.GREEN}✓ Gửi cập nhật thành công{Style.RESET_ALL}")
-            return True
-        else:
-            print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: HTTP {response.status_code} - {response.text}{Style.RESET_ALL}")
-            update_start_time = None
-            return False
-            
-    except Exception as e:
-        print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật: {str(e)}{Style.RESET_ALL}")
-        update_start_time = None
+    if publisher is None:
+        publisher = GoldPricePublisher(CONFIG['server_url'], CONFIG['api_endpoint'])
+        await publisher.start()
+    
+    # Ghi lại thời điểm bắt đầu cập nhật (perf_counter, cùng đồng hồ với handler nhận dữ liệu).
+    # Đăng ký trước khi gửi vì client có thể nhận dữ liệu trước khi có response.
+    sent_at = intended_time if intended_time is not None else time.perf_counter()
+    update = {
+        'seq': seq,
+        'timestamp': datetime.now().isoformat(),
+        'sent_at': sent_at,
+        'expected': connected_clients,
+        # Phần của client đọc chậm trong expected / số lượt nhận
+        'expected_slow': sum(1 for i in slow_client_ids if client_table.connected[i]),
+        'received_slow': 0,
+        'ok': None,
+        'publish': None,
+        'step': current_step,
+        'last_receive_at': None,
+        'histogram': LatencyHistogram()
+    }
+    updates[seq] = update
+    updates_sent += 1
+    last_registered_seq = max(last_registered_seq, seq)
+    receives_expected += update['expected']
+    schedule_lag_ms = (time.perf_counter() - sent_at) * 1000
+    
+    # Gửi yêu cầu POST với đối tượng duy nhất, không chặn event loop của các client
+    result = await publisher.publish(gold_data, sent_at=sent_at)
+    update['ok'] = result['ok']
+    update['publish'] = dict(summarize_publish(result), seq=seq, timestamp=update['timestamp'],
+                             schedule_lag_ms=schedule_lag_ms)
+    
+    if result['error']:
+        print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật #{seq}: {result['error']}{Style.RESET_ALL}")
+        mark_update_failed(update)
+        return False
+    
+    print(f"Response status: {result['status']}")
+    if CONFIG.get('verbose'):
+        print(f"Response body: {result['body']}")
+    
+    if result['ok']:
+        print(f"{Fore.GREEN}✓ Gửi cập nhật #{seq} thành công (response {(result['response_at'] - result['sent_at']) * 1000:.2f}ms, "
+              f"ack {(result['ack_at'] - result['sent_at']) * 1000:.2f}ms){Style.RESET_ALL}")
+        # Các client có thể đã nhận đủ trước khi có response
+        if update['histogram'].count >= update['expected']:
+            finalize_update(seq)
+        return True
+    else:
+        print(f"{Fore.RED}✗ Lỗi khi gửi cập nhật #{seq}: HTTP {result['status']} - {result['body']}{Style.RESET_ALL}")
+        mark_update_failed(update)
         return False
 
 
+def summarize_slow_consumers(update_stats, expected_total):
+    """Độ trễ và số lượt nhận tách riêng cho client khỏe và client đọc chậm, cùng mức tăng tài nguyên server khi gửi cập nhật"""
+    # Số lượt nhận của mỗi loại chỉ tính từ các client còn được tính trong expected của từng cập nhật
+    slow_expected = sum(stat['expected_slow'] for stat in update_stats)
+    slow_received = sum(stat['received_slow'] for stat in update_stats)
+    received_total = sum(stat['received'] for stat in update_stats)
+    
+    def summarize_class(histogram, client_count, expected, received):
+        return dict({
+            'clients': client_count,
+            'receives_expected': expected,
+            'receives': received,
+            'histogram': histogram.to_dict()
+        }, **summarize_latencies(histogram))
+    
+    # Tài nguyên server chỉ tính từ lúc bắt đầu gửi cập nhật, không tính lúc mở kết nối
+    server = {}
+    if server_sampler is not None:
+        window_start = harness_monitor.window_start_s if harness_monitor is not None else 0.0
+        server = server_sampler.summary([sample for sample in server_sampler.samples if sample['time_s'] >= window_start])
+    
+    return {
+        'ratio': CONFIG['slow_ratio'],
+        'profile': SlowReadProfile(CONFIG.get('slow_read_rate'), CONFIG.get('slow_stall_every'),
+                                   CONFIG.get('slow_stall_for') or 0.0).to_dict(),
+        'healthy': summarize_class(healthy_histogram, len(clients) - len(slow_client_ids), expected_total - slow_expected,
+                                   received_total - slow_received),
+        'slow': summarize_class(slow_histogram, len(slow_client_ids), slow_expected, slow_received),
+        'server': server
+    }
+
+
 def report_propagation_stats():
-    """Báo cáo thống kê về thời gian lan truyền"""
-    if not propagation_times:
-        return
+    """Báo cáo thống kê về thời gian lan truyền, dựng lại từ luồng kết quả NDJSON"""
+    stream_error = repr(result_stream.error) if result_stream.error is not None else None
+    if stream_error is not None:
+        print(f"{Fore.RED}✗ Luồng kết quả {CONFIG['stream_file']} bị cắt ({result_stream.records_written} bản ghi, "
+              f"bỏ {result_stream.records_dropped}), báo cáo dưới đây thiếu dữ liệu: {stream_error}{Style.RESET_ALL}")
     
-    # Tính các thống kê
-    avg_time = sum(propagation_times) / len(propagation_times)
-    min_time = min(propagation_times)
-    max_time = max(propagation_times)
+    # Histogram tổng được gộp từ histogram của từng cập nhật trong luồng
+    latency_histogram = LatencyHistogram()
+    update_stats = []
+    publish_results = []
+    for record in iter_records(CONFIG['stream_file'], 'update'):
+        del record['type']
+        latency_histogram.merge(LatencyHistogram.from_dict(record['histogram']))
+        publish = record.pop('publish')
+        if publish is not None:
+            publish_results.append(publish)
+        update_stats.append(record)
     
-    # Tính trung vị
-    median_time = statistics.median(propagation_times)
+    if latency_histogram.count == 0:
+        return
     
-    # Tính độ lệch chuẩn nếu có nhiều hơn 1 mẫu
-    std_dev = statistics.stdev(propagation_times) if len(propagation_times) > 1 else 0
+    # Tính các thống kê từ histogram
+    total_received = latency_histogram.count
+    overall = summarize_latencies(latency_histogram)
+    avg_time = overall['avg_time']
+    min_time = overall['min_time']
+    max_time = overall['max_time']
+    median_time = overall['median_time']
+    std_dev = latency_histogram.std_dev()
     
     # Định nghĩa các khoảng thời gian
     time_ranges = {
-        'Dưới 10ms': 0,
-        '10-50ms': 0,
-        '50-100ms': 0,
-        '100-200ms': 0,
-        '200-500ms': 0,
-        'Trên 500ms': 0
+        'Dưới 10ms': latency_histogram.count_between(None, 10),
+        '10-50ms': latency_histogram.count_between(10, 50),
+        '50-100ms': latency_histogram.count_between(50, 100),
+        '100-200ms': latency_histogram.count_between(100, 200),
+        '200-500ms': latency_histogram.count_between(200, 500),
+        'Trên 500ms': latency_histogram.count_between(500, None)
     }
     
-    # Phân loại thời gian
-    for time_ms in propagation_times:
-        if time_ms < 10:
-            time_ranges['Dưới 10ms'] += 1
-        elif time_ms < 50:
-            time_ranges['10-50ms'] += 1
-        elif time_ms < 100:
-            time_ranges['50-100ms'] += 1
-        elif time_ms < 200:
-            time_ranges['100-200ms'] += 1
-        elif time_ms < 500:
-            time_ranges['200-500ms'] += 1
-        else:
-            time_ranges['Trên 500ms'] += 1
+    # Thống kê riêng cho từng cập nhật: độ trễ và số lượt mất
+    update_stats.sort(key=lambda stat: stat['seq'])
+    expected_total = sum(stat['expected'] for stat in update_stats)
+    lost_total = sum(stat['lost'] for stat in update_stats)
     
     # Hiển thị kết quả
     print(f"\n{Fore.CYAN}📊 Thống kê thời gian lan truyền:{Style.RESET_ALL}")
-    print(f"  Số client nhận được cập nhật: {len(propagation_times)}/{len(clients)}")
+    print(f"  Số cập nhật đã gửi: {len(update_stats)}")
+    print(f"  Số lượt nhận cập nhật: {total_received}/{expected_total} (mất {lost_total})")
     print(f"  Thời gian trung bình: {avg_time:.2f}ms")
     print(f"  Thời gian thấp nhất: {min_time:.2f}ms")
     print(f"  Thời gian cao nhất: {max_time:.2f}ms")
     print(f"  Thời gian trung vị: {median_time:.2f}ms")
+    print(f"  P95: {overall['p95_time']:.2f}ms, P99: {overall['p99_time']:.2f}ms")
     print(f"  Độ lệch chuẩn: {std_dev:.2f}ms")
     
+    handshake = summarize_handshakes(handshake_times, failed_handshakes)
+    if handshake['connected']:
+        print(f"  Handshake: TB {handshake['avg_ms']:.2f}ms, P95 {handshake['p95_ms']:.2f}ms, "
+              f"P99 {handshake['p99_ms']:.2f}ms, lỗi {handshake['failed']}")
+    
+    phases = connection_phases.summary()
+    if any(phases[phase]['count'] for phase in PHASES):
+        print(f"\n{Fore.CYAN}🔌 Các giai đoạn mở kết nối:{Style.RESET_ALL}")
+        for phase in PHASES:
+            stats = phases[phase]
+            if stats['count']:
+                print(f"  {PHASE_LABELS[phase]}: TB {stats['avg_ms']:.2f}ms, P95 {stats['p95_ms']:.2f}ms, "
+                      f"P99 {stats['p99_ms']:.2f}ms, tối đa {stats['max_ms']:.2f}ms ({stats['count']} client)")
+    
     print(f"\n{Fore.CYAN}📈 Phân phối thời gian:{Style.RESET_ALL}")
     for time_range, count in time_ranges.items():
-        percentage = count / len(propagation_times) * 100
+        percentage = count / total_received * 100
         print(f"  {time_range}: {count} clients ({percentage:.1f}%)")
     
+    if server_sampler is not None and server_sampler.samples:
+        usage = server_sampler.summary()
+        print(f"\n{Fore.CYAN}🖥️  Tài nguyên server (PID {', '.join(map(str, server_sampler.pids))}):{Style.RESET_ALL}")
+        print(f"  CPU: TB {usage['avg_cpu_percent']:.1f}%, cao nhất {usage['max_cpu_percent']:.1f}%")
+        print(f"  RSS cao nhất: {usage['max_rss_mb']:.1f}MB, fd cao nhất: {usage['max_num_fds']}, thread cao nhất: {usage['max_num_threads']}")
+        print(f"  Context switch: {usage['ctx_switches_voluntary']} tự nguyện, {usage['ctx_switches_involuntary']} không tự nguyện")
+        if 'max_goroutines' in usage:
+            print(f"  Goroutine cao nhất: {usage['max_goroutines']}")
+    
+    slow_consumers = summarize_slow_consumers(update_stats, expected_total) if slow_client_ids else None
+    if slow_consumers is not None:
+        print(f"\n{Fore.CYAN}🐢 Client khỏe / client đọc chậm ({slow_consumers['slow']['clients']} client chậm):{Style.RESET_ALL}")
+        for name, label in (('healthy', 'Client khỏe'), ('slow', 'Client chậm')):
+            stat = slow_consumers[name]
+            if stat['receives']:
+                print(f"  {label}: nhận {stat['receives']}/{stat['receives_expected']}, TB {stat['avg_time']:.2f}ms, "
+                      f"trung vị {stat['median_time']:.2f}ms, P99 {stat['p99_time']:.2f}ms, cao nhất {stat['max_time']:.2f}ms")
+            else:
+                print(f"  {label}: nhận 0/{stat['receives_expected']}")
+            if stat['receives'] > stat['receives_expected']:
+                print(f"{Fore.YELLOW}  ⚠ {label}: số lượt nhận vượt số lượt mong đợi, số liệu churn không nhất quán{Style.RESET_ALL}")
+        server = slow_consumers['server']
+        if server:
+            growth = f"  Trong lúc gửi cập nhật: RSS server tăng {server['rss_growth_mb']:+.1f}MB"
+            if 'goroutines_growth' in server:
+                growth += f", goroutine tăng {server['goroutines_growth']:+d} (cao nhất {server['max_goroutines']})"
+            print(growth)
+    
+    harness = evaluate_harness([harness_monitor.to_dict()] if harness_monitor is not None else [],
+                               CONFIG['max_loop_lag_ms'], CONFIG['max_harness_cpu'])
+    if harness['max_loop_lag_p99_ms'] is not None:
+        color = Fore.GREEN if harness['valid'] else Fore.RED
+        cpu = f"{harness['max_cpu_percent']:.0f}%" if harness['max_cpu_percent'] is not None else '-'
+        print(f"\n{Fore.CYAN}🧪 Harness:{Style.RESET_ALL}")
+        print(f"{color}  P99 độ trễ event loop: {harness['max_loop_lag_p99_ms']:.2f}ms, CPU cao nhất: {cpu}{Style.RESET_ALL}")
+    
+    print(f"\n{Fore.CYAN}🔢 Theo từng cập nhật:{Style.RESET_ALL}")
+    for stat in update_stats:
+        if stat['received']:
+            print(f"  #{stat['seq']}: {stat['received']}/{stat['expected']} (mất {stat['lost']}), "
+                  f"TB {stat['avg_time']:.2f}ms, P95 {stat['p95_time']:.2f}ms, cao nhất {stat['max_time']:.2f}ms")
+        else:
+            print(f"  #{stat['seq']}: 0/{stat['expected']} (mất {stat['lost']})")
+    
+    if churn is not None:
+        churn_summary = churn.summary()
+        print(f"\n{Fore.CYAN}🔁 Churn ({churn_summary['percent_per_s']}% client mỗi giây):{Style.RESET_ALL}")
+        print(f"  Số lần ngắt/kết nối lại: {churn_summary['cycles']} ({churn_summary['achieved_per_s']:.1f}/s, "
+              f"mục tiêu {churn_summary['target_per_s']:.1f}/s), kết nối lại lỗi {churn_summary['failed']}")
+        handshake = churn_summary['handshake']
+        if handshake['connected']:
+            print(f"  Handshake khi churn: TB {handshake['avg_ms']:.2f}ms, P95 {handshake['p95_ms']:.2f}ms, "
+                  f"P99 {handshake['p99_ms']:.2f}ms")
+        snapshot = churn_phases.summary()['first_snapshot']
+        if snapshot['count']:
+            print(f"  Snapshot đầu tiên khi churn: TB {snapshot['avg_ms']:.2f}ms, P95 {snapshot['p95_ms']:.2f}ms, "
+                  f"P99 {snapshot['p99_ms']:.2f}ms")
+    
+    if rate_steps:
+        print(f"\n{Fore.CYAN}🚦 Theo từng mức tốc độ cập nhật ({CONFIG['server_impl']}):{Style.RESET_ALL}")
+        for step in rate_steps:
+            if 'summary' not in step:
+                continue
+            summary = step['summary']
+            status = f"{Fore.RED}bão hòa{Style.RESET_ALL}" if summary['saturated'] else f"{Fore.GREEN}chịu được{Style.RESET_ALL}"
+            print(f"  {summary['rate']:>7}/s: nhận {summary['delivered_msgs_per_s']:>9.0f}/{summary['offered_msgs_per_s']:.0f} msg/s, "
+                  f"mất {summary['drop_rate'] * 100:6.2f}%, P50 {summary.get('median_time', 0):8.2f}ms, "
+                  f"P99 {summary.get('p99_time', 0):8.2f}ms  {status}")
+        saturation = summarize_saturation()
+        if saturation['max_sustainable_rate'] is None:
+            print(f"{Fore.RED}✗ Bão hòa ngay ở mức tốc độ đầu tiên{Style.RESET_ALL}")
+        elif saturation['saturated_rate'] is None:
+            print(f"{Fore.YELLOW}⚠ Chưa bão hòa đến {saturation['max_sustainable_rate']} cập nhật/giây, "
+                  f"tốc độ tối đa thực tế có thể cao hơn{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}✓ Tốc độ tối đa chịu được: {saturation['max_sustainable_rate']} cập nhật/giây "
+                  f"({saturation['max_sustainable_msgs_per_s']:.0f} msg/s), bão hòa từ {saturation['saturated_rate']} cập nhật/giây{Style.RESET_ALL}")
+    
     # Lưu kết quả
     results = {
         'timestamp': datetime.now().isoformat(),
         'config': CONFIG,
         'stats': {
             'clients_total': len(clients),
-            'clients_received': len(propagation_times),
+            'clients_received': total_received,
+            'updates_sent': len(update_stats),
+            'receives_expected': expected_total,
+            'receives_lost': lost_total,
             'avg_time': avg_time,
             'min_time': min_time,
             'max_time': max_time,
             'median_time': median_time,
+            'p95_time': overall['p95_time'],
+            'p99_time': overall['p99_time'],
             'std_dev': std_dev,
-            'time_distribution': {k: {'count': v, 'percentage': v / len(propagation_times) * 100} 
+            'time_distribution': {k: {'count': v, 'percentage': v / total_received * 100} 
                                 for k, v in time_ranges.items()}
         },
-        'raw_data': {
-            'propagation_times': propagation_times
-        }
+        'handshake': summarize_handshakes(handshake_times, failed_handshakes),
+        'connection_phases': connection_phases.to_dict(),
+        'publish': publish_results,
+        'updates': update_stats,
+        'histogram': latency_histogram.to_dict(),
+        'server_resources': server_sampler.to_dict() if server_sampler is not None else None,
+        'harness': dict(harness, processes=[harness_monitor.to_dict()] if harness_monitor is not None else []),
+        'host_limits': host_limits,
+        'stream_file': CONFIG['stream_file'],
+        'stream_error': stream_error
     }
+    if rate_steps:
+        results['rate_steps'] = [step['summary'] for step in rate_steps if 'summary' in step]
+        results['saturation'] = summarize_saturation()
+    if churn is not None:
+        results['churn'] = dict(churn.to_dict(), connection_phases=churn_phases.to_dict())
+    if slow_consumers is not None:
+        results['slow_consumers'] = slow_consumers
     
     # Lưu vào file
     with open(CONFIG['result_file'], 'w', encoding='utf-8') as f:
         json.dump(results, f, indent=2)
     
     print(f"\n{Fore.GREEN}✓ Đã lưu kết quả vào {CONFIG['result_file']}{Style.RESET_ALL}")
+    
+    if not harness['valid']:
+        print(f"{Fore.RED}✗ Harness quá tải trong lúc đo, độ trễ đo được gồm cả độ trễ của chính harness:{Style.RESET_ALL}")
+        for reason in harness['reasons']:
+            print(f"{Fore.RED}  - {reason}{Style.RESET_ALL}")
+        if CONFIG['reject_saturated']:
+            print(f"{Fore.RED}✗ Lần chạy bị loại: không ghi vào danh mục lần chạy (--reject-saturated){Style.RESET_ALL}")
+            return
+    
+    if stream_error is not None:
+        print(f"{Fore.RED}✗ Lần chạy bị loại: luồng kết quả bị cắt, không ghi vào danh mục lần chạy{Style.RESET_ALL}")
+        return
+    
+    # Ghi lần chạy vào danh mục để các script báo cáo tìm được bằng truy vấn
+    try:
+        with RunCatalog(CONFIG['results_dir']) as catalog:
+            catalog.record_run(CONFIG['result_file'], results, run_scenario(), CONFIG['server_impl'], CONFIG['num_clients'])
+    except Exception as e:
+        print(f"{Fore.YELLOW}⚠ Không ghi được vào danh mục lần chạy: {str(e)}{Style.RESET_ALL}")
 
 
-async def monitor_client_receive(total_clients):
-    """Theo dõi tiến trình nhận cập nhật của client"""
-    global client_receive_statuses
+async def monitor_client_receive(update_task, churn_task=None):
+    """Theo dõi số lượt nhận cập nhật; khi ngừng gửi (và ngừng churn) thì chờ các cập nhật cuối cùng đến nơi rồi báo cáo"""
+    timeout = 10  # Thời gian tối đa chờ các cập nhật cuối cùng (giây)
     
-    # Tạo progress bar
-    pbar = tqdm(total=total_clients, desc="Clients đã nhận dữ liệu", unit="client")
-    last_received = 0
+    # Progress bar được handler nhận dữ liệu cập nhật trực tiếp qua receive_counter
+    pbar = tqdm(desc="Lượt nhận cập nhật", unit="msg")
+    receive_counter.progress_bar = pbar
     
-    while test_running:
-        # Đếm số client đã nhận được cập nhật
-        received_count = sum(1 for status in client_receive_statuses if status is not None)
-        
-        # Cập nhật progress bar
-        if received_count > last_received:
-            pbar.update(received_count - last_received)
-            last_received = received_count
-        
-        # Kiểm tra nếu tất cả client đã nhận được cập nhật
-        if received_count == total_clients:
-            pbar.close()
-            print(f"{Fore.GREEN}✓ Tất cả {total_clients} client đã nhận được cập nhật!{Style.RESET_ALL}")
-            report_propagation_stats()
-            break
-        
-        await asyncio.sleep(0.1)
+    await update_task
+    if churn_task is not None:
+        await churn_task
     
+    # Đã biết tổng số lượt nhận mong đợi: mỗi cập nhật gửi thành công x số client khi gửi
+    expected = receives_expected
+    receive_counter.set_target(expected)
+    drained = await receive_counter.wait(timeout)
+    
+    receive_counter.progress_bar = None
     pbar.close()
+    
+    if drained:
+        print(f"{Fore.GREEN}✓ Tất cả {updates_sent} cập nhật đã đến đủ các client!{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.YELLOW}⚠ Chỉ nhận được {receive_counter.count}/{expected} lượt cập nhật sau {timeout}s{Style.RESET_ALL}")
+    
+    # Cập nhật chưa nhận đủ (mất hoặc quá thời gian chờ) cũng được ghi ra luồng kết quả
+    for seq in sorted(updates):
+        finalize_update(seq)
+    
+    loop = asyncio.get_running_loop()
+    if server_sampler is not None:
+        await loop.run_in_executor(None, server_sampler.stop)
+    if harness_monitor is not None:
+        await harness_monitor.stop()
+        result_stream.write(dict(harness_monitor.to_dict(), type='harness'))
+    if churn is not None:
+        result_stream.write(dict(churn.to_dict(), connection_phases=churn_phases.to_dict(), type='churn'))
+    # Ghi nốt luồng kết quả trước khi đọc lại để lập báo cáo
+    try:
+        await loop.run_in_executor(None, result_stream.close)
+    except RuntimeError as e:
+        print(f"{Fore.RED}✗ {str(e)}{Style.RESET_ALL}")
+    
+    report_propagation_stats()
+
+
+def run_scenario():
+    """Kịch bản của lần chạy theo cấu hình, dùng cho tên file kết quả và danh mục lần chạy"""
+    if CONFIG.get('rate_steps'):
+        return 'update_rate'
+    if CONFIG.get('churn_rate'):
+        return 'churn'
+    if CONFIG.get('slow_ratio'):
+        return 'slow_consumer'
+    return 'ws_performance'
+
+
+def default_result_file():
+    """File kết quả riêng cho mỗi lần chạy trong results_dir, để danh mục giữ được lịch sử các lần chạy"""
+    os.makedirs(CONFIG['results_dir'], exist_ok=True)
+    name = (f"ws_performance_{run_scenario()}_{CONFIG['server_impl']}_{CONFIG['num_clients']}_"
+            f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    return os.path.join(CONFIG['results_dir'], name)
 
 
 async def run_test(config):
     """Chạy bài kiểm tra hiệu suất"""
-    global test_running, CONFIG, clients
+    global test_running, CONFIG, clients, server_sampler, harness_monitor, run_started_at, result_stream, churn
     
     # Cập nhật cấu hình
     CONFIG.update(config)
+    if not CONFIG.get('result_file'):
+        CONFIG['result_file'] = default_result_file()
+    if not CONFIG.get('stream_file'):
+        CONFIG['stream_file'] = os.path.splitext(CONFIG['result_file'])[0] + '.ndjson'
+    run_started_at = time.perf_counter()
+    check_host_limits()
+    
+    result_stream = NDJSONResultWriter(CONFIG['stream_file']).start()
+    result_stream.write({'type': 'run', 'timestamp': datetime.now().isoformat(), 'run_tag': RUN_TAG, 'config': CONFIG,
+                         'host_limits': host_limits})
     
     print(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}⏱️  BÀI KIỂM TRA HIỆU SUẤT WEBSOCKET{Style.RESET_ALL}")
@@ -343,22 +915,65 @@ async def run_test(config):
     # Hiển thị thông tin cấu hình
     print(f"\n{Fore.YELLOW}ℹ️ Cấu hình:{Style.RESET_ALL}")
     print(f"  Server URL: {CONFIG['server_url']}")
+    if CONFIG.get('protocol') == 'ws':
+        print(f"  Giao thức: WebSocket thuần ({CONFIG['ws_path']})")
     print(f"  API Endpoint: {CONFIG['api_endpoint']}")
     print(f"  Số lượng client: {CONFIG['num_clients']}")
-    print(f"  Thời gian chạy: {CONFIG['test_duration']}s")
-    print(f"  Thời gian giữa các cập nhật: {CONFIG['update_interval']}s")
+    if CONFIG.get('rate_steps'):
+        print(f"  Các mức tốc độ cập nhật: {', '.join(map(str, CONFIG['rate_steps']))}/s, mỗi mức {CONFIG['step_duration']}s ({CONFIG['arrival']})")
+    elif CONFIG.get('update_rate'):
+        print(f"  Thời gian chạy: {CONFIG['test_duration']}s")
+        print(f"  Tốc độ cập nhật: {CONFIG['update_rate']}/s ({CONFIG['arrival']})")
+    else:
+        print(f"  Thời gian chạy: {CONFIG['test_duration']}s")
+        print(f"  Thời gian giữa các cập nhật: {CONFIG['update_interval']}s ({CONFIG['arrival']})")
+    if CONFIG.get('churn_rate'):
+        print(f"  Churn: {CONFIG['churn_rate']}% client ngắt/kết nối lại mỗi giây")
+    if CONFIG.get('slow_ratio'):
+        print(f"  Client đọc chậm: {CONFIG['slow_ratio'] * 100:.1f}% số client "
+              f"({SlowReadProfile(CONFIG.get('slow_read_rate'), CONFIG.get('slow_stall_every'), CONFIG.get('slow_stall_for') or 0.0).to_dict()})")
+    for line in format_host_limits(host_limits):
+        print(f"  {line}")
+    for problem in host_limits['problems']:
+        print(f"{Fore.YELLOW}⚠ {problem}{Style.RESET_ALL}")
+    
+    # Lấy mẫu tài nguyên server suốt lần chạy (kể cả lúc mở kết nối)
+    if CONFIG.get('sample_interval'):
+        server_sampler = start_server_sampler(CONFIG['server_url'], CONFIG.get('server_pids'),
+                                              CONFIG['sample_interval'], origin=run_started_at,
+                                              on_sample=lambda sample: result_stream.write(dict(sample, type='server_resources')),
+                                              goroutine_url=CONFIG.get('goroutine_url'))
+        if server_sampler is not None:
+            print(f"  Lấy mẫu tài nguyên server: PID {', '.join(map(str, server_sampler.pids))} mỗi {CONFIG['sample_interval']}s")
+        else:
+            print(f"{Fore.YELLOW}⚠ Không tìm được tiến trình server để lấy mẫu tài nguyên (dùng --server-pid){Style.RESET_ALL}")
+    
+    harness_monitor = HarnessMonitor(CONFIG.get('lag_interval', 0.01), CONFIG.get('sample_interval') or 1.0).start(run_started_at)
     
     # Tạo và kết nối clients
     await create_clients(CONFIG['num_clients'], CONFIG['server_url'])
+    result_stream.write(dict(summarize_handshakes(handshake_times, failed_handshakes), type='handshake'))
+    result_stream.write(dict(connection_phases.to_dict(), type='connection_phases'))
+    
+    # Harness chỉ được đánh giá trong thời gian gửi/nhận cập nhật, không tính lúc mở kết nối
+    harness_monitor.reset_window()
     
     # Giả lập cập nhật từ API
-    update_task = asyncio.create_task(send_updates())
+    receive_counter.reset()
+    update_task = asyncio.create_task(send_rate_steps() if CONFIG.get('rate_steps') else send_updates())
+    
+    # Churn chạy song song với việc gửi cập nhật và dừng cùng lúc
+    churn_task = None
+    if CONFIG.get('churn_rate'):
+        churn = ChurnScheduler(CONFIG['num_clients'], CONFIG['churn_rate'], CONFIG['max_in_flight'])
+        churn_task = asyncio.create_task(churn.run(churn_disconnect, churn_connect,
+                                                   should_continue=lambda: test_running, origin=run_started_at))
     
     # Task theo dõi tiến trình
-    monitor_task = asyncio.create_task(monitor_client_receive(CONFIG['num_clients']))
+    monitor_task = asyncio.create_task(monitor_client_receive(update_task, churn_task))
     
     # Chờ hoàn thành
-    tasks = [update_task, monitor_task]
+    tasks = [update_task, monitor_task] + ([churn_task] if churn_task is not None else [])
     await asyncio.gather(*tasks)
     
     # Kết thúc test
@@ -366,60 +981,161 @@ async def run_test(config):
 
 
 async def send_updates():
-    """Gửi các cập nhật theo chu kỳ"""
+    """Gửi các cập nhật theo lịch mở (open-loop) với tốc độ mục tiêu"""
     global test_running
     
-    # Thời điểm bắt đầu test
-    start_time = time.time()
+    # Mặc định một cập nhật mỗi update_interval giây, --rate ghi đè tốc độ
+    rate = CONFIG.get('update_rate') or 1.0 / CONFIG['update_interval']
+    generator = OpenLoopUpdateGenerator(rate, CONFIG['test_duration'], CONFIG.get('arrival', 'constant'))
+    
+    async def send(seq, intended_time):
+        await send_gold_update(seq, intended_time)
+    
+    # Lịch gửi theo thời điểm dự kiến, không chờ lần gửi trước hoàn tất
+    await generator.run(send, should_continue=lambda: test_running)
+    
+    test_running = False
+
+
+def summarize_rate_step(step):
+    """Thông lượng, độ trễ, tỷ lệ mất của một mức tốc độ và các lý do (nếu có) khiến mức đó bị coi là bão hòa"""
+    offered = step['rate'] * step['clients']
+    # Thông lượng nhận tính đến lượt nhận cuối cùng: khi hàng đợi dồn lại, lượt nhận cuối đến muộn và thông lượng giảm
+    end = step['last_receive_at'] or step['ended_at']
+    delivered = step['received'] / (end - step['started_at']) if step['received'] and end > step['started_at'] else 0.0
+    drop_rate = (step['expected'] - step['received']) / step['expected'] if step['expected'] else 1.0
+    latency = summarize_latencies(step['histogram'])
+    
+    reasons = []
+    if drop_rate > CONFIG['max_drop_rate']:
+        reasons.append(f"mất {drop_rate * 100:.2f}% lượt nhận")
+    if offered and delivered / offered < CONFIG['min_throughput_ratio']:
+        reasons.append(f"thông lượng nhận chỉ bằng {delivered / offered * 100:.0f}% mức đưa vào")
+    if CONFIG.get('slo_p99') and latency.get('p99_time', float('inf')) > CONFIG['slo_p99']:
+        reasons.append(f"P99 {latency.get('p99_time', float('inf')):.1f}ms > {CONFIG['slo_p99']}ms")
     
-    # Chu kỳ gửi cập nhật
-    while test_running and time.time() - start_time < CONFIG['test_duration']:
-        # Gửi cập nhật
-        send_gold_update()
+    return dict({
+        'rate': step['rate'],
+        'clients': step['clients'],
+        'updates': step['updates'],
+        'offered_msgs_per_s': offered,
+        'delivered_msgs_per_s': delivered,
+        'receives_expected': step['expected'],
+        'receives': step['received'],
+        'drop_rate': drop_rate,
+        'saturated': bool(reasons),
+        'reasons': reasons,
+        'histogram': step['histogram'].to_dict()
+    }, **latency)
+
+
+async def send_rate_steps():
+    """Chế độ tìm tốc độ tối đa: giữ nguyên số client, tăng dần tốc độ cập nhật đến khi pipeline bão hòa"""
+    global test_running, current_step
+    
+    drain_timeout = 10  # Thời gian tối đa chờ các cập nhật của một mức đến nơi (giây)
+    
+    for index, rate in enumerate(CONFIG['rate_steps']):
+        if not test_running:
+            break
+        
+        print(f"\n{Fore.CYAN}📶 Mức {index + 1}/{len(CONFIG['rate_steps'])}: {rate} cập nhật/giây "
+              f"trong {CONFIG['step_duration']}s{Style.RESET_ALL}")
+        step = {
+            'rate': rate,
+            'clients': connected_clients,
+            'started_at': time.perf_counter(),
+            'ended_at': None,
+            'updates': 0,
+            'expected': 0,
+            'received': 0,
+            'last_receive_at': None,
+            'histogram': LatencyHistogram()
+        }
+        rate_steps.append(step)
+        current_step = index
         
-        # Đợi trước lần cập nhật tiếp theo hoặc kết thúc sớm nếu hết thời gian
-        remaining_time = min(
-            CONFIG['update_interval'],
-            CONFIG['test_duration'] - (time.time() - start_time)
-        )
+        # Số thứ tự tiếp nối các mức trước, để mỗi cập nhật trong lần chạy có seq riêng
+        seq_base = updates_sent
+        generator = OpenLoopUpdateGenerator(rate, CONFIG['step_duration'], CONFIG.get('arrival', 'constant'))
         
-        if remaining_time <= 0:
+        async def send(seq, intended_time):
+            await send_gold_update(seq_base + seq, intended_time)
+        
+        step['updates'] = await generator.run(send, should_continue=lambda: test_running)
+        current_step = None
+        
+        # Chờ các cập nhật của mức này đến nơi; cập nhật chưa nhận đủ sau thời gian chờ tính là mất
+        deadline = time.perf_counter() + drain_timeout
+        while any(update['step'] == index for update in updates.values()) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        step['ended_at'] = time.perf_counter()
+        for seq in [seq for seq, update in updates.items() if update['step'] == index]:
+            finalize_update(seq)
+        
+        step['summary'] = summarize_rate_step(step)
+        summary = step['summary']
+        print(f"  Thông lượng nhận: {summary['delivered_msgs_per_s']:.0f}/{summary['offered_msgs_per_s']:.0f} msg/s, "
+              f"mất {summary['drop_rate'] * 100:.2f}%, P99 {summary.get('p99_time', 0):.2f}ms")
+        
+        if summary['saturated']:
+            print(f"{Fore.RED}✗ Bão hòa ở {rate} cập nhật/giây: {', '.join(summary['reasons'])}{Style.RESET_ALL}")
             break
-            
-        # Hiển thị đếm ngược
-        for i in range(int(remaining_time), 0, -1):
-            if not test_running:
-                break
-            print(f"  Cập nhật tiếp theo sau: {i}s", end="\r")
-            await asyncio.sleep(1)
     
     test_running = False
 
 
+def summarize_saturation():
+    """Tốc độ lớn nhất chịu được và mức tốc độ đầu tiên bị bão hòa"""
+    summaries = [step['summary'] for step in rate_steps if 'summary' in step]
+    sustainable = [s for s in summaries if not s['saturated']]
+    saturated = [s for s in summaries if s['saturated']]
+    return {
+        'max_sustainable_rate': sustainable[-1]['rate'] if sustainable else None,
+        'max_sustainable_msgs_per_s': sustainable[-1]['delivered_msgs_per_s'] if sustainable else None,
+        'saturated_rate': saturated[0]['rate'] if saturated else None,
+        'criteria': {
+            'max_drop_rate': CONFIG['max_drop_rate'],
+            'min_throughput_ratio': CONFIG['min_throughput_ratio'],
+            'slo_p99': CONFIG.get('slo_p99')
+        }
+    }
+
+
 async def end_test():
     """Kết thúc bài kiểm tra và giải phóng tài nguyên"""
-    global clients, test_running
+    global clients, test_running, http_sessions, publisher
     
     test_running = False
+    if server_sampler is not None:
+        server_sampler.stop()
+    if harness_monitor is not None:
+        await harness_monitor.stop()
+    if result_stream is not None:
+        try:
+            result_stream.close()
+        except RuntimeError as e:
+            print(f"{Fore.RED}✗ {str(e)}{Style.RESET_ALL}")
     print(f"\n{Fore.GREEN}🏁 Kết thúc bài kiểm tra{Style.RESET_ALL}")
     
     # Ngắt kết nối tất cả client
-    for client in clients:
-        client.disconnect()
+    await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
     
-    print(f"{Fore.GREEN}✓ Đã ngắt kết nối tất cả client{Style.RESET_ALL}")
-
-
-def get_process_info():
-    """Lấy thông tin về process hiện tại"""
-    process = psutil.Process(os.getpid())
-    cpu_percent = process.cpu_percent(interval=0.1)
-    memory_mb = process.memory_info().rss / (1024 * 1024)
+    for session in http_sessions:
+        try:
+            await session.close()
+        except Exception:
+            pass
+    http_sessions = []
     
-    return {
-        'cpu_percent': cpu_percent,
-        'memory_mb': memory_mb
-    }
+    if publisher is not None:
+        try:
+            await publisher.close()
+        except Exception:
+            pass
+        publisher = None
+    
+    print(f"{Fore.GREEN}✓ Đã ngắt kết nối tất cả client{Style.RESET_ALL}")
 
 
 def parse_arguments():
@@ -429,6 +1145,12 @@ def parse_arguments():
     parser.add_argument('--server', type=str, default='http://localhost:3010',
                       help='URL máy chủ (mặc định: http://localhost:3010)')
     
+    parser.add_argument('--protocol', choices=['socketio', 'ws'], default='socketio',
+                      help='Giao thức của server: socketio (server Node.js) hoặc ws (WebSocket thuần, server Go) (mặc định: socketio)')
+    
+    parser.add_argument('--ws-path', type=str, default='/ws',
+                      help='Đường dẫn WebSocket thuần khi --protocol ws (mặc định: /ws)')
+    
     parser.add_argument('--clients', type=int, default=100,
                       help='Số lượng WebSocket client (mặc định: 100)')
     
@@ -438,11 +1160,81 @@ def parse_arguments():
     parser.add_argument('--interval', type=int, default=5,
                       help='Khoảng thời gian giữa các cập nhật, tính bằng giây (mặc định: 5)')
     
+    parser.add_argument('--rate', type=float, default=None,
+                      help='Tốc độ gửi cập nhật (cập nhật/giây), ghi đè --interval')
+    
+    parser.add_argument('--arrival', choices=ARRIVAL_MODES, default='constant',
+                      help='Phân phối thời điểm gửi: constant hoặc poisson (mặc định: constant)')
+    
+    parser.add_argument('--ramp-rate', type=float, default=200,
+                      help='Tốc độ mở kết nối, kết nối/giây; 0 = không giới hạn (mặc định: 200)')
+    
+    parser.add_argument('--max-inflight', type=int, default=100,
+                      help='Số handshake đồng thời tối đa khi ramp (mặc định: 100)')
+    
+    parser.add_argument('--server-pid', type=int, action='append', default=None,
+                      help='PID của server cần lấy mẫu tài nguyên, có thể lặp lại (mặc định: tự tìm tiến trình lắng nghe trên cổng của --server)')
+    
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                      help='Chu kỳ lấy mẫu tài nguyên server, tính bằng giây; 0 = tắt (mặc định: 1.0)')
+    
+    parser.add_argument('--server-impl', type=str, default='nodejs',
+                      help='Tên bản cài đặt server để ghi vào danh mục lần chạy, ví dụ nodejs hoặc golang (mặc định: nodejs)')
+    
+    parser.add_argument('--rate-steps', type=str, default=None,
+                      help='Tìm tốc độ cập nhật tối đa: các mức tốc độ (cập nhật/giây) tăng dần, cách nhau bởi dấu phẩy, ví dụ 1,2,5,10,20,50; ghi đè --duration và --rate')
+    
+    parser.add_argument('--step-duration', type=float, default=20,
+                      help='Thời gian gửi cập nhật ở mỗi mức tốc độ, giây (mặc định: 20)')
+    
+    parser.add_argument('--max-drop-rate', type=float, default=0.001,
+                      help='Tỷ lệ lượt nhận bị mất tối đa của một mức chịu được, 0-1 (mặc định: 0.001)')
+    
+    parser.add_argument('--min-throughput-ratio', type=float, default=0.95,
+                      help='Tỷ lệ thông lượng nhận / thông lượng đưa vào tối thiểu của một mức chịu được (mặc định: 0.95)')
+    
+    parser.add_argument('--slo-p99', type=float, default=None,
+                      help='P99 độ trễ tối đa (ms) của một mức chịu được (mặc định: không xét)')
+    
+    parser.add_argument('--churn-rate', type=float, default=0.0,
+                      help='Phần trăm client bị ngắt rồi kết nối lại mỗi giây trong lúc gửi cập nhật, giữ nguyên số client mục tiêu; 0 = tắt (mặc định: 0)')
+    
+    parser.add_argument('--slow-ratio', type=float, default=0.0,
+                      help='Tỷ lệ client đọc chậm trong tổng số client, 0-1; 0 = tắt (mặc định: 0)')
+    
+    parser.add_argument('--slow-read-rate', type=float, default=None,
+                      help='Tốc độ đọc tối đa của client chậm, byte/giây (mặc định: không giới hạn)')
+    
+    parser.add_argument('--slow-stall-every', type=float, default=None,
+                      help='Client chậm ngừng đọc sau mỗi bao nhiêu giây (mặc định: không ngừng)')
+    
+    parser.add_argument('--slow-stall-for', type=float, default=0.0,
+                      help='Thời gian mỗi lần client chậm ngừng đọc, giây (mặc định: 0)')
+    
+    parser.add_argument('--source-addrs', type=str, default=None,
+                      help='Các địa chỉ nguồn dùng lần lượt cho kết nối client, ví dụ 127.0.0.2-127.0.0.20 hoặc 10.0.0.5,10.0.0.6; '
+                           'mỗi địa chỉ có dải cổng tạm riêng (mặc định: địa chỉ do hệ điều hành chọn)')
+    
+    parser.add_argument('--goroutine-url', type=str, default=None,
+                      help='URL pprof goroutine của server Go chạy với --pprof, ví dụ http://localhost:8080/debug/pprof/goroutine?debug=1 (mặc định: không lấy mẫu)')
+    
+    parser.add_argument('--max-loop-lag', type=float, default=50.0,
+                      help='P99 độ trễ event loop tối đa của harness (ms); vượt ngưỡng thì lần chạy bị đánh dấu không hợp lệ (mặc định: 50)')
+    
+    parser.add_argument('--max-harness-cpu', type=float, default=90.0,
+                      help='CPU tối đa của tiến trình harness (%%); vượt ngưỡng thì lần chạy bị đánh dấu không hợp lệ (mặc định: 90)')
+    
+    parser.add_argument('--reject-saturated', action='store_true',
+                      help='Không ghi lần chạy có harness quá tải vào danh mục lần chạy')
+    
     parser.add_argument('--verbose', action='store_true',
                       help='Hiển thị log chi tiết')
     
-    parser.add_argument('--output', type=str, default='ws_performance_results.json',
-                      help='File lưu kết quả (mặc định: ws_performance_results.json)')
+    parser.add_argument('--output', type=str, default=None,
+                      help='File lưu kết quả (mặc định: results/ws_performance_<kịch bản>_<server>_<số client>_<thời điểm>.json)')
+    
+    parser.add_argument('--stream', type=str, default=None,
+                      help='File NDJSON ghi luồng kết quả trong lúc chạy (mặc định: tên file --output với đuôi .ndjson)')
     
     return parser.parse_args()
 
@@ -454,12 +1246,37 @@ if __name__ == '__main__':
     # Cấu hình từ tham số
     config = {
         'server_url': args.server,
+        'protocol': args.protocol,
+        'ws_path': args.ws_path,
         'api_endpoint': '/api/add',
         'num_clients': args.clients,
         'test_duration': args.duration,
         'update_interval': args.interval,
+        'update_rate': args.rate,
+        'arrival': args.arrival,
+        'ramp_rate': args.ramp_rate,
+        'max_in_flight': args.max_inflight,
+        'server_pids': args.server_pid,
+        'sample_interval': args.sample_interval,
         'verbose': args.verbose,
-        'result_file': args.output
+        'result_file': args.output,
+        'stream_file': args.stream,
+        'server_impl': args.server_impl,
+        'rate_steps': sorted(float(r) for r in args.rate_steps.split(',') if r.strip()) if args.rate_steps else None,
+        'step_duration': args.step_duration,
+        'max_drop_rate': args.max_drop_rate,
+        'min_throughput_ratio': args.min_throughput_ratio,
+        'slo_p99': args.slo_p99,
+        'max_loop_lag_ms': args.max_loop_lag,
+        'max_harness_cpu': args.max_harness_cpu,
+        'reject_saturated': args.reject_saturated,
+        'churn_rate': args.churn_rate,
+        'slow_ratio': args.slow_ratio,
+        'slow_read_rate': args.slow_read_rate,
+        'slow_stall_every': args.slow_stall_every,
+        'slow_stall_for': args.slow_stall_for,
+        'goroutine_url': args.goroutine_url,
+        'source_addresses': parse_source_addresses(args.source_addrs)
     }
     
     try:
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bộ điều phối tăng dần kết nối (ramp-up) cho các công cụ đo WebSocket
+- Mở kết nối theo tốc độ mục tiêu (kết nối/giây), lịch được tính theo thời điểm dự kiến
+- Giới hạn số handshake đang thực hiện đồng thời
+- Ghi lại thời gian handshake của từng client
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+
+class RampScheduler:
+    """Mở kết nối với tốc độ và số handshake đồng thời giới hạn"""
+
+    def __init__(self, rate=200, max_in_flight=100):
+        # rate <= 0 nghĩa là không giới hạn tốc độ, chỉ giới hạn số handshake đồng thời
+        self.rate = rate
+        self.max_in_flight = max(1, max_in_flight)
+        self.handshake_times = []
+        self.failed = 0
+
+    async def run(self, count, connect_fn, on_done=None):
+        """
+        Gọi connect_fn(i) cho i trong [0, count) theo lịch ramp.
+        connect_fn trả về True nếu handshake thành công.
+        on_done(i, ok, handshake_ms) được gọi sau mỗi handshake (dùng cho progress bar).
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+
+        async def attempt(index):
+            try:
+                begin = time.perf_counter()
+                try:
+                    ok = await connect_fn(index)
+                except Exception:
+                    ok = False
+                handshake_ms = (time.perf_counter() - begin) * 1000
+            finally:
+                semaphore.release()
+
+            if ok:
+                self.handshake_times.append(handshake_ms)
+            else:
+                self.failed += 1
+            if on_done:
+                on_done(index, ok, handshake_ms)
+
+        for i in range(count):
+            # Lịch theo thời điểm dự kiến nên một handshake chậm không làm trễ cả đợt ramp
+            if self.rate > 0:
+                delay = start + i / self.rate - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await semaphore.acquire()
+            tasks.append(asyncio.ensure_future(attempt(i)))
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+        return self.handshake_times
+
+
+def summarize_handshakes(handshake_times, failed=0):
+    """Tóm tắt thời gian handshake (ms) để in ra và lưu vào JSON"""
+    if not handshake_times:
+        return {'connected': 0, 'failed': failed}
+
+    times = np.asarray(handshake_times, dtype=float)
+    return {
+        'connected': int(times.size),
+        'failed': failed,
+        'avg_ms': float(times.mean()),
+        'min_ms': float(times.min()),
+        'median_ms': float(np.median(times)),
+        'p95_ms': float(np.percentile(times, 95)),
+        'p99_ms': float(np.percentile(times, 99)),
+        'max_ms': float(times.max())
+    }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Client Socket.IO tối giản chạy trực tiếp trên WebSocket (aiohttp) cho công cụ đo tải
+- Chỉ thực hiện handshake Engine.IO v4 / Socket.IO namespace "/" qua /socket.io/
+- Trả lời ping của server
+- Ghi nhận thời điểm nhận frame "gold-prices-updated" mà không giải mã JSON payload
+Không có reconnection, namespace khác, ack hay hàng đợi gói tin như python-socketio.
+PlainWebSocketClient dùng cho server chỉ có WebSocket thuần (server Go, endpoint /ws): không handshake,
+mỗi frame text server gửi là một lần nhận cập nhật.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+
+from connection_phases import create_trace_config
+
+# Các loại gói Engine.IO / Socket.IO dạng text
+EIO_OPEN = '0'
+EIO_CLOSE = '1'
+EIO_PING = '2'
+EIO_PONG = '3'
+SIO_CONNECT = '40'
+SIO_DISCONNECT = '41'
+SIO_CONNECT_ERROR = '44'
+
+GOLD_PRICES_EVENT_PREFIX = '42["gold-prices-updated"'
+
+
+def build_ws_url(server_url, socketio_path='/socket.io'):
+    """Chuyển http(s)://host:port thành URL WebSocket của Engine.IO"""
+    parts = urlsplit(server_url)
+    scheme = 'wss' if parts.scheme in ('https', 'wss') else 'ws'
+    path = socketio_path.rstrip('/') + '/'
+    return urlunsplit((scheme, parts.netloc, path, 'EIO=4&transport=websocket', ''))
+
+
+def build_plain_ws_url(server_url, ws_path='/ws'):
+    """Chuyển http(s)://host:port thành URL WebSocket thuần, ví dụ ws://host:port/ws"""
+    parts = urlsplit(server_url)
+    scheme = 'wss' if parts.scheme in ('https', 'wss') else 'ws'
+    return urlunsplit((scheme, parts.netloc, ws_path, '', ''))
+
+
+def create_http_session(local_addr=None):
+    """Tạo aiohttp session dùng chung cho tất cả raw client; local_addr là địa chỉ nguồn của các kết nối (tùy chọn)"""
+    # limit=0: không giới hạn số kết nối đồng thời (mặc định aiohttp chỉ cho 100)
+    connector = aiohttp.TCPConnector(limit=0, local_addr=(local_addr, 0) if local_addr else None)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[create_trace_config()])
+
+
+def create_http_sessions(source_addresses=None):
+    """Một session cho mỗi địa chỉ nguồn (client thứ i dùng session i % số địa chỉ), hoặc một session mặc định"""
+    if not source_addresses:
+        return [create_http_session()]
+    return [create_http_session(address) for address in source_addresses]
+
+
+class RawSocketIOClient:
+    """Một kết nối Socket.IO tối giản, chỉ nhận sự kiện gold-prices-updated"""
+
+    __slots__ = ('ws_url', 'http_session', 'on_update', 'on_disconnect', 'index', 'timeline', 'read_profile',
+                 'ws', 'reader', 'connected')
+
+    # Frame bắt đầu bằng tiền tố này được coi là một lần nhận cập nhật
+    update_prefix = GOLD_PRICES_EVENT_PREFIX
+
+    def __init__(self, ws_url, http_session, on_update=None, on_disconnect=None, index=None, timeline=None,
+                 read_profile=None):
+        self.ws_url = ws_url
+        self.http_session = http_session
+        # on_update(index, receive_time, packet) được gọi ngay khi nhận frame, trước mọi xử lý khác (packet chưa giải mã);
+        # on_disconnect(index). index là chỉ số client trong harness, nhờ đó mọi client dùng chung một handler
+        self.on_update = on_update
+        self.on_disconnect = on_disconnect
+        self.index = index
+        # ConnectionTimeline ghi thời gian từng giai đoạn handshake (tùy chọn)
+        self.timeline = timeline
+        # SlowReadProfile của client đọc chậm (tùy chọn), None = đọc ngay khi có dữ liệu
+        self.read_profile = read_profile
+        self.ws = None
+        self.reader = None
+        self.connected = False
+
+    async def connect(self, wait_timeout=10):
+        """Mở WebSocket, hoàn tất handshake Engine.IO và kết nối namespace mặc định"""
+        if self.timeline is not None:
+            self.timeline.begin()
+        self.ws = await self.http_session.ws_connect(self.ws_url, timeout=wait_timeout,
+                                                     autoping=False, max_msg_size=0)
+        try:
+            await asyncio.wait_for(self._handshake(), wait_timeout)
+        except BaseException:
+            await self.ws.close()
+            raise
+
+        self.connected = True
+        self.reader = asyncio.ensure_future(self._read_loop())
+
+    async def _handshake(self):
+        """Đợi gói open của Engine.IO, gửi CONNECT namespace và đợi server xác nhận"""
+        packet = await self.ws.receive_str()
+        if not packet.startswith(EIO_OPEN):
+            raise ConnectionError(f'Gói Engine.IO không hợp lệ: {packet[:40]}')
+        if self.timeline is not None:
+            self.timeline.mark('eio_open')
+
+        await self.ws.send_str(SIO_CONNECT)
+        while True:
+            packet = await self.ws.receive_str()
+            if packet == EIO_PING:
+                await self.ws.send_str(EIO_PONG)
+            elif packet.startswith(SIO_CONNECT):
+                if self.timeline is not None:
+                    self.timeline.mark('sio_connect')
+                return
+            elif packet.startswith(SIO_CONNECT_ERROR):
+                raise ConnectionError(f'Server từ chối kết nối namespace: {packet[2:]}')
+
+    async def _read_loop(self):
+        """Đọc frame cho đến khi kết nối đóng"""
+        ws = self.ws
+        read_profile = self.read_profile
+        update_prefix = self.update_prefix
+        try:
+            while True:
+                if read_profile is not None:
+                    await read_profile.before_read()
+                msg = await ws.receive()
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                                    aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+                    continue
+
+                packet = msg.data
+                if packet.startswith(update_prefix):
+                    if self.on_update:
+                        self.on_update(self.index, time.perf_counter(), packet)
+                elif packet == EIO_PING:
+                    await ws.send_str(EIO_PONG)
+                elif packet.startswith(SIO_DISCONNECT) or packet == EIO_CLOSE:
+                    break
+                if read_profile is not None:
+                    await read_profile.after_read(len(packet))
+        except (aiohttp.ClientError, ConnectionError):
+            pass
+        finally:
+            if self.connected:
+                self.connected = False
+                if self.on_disconnect:
+                    self.on_disconnect(self.index)
+
+    async def disconnect(self):
+        """Gửi DISCONNECT namespace và đóng WebSocket"""
+        if self.ws is None or self.ws.closed:
+            return
+        try:
+            await self.ws.send_str(SIO_DISCONNECT)
+        except Exception:
+            pass
+        await self.ws.close()
+        if self.reader:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+
+class PlainWebSocketClient(RawSocketIOClient):
+    """
+    Kết nối WebSocket thuần (không Engine.IO / Socket.IO), ví dụ endpoint /ws của server Go.
+    Mọi frame text đều là dữ liệu giá vàng: snapshot lúc kết nối hoặc một cập nhật.
+    """
+
+    __slots__ = ()
+
+    update_prefix = ''
+
+    async def _handshake(self):
+        """WebSocket thuần không có handshake sau khi nâng cấp kết nối"""
+
+    async def disconnect(self):
+        """Đóng WebSocket"""
+        if self.ws is None or self.ws.closed:
+            return
+        await self.ws.close()
+        if self.reader:
+            await asyncio.gather(self.reader, return_exceptions=True)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bộ đếm số client đã nhận cập nhật, báo hiệu bằng asyncio.Event khi đạt mục tiêu
+Thay cho các vòng lặp quét toàn bộ client mỗi 100ms: handler nhận dữ liệu chỉ tăng bộ đếm,
+coroutine chờ được đánh thức đúng lúc client cuối cùng nhận được dữ liệu.
+"""
+
+import asyncio
+import time
+
+
+class ReceiveCounter:
+    """Đếm số lần nhận (mỗi client tối đa một lần cho mỗi cập nhật) và báo khi đủ"""
+
+    def __init__(self):
+        self.count = 0
+        self.target = 0
+        self.started_at = None
+        self.completed_at = None
+        self.progress_bar = None
+        # Tạo Event khi cần để gắn với event loop đang chạy
+        self._done = None
+
+    @property
+    def done(self):
+        if self._done is None:
+            self._done = asyncio.Event()
+        return self._done
+
+    def reset(self, target=None):
+        """
+        Bắt đầu đếm lại; phải gọi trên thread của event loop.
+        target=None khi chưa biết tổng số lần nhận mong đợi (đặt sau bằng set_target).
+        """
+        self.count = 0
+        self.target = target
+        self.started_at = time.perf_counter()
+        self.completed_at = None
+        self.done.clear()
+        if self.progress_bar is not None:
+            self.progress_bar.reset(total=target)
+        if target is not None and target <= 0:
+            self.completed_at = self.started_at
+            self.done.set()
+
+    def set_target(self, target):
+        """Đặt (hoặc đổi) số lần nhận mong đợi; báo hiệu ngay nếu đã đủ"""
+        self.target = target
+        if self.progress_bar is not None:
+            self.progress_bar.total = target
+            self.progress_bar.refresh()
+        if self.count >= target and not self.done.is_set():
+            self.completed_at = time.perf_counter()
+            self.done.set()
+
+    def increment(self):
+        """Gọi từ handler nhận dữ liệu khi một client nhận cập nhật lần đầu"""
+        self.count += 1
+        if self.progress_bar is not None:
+            self.progress_bar.update(1)
+        if self.count == self.target:
+            self.completed_at = time.perf_counter()
+            self.done.set()
+
+    async def wait(self, timeout):
+        """Chờ đến khi đủ số client nhận dữ liệu; trả về False nếu hết thời gian"""
+        try:
+            await asyncio.wait_for(self.done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False